@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration for the preload-and-fork deployment
+
+The app, FAISS index, documents and encoder weights are loaded once in the
+master and shared copy-on-write by the forked uvicorn workers.
+
+Usage:
+    gunicorn -c gunicorn.conf.py src.main:app
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # Runs in the master after the app was imported (preload_app), before forking
+    from src.services.preload import preload_shared_state
+    preload_shared_state()
+
+
+def post_fork(server, worker):
+    from src.services.preload import reset_after_fork
+    reset_after_fork()
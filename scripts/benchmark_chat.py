@@ -0,0 +1,383 @@
+"""
+End-to-end load test for the chat pipeline
+
+Drives POST /session and POST /chat with closed-loop load (a fixed number
+of concurrent conversations) or open-loop load (conversations arriving as
+a Poisson process at --rate per second, independent of how fast the
+server answers). Reports end-to-end latency percentiles, throughput,
+errors, p50/p95/p99 per pipeline stage (db, embed, search, prompt, llm,
+persist, ...) and resident memory, and writes JSON so runs can be compared
+between commits.
+
+By default the app runs in-process over an ASGI transport with the
+simulated LLM backend and a SQLite database, so no API key, network or
+Postgres is needed. Pass --database-url for a local Postgres, or --url to
+load a running server (start it with SERVER_TIMING_ENABLED=true to get
+stage timings for non-streamed requests, and pass --server-pid for its
+RSS). Time to first token is only meaningful against a server; in-process
+responses are buffered, so use the server-side llm_first_token stage.
+
+Usage:
+    python scripts/benchmark_chat.py --requests 500 --concurrency 32
+    python scripts/benchmark_chat.py --rate 20 --requests 600 --stream --json after.json --compare before.json
+    python scripts/benchmark_chat.py --url http://localhost:8000 --concurrency 16 --server-pid 4242
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+# Add project root to path
+sys.path.append(os.getcwd())
+
+from src.services.stage_timings import StageLog, percentiles
+
+# Turn FAQ questions into plausible user messages; all but the first move
+# the query away from the indexed question, so not every request is
+# answered straight from the FAQ by the model router
+MESSAGE_TEMPLATES = (
+    "{}",
+    "Hi there, {}",
+    "{} Thanks in advance!",
+    "I already looked around but couldn't work it out: {}",
+)
+
+
+def rss_mb(pid: str = "self") -> Optional[float]:
+    """Current resident set size of a process (peak RSS of this one where /proc is unavailable)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == "self":
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Server-Timing header value -> {stage: seconds}"""
+    timings = {}
+    for metric in header.split(","):
+        name, _, params = metric.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                timings[name] = float(value) / 1000
+    return timings
+
+
+def load_messages(args) -> List[str]:
+    if args.messages:
+        with open(args.messages) as f:
+            return [line.strip() for line in f if line.strip()]
+    from src.data.faq_loader import iter_faqs
+    rng = random.Random(args.seed)
+    questions = [faq["question"] for faq in islice(iter_faqs(args.faqs), args.limit)]
+    return [rng.choice(MESSAGE_TEMPLATES).format(q) for q in questions]
+
+
+class LoadGenerator:
+    """Sends conversations (a session plus sequential turns) and records each request"""
+
+    def __init__(self, client: httpx.AsyncClient, stream: bool, stage_log: StageLog):
+        self.client = client
+        self.stream = stream
+        self.stage_log = stage_log
+        self.results: List[Dict[str, Any]] = []
+        self.session_latencies: List[float] = []
+
+    async def conversation(self, messages: List[str]):
+        start = time.perf_counter()
+        try:
+            res = await self.client.post("/session", json={})
+            res.raise_for_status()
+            session_id = res.json()["session_id"]
+        except Exception as e:
+            self.results.extend({"ok": False, "error": f"session: {e}"} for _ in messages)
+            return
+        self.session_latencies.append(time.perf_counter() - start)
+
+        for message in messages:
+            self.results.append(await self.chat(session_id, message))
+
+    async def chat(self, session_id: str, message: str) -> Dict[str, Any]:
+        payload = {"session_id": session_id, "message": message, "stream": self.stream}
+        start = time.perf_counter()
+        ttft, done = None, None
+        try:
+            if self.stream:
+                async with self.client.stream("POST", "/chat", json=payload) as res:
+                    res.raise_for_status()
+                    headers = res.headers
+                    event = None
+                    async for line in res.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[len("event: "):]
+                        elif line.startswith("data: "):
+                            if event == "token" and ttft is None:
+                                ttft = time.perf_counter() - start
+                            elif event == "done":
+                                done = json.loads(line[len("data: "):])
+            else:
+                res = await self.client.post("/chat", json=payload)
+                res.raise_for_status()
+                headers = res.headers
+                done = res.json()
+        except Exception as e:
+            return {"ok": False, "error": str(e) or type(e).__name__}
+
+        latency = time.perf_counter() - start
+        if "server-timing" in headers:
+            self.stage_log.record(parse_server_timing(headers["server-timing"]))
+        route = ((done or {}).get("action_payload") or {}).get("route", "llm")
+        return {
+            "ok": done is not None,
+            "latency": latency,
+            "ttft": ttft,
+            "route": route,
+            "next_action": (done or {}).get("next_action"),
+        }
+
+
+async def closed_loop(generator: LoadGenerator, conversations: List[List[str]], concurrency: int):
+    pending = iter(conversations)
+
+    async def worker():
+        for messages in pending:
+            await generator.conversation(messages)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(generator: LoadGenerator, conversations: List[List[str]], rate: float, seed: int):
+    rng = random.Random(seed)
+    tasks = []
+    for messages in conversations:
+        tasks.append(asyncio.ensure_future(generator.conversation(messages)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+
+
+async def sample_rss(pid: str, samples: List[float], interval: float = 0.25):
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(interval)
+
+
+def conversations_for(messages: List[str], count: int, turns: int, seed: int) -> List[List[str]]:
+    """`count` requests grouped into conversations of `turns` messages"""
+    rng = random.Random(seed)
+    picks = [rng.choice(messages) for _ in range(count)]
+    return [picks[i:i + turns] for i in range(0, count, turns)]
+
+
+async def run(args, client: httpx.AsyncClient, stage_log: StageLog, rss_pid: Optional[str]) -> Dict[str, Any]:
+    messages = load_messages(args)
+    if not messages:
+        print("❌ No messages to send")
+        sys.exit(1)
+
+    if args.warmup:
+        warmup = LoadGenerator(client, args.stream, StageLog())
+        await closed_loop(warmup, conversations_for(messages, args.warmup, args.turns, args.seed + 1), args.concurrency)
+    stage_log.clear()
+
+    generator = LoadGenerator(client, args.stream, stage_log)
+    conversations = conversations_for(messages, args.requests, args.turns, args.seed)
+    rss_samples: List[float] = []
+    sampler = asyncio.ensure_future(sample_rss(rss_pid, rss_samples)) if rss_pid else None
+
+    start = time.perf_counter()
+    if args.rate:
+        await open_loop(generator, conversations, args.rate, args.seed)
+    else:
+        await closed_loop(generator, conversations, args.concurrency)
+    duration = time.perf_counter() - start
+
+    if sampler is not None:
+        sampler.cancel()
+        rss_samples.append(rss_mb(rss_pid) or 0.0)
+
+    ok = [r for r in generator.results if r["ok"]]
+    errors: Dict[str, int] = {}
+    for r in generator.results:
+        if not r["ok"]:
+            errors[r.get("error", "no done event")] = errors.get(r.get("error", "no done event"), 0) + 1
+    routes: Dict[str, int] = {}
+    for r in ok:
+        routes[r["route"]] = routes.get(r["route"], 0) + 1
+
+    return {
+        "duration_s": duration,
+        "requests": len(generator.results),
+        "completed": len(ok),
+        "errors": errors,
+        "escalations": sum(1 for r in ok if r["next_action"] == "escalate"),
+        "routes": routes,
+        "throughput_rps": len(ok) / duration if duration else 0.0,
+        "latency_ms": percentiles([r["latency"] for r in ok]),
+        "ttft_ms": percentiles([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "session_ms": percentiles(generator.session_latencies),
+        "stages_ms": stage_log.report(),
+        "rss_mb": {"start": rss_samples[0], "peak": max(rss_samples), "end": rss_samples[-1]} if rss_samples else None,
+    }
+
+
+async def run_in_process(args) -> Dict[str, Any]:
+    """Run the app in this process (settings come from the environment set in main)"""
+    from src.main import app
+    from src.services.llm_client import llm_client
+    from src.services.model_router import model_router
+    from src.services.retrieval_worker import retrieval_worker
+    from src.services.retriever import vector_db
+    from src.services.stage_timings import stage_log
+
+    rss_before = rss_mb()
+    async with app.router.lifespan_context(app):
+        if not vector_db.documents:
+            print("⚠️  Knowledge base is empty - run scripts/ingest_data.py first for meaningful retrieval")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=args.timeout) as client:
+            report = await run(args, client, stage_log, "self")
+
+    report["rss_mb"]["before_app"] = rss_before
+    report["server_stats"] = {
+        "router": dict(model_router.stats),
+        "llm_scheduler": dict(llm_client.scheduler.stats),
+        "retrieval_worker": dict(retrieval_worker.stats),
+    }
+    return report
+
+
+async def run_remote(args) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        return await run(args, client, StageLog(), str(args.server_pid) if args.server_pid else None)
+
+
+def print_report(report: Dict[str, Any]):
+    meta = report["meta"]
+    load = f"{meta['rate']}/s open loop" if meta["rate"] else f"concurrency {meta['concurrency']}"
+    print(f"\n📊 {report['completed']}/{report['requests']} requests in {report['duration_s']:.1f}s "
+          f"({load}, {'stream' if meta['stream'] else 'json'}) against {meta['target']}")
+    print(f"   throughput {report['throughput_rps']:.1f} req/s, routes {report['routes']}, "
+          f"escalations {report['escalations']}")
+    for message, count in report["errors"].items():
+        print(f"   ❌ {count} x {message}")
+
+    rows = [("end-to-end", report["latency_ms"]), ("session", report["session_ms"])]
+    if report["ttft_ms"]:
+        rows.append(("first token", report["ttft_ms"]))
+    rows += [(f"  {name}", stats) for name, stats in report["stages_ms"].items()]
+    print(f"\n{'ms':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}")
+    for name, stats in rows:
+        if stats:
+            print(f"{name:<16}{stats['p50']:>9.1f}{stats['p95']:>9.1f}{stats['p99']:>9.1f}{stats['mean']:>9.1f}")
+
+    if report["rss_mb"]:
+        rss = report["rss_mb"]
+        print(f"\nRSS MB: start {rss['start']:.0f}, peak {rss['peak']:.0f}, end {rss['end']:.0f}")
+
+
+def comparable_metrics(report: Dict[str, Any]) -> Dict[str, float]:
+    metrics = {"throughput_rps": report["throughput_rps"]}
+    for p in ("p50", "p95", "p99"):
+        if p in report["latency_ms"]:
+            metrics[f"latency {p}"] = report["latency_ms"][p]
+    for name, stats in report["stages_ms"].items():
+        for p in ("p50", "p95"):
+            metrics[f"{name} {p}"] = stats[p]
+    if report.get("rss_mb"):
+        metrics["peak RSS MB"] = report["rss_mb"]["peak"]
+    return metrics
+
+
+def print_comparison(baseline: Dict[str, Any], report: Dict[str, Any]):
+    before, after = comparable_metrics(baseline), comparable_metrics(report)
+    print(f"\nvs {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta']['timestamp']})")
+    print(f"{'metric':<24}{'before':>10}{'after':>10}{'change':>9}")
+    for name, value in after.items():
+        if name in before:
+            change = f"{(value - before[name]) / before[name] * 100:+.1f}%" if before[name] else "n/a"
+            print(f"{name:<24}{before[name]:>10.1f}{value:>10.1f}{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /session and /chat")
+    parser.add_argument("--url", help="Base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--server-pid", type=int, help="PID of that server, for RSS")
+    parser.add_argument("--requests", type=int, default=200, help="Chat requests to send")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent conversations (closed loop)")
+    parser.add_argument("--rate", type=float, default=0, help="Conversations started per second (open loop)")
+    parser.add_argument("--turns", type=int, default=1, help="Messages per conversation")
+    parser.add_argument("--stream", action="store_true", help="Request Server-Sent Events")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument("--faqs", default=os.path.join("data", "sample_faqs.json"), help="FAQ export to draw questions from")
+    parser.add_argument("--messages", help="File with one message per line (instead of --faqs)")
+    parser.add_argument("--limit", type=int, default=5000, help="Max FAQs to read")
+    parser.add_argument("--llm-backend", default="simulated", help="LLM backend for in-process runs")
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db", help="Database for in-process runs")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Earlier --json report to print changes against")
+    args = parser.parse_args()
+
+    if not args.url:
+        # Must be set before src.config is imported
+        os.environ["LLM_BACKEND"] = args.llm_backend
+        os.environ["DATABASE_URL"] = args.database_url
+        os.environ["WARMUP_MODE"] = "blocking"
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+    report = asyncio.run(run_remote(args) if args.url else run_in_process(args))
+    report["meta"] = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": args.url or "in-process",
+        "llm_backend": None if args.url else args.llm_backend,
+        "database": None if args.url else args.database_url.split("@")[-1],
+        "requests": args.requests,
+        "concurrency": None if args.rate else args.concurrency,
+        "rate": args.rate or None,
+        "turns": args.turns,
+        "stream": args.stream,
+        "seed": args.seed,
+    }
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Encoder backend and vector storage benchmark
+
+For each encoder backend, measures model load time, resident memory,
+batch encode throughput and single-query latency (each backend runs in a
+fresh process so memory numbers are not shared). Then, for each vector
+storage option, reports retrieval recall@k against the torch/float32
+flat baseline.
+
+Usage:
+    python scripts/benchmark_encoder.py
+    python scripts/benchmark_encoder.py --path data/kb.jsonl --backends torch onnx_int8 --json encoders.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.getcwd())
+
+from src.config import settings
+from src.data.faq_loader import faq_to_document, iter_faqs
+from src.services.encoders import ENCODER_BACKENDS, create_encoder
+from src.services.index_factory import VECTOR_STORAGE, build_index, prepare_vectors
+
+
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_backend(backend: str, texts, queries, batch_size: int, repeat: int):
+    """Runs in a child process; returns timings plus the corpus and query vectors"""
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    encoder = create_encoder(backend, settings.embedding_model)
+    encoder.encode(["warm up"])
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        corpus_vectors = encoder.encode(texts, batch_size=batch_size)
+    throughput = repeat * len(texts) / (time.perf_counter() - start)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+    query_vectors = encoder.encode(queries, batch_size=batch_size)
+
+    return {
+        "backend": backend,
+        "load_s": load_s,
+        "rss_mb": rss_mb() - base_rss,
+        "texts_per_s": throughput,
+        "query_ms_p50": float(np.percentile(latencies, 50)),
+        "query_ms_p95": float(np.percentile(latencies, 95)),
+    }, np.asarray(corpus_vectors, dtype="float32"), np.asarray(query_vectors, dtype="float32")
+
+
+def recall_at_k(index, queries: np.ndarray, ground_truth: np.ndarray, k: int) -> float:
+    _, ids = index.search(prepare_vectors(index, queries), k)
+    return sum(len(set(found) & set(truth)) for found, truth in zip(ids, ground_truth)) / float(ground_truth.size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare encoder backends and vector storage")
+    parser.add_argument("--path", default=os.path.join("data", "sample_faqs.json"), help="FAQ/KB export to encode")
+    parser.add_argument("--limit", type=int, default=5000, help="Max documents to read")
+    parser.add_argument("--backends", nargs="+", choices=ENCODER_BACKENDS, default=list(ENCODER_BACKENDS))
+    parser.add_argument("--storage", nargs="+", choices=list(VECTOR_STORAGE), default=list(VECTOR_STORAGE))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3, help="Encode passes over the corpus for throughput")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    faqs = list(islice(iter_faqs(args.path), args.limit))
+    texts = [faq_to_document(faq)["text"] for faq in faqs]
+    queries = [faq["question"] for faq in faqs]
+    k = min(args.k, len(texts))
+
+    # Fresh interpreter per backend so imports and model weights are measured in isolation
+    context = multiprocessing.get_context("spawn")
+    rows, vectors = [], {}
+    for backend in args.backends:
+        with context.Pool(1) as pool:
+            row, corpus_vectors, query_vectors = pool.apply(
+                measure_backend, (backend, texts, queries, args.batch_size, args.repeat)
+            )
+        rows.append(row)
+        vectors[backend] = (corpus_vectors, query_vectors)
+
+    baseline_backend = "torch" if "torch" in vectors else args.backends[0]
+    baseline = build_index("flat", vectors[baseline_backend][0], storage="float32")
+    _, ground_truth = baseline.search(prepare_vectors(baseline, vectors[baseline_backend][1]), k)
+
+    recall_rows = []
+    for backend, (corpus_vectors, query_vectors) in vectors.items():
+        for storage in args.storage:
+            index = build_index("flat", corpus_vectors, storage=storage)
+            recall_rows.append({
+                "backend": backend,
+                "storage": storage,
+                "recall_at_k": recall_at_k(index, query_vectors, ground_truth, k),
+                "index_mb": (index.ntotal * index.sa_code_size()) / (1024 * 1024),
+            })
+
+    print(f"\n📊 {len(texts)} documents, {len(queries)} queries, model {settings.embedding_model}")
+    print(f"{'backend':<12}{'load s':>9}{'RSS MB':>9}{'texts/s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in rows:
+        print(f"{row['backend']:<12}{row['load_s']:>9.2f}{row['rss_mb']:>9.0f}{row['texts_per_s']:>10.1f}"
+              f"{row['query_ms_p50']:>9.2f}{row['query_ms_p95']:>9.2f}")
+
+    print(f"\nrecall@{k} vs {baseline_backend}/float32")
+    print(f"{'backend':<12}{'storage':<10}{'recall':>9}{'index MB':>10}")
+    for row in recall_rows:
+        print(f"{row['backend']:<12}{row['storage']:<10}{row['recall_at_k']:>9.3f}{row['index_mb']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"encoders": rows, "recall": recall_rows}, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Recall-vs-latency report for the supported FAISS index types
+
+Compares every index type (and nprobe / efSearch setting) against the
+exact flat baseline. Uses the vectors of the current knowledge base, or a
+synthetic corpus to project behaviour at larger scale.
+
+Usage:
+    python scripts/benchmark_index.py                     # current KB
+    python scripts/benchmark_index.py --synthetic 200000  # random unit vectors
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.getcwd())
+
+from src.config import settings
+from src.services.index_factory import INDEX_TYPES, recall_latency_report
+
+
+def load_corpus(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        vectors = rng.standard_normal((args.synthetic, settings.embedding_dim)).astype("float32")
+    else:
+        from src.services.retriever import vector_db
+        texts = [doc["text"] for doc in vector_db.documents]
+        if not texts:
+            print("❌ Knowledge base is empty - ingest data or use --synthetic")
+            sys.exit(1)
+        vectors = np.array(vector_db.encoder.encode(texts, batch_size=256)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS recall vs latency report")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of random vectors to index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    vectors = load_corpus(args)
+
+    # Queries are perturbed corpus vectors, like paraphrases of indexed questions
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), vectors.shape[1])).astype("float32")
+
+    report = recall_latency_report(vectors, queries, args.index_types, k=min(args.k, len(vectors)))
+
+    print(f"\n📊 {len(vectors)} vectors, {len(queries)} queries, recall@{args.k}")
+    print(f"{'index':<10}{'nprobe':>8}{'efSearch':>10}{'recall':>9}{'p50 ms':>10}{'p95 ms':>10}{'build s':>10}")
+    for row in report:
+        print(f"{row['index_type']:<10}{row['nprobe'] or '-':>8}{row['ef_search'] or '-':>10}"
+              f"{row['recall_at_k']:>9.3f}{row['latency_ms_p50']:>10.3f}{row['latency_ms_p95']:>10.3f}"
+              f"{row['build_s']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
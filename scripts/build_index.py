@@ -0,0 +1,33 @@
+"""
+Rebuild the FAISS index with the configured (or given) index type
+
+Usage:
+    python scripts/build_index.py --index-type ivf_flat
+    python scripts/build_index.py --index-type hnsw --storage float16
+"""
+import argparse
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.getcwd())
+
+from src.config import settings
+from src.services.index_factory import INDEX_TYPES, VECTOR_STORAGE
+from src.services.retriever import vector_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild and train the FAISS index")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=settings.faiss_index_type)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--storage", choices=list(VECTOR_STORAGE), default=settings.faiss_vector_storage)
+    args = parser.parse_args()
+
+    print(f"🔧 Rebuilding {args.index_type} ({args.storage}) index over {len(vector_db.documents)} documents...")
+    vector_db.rebuild_index(args.index_type, batch_size=args.batch_size, storage=args.storage)
+    print(f"✅ Saved index to {settings.faiss_index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,34 @@
-
-import json
+import argparse
 import os
 import sys
 
 # Add project root to path
 sys.path.append(os.getcwd())
 
+from src.data.faq_loader import ingest_stream
 from src.services.retriever import vector_db
-from src.config import settings
 
 def ingest_faqs():
+    parser = argparse.ArgumentParser(description="Stream a FAQ/KB export (.json, .jsonl, .csv) into the vector DB")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "sample_faqs.json"))
+    parser.add_argument("--batch-size", type=int, default=256, help="Documents per encode/flush batch")
+    parser.add_argument("--workers", type=int, default=0, help="Encoder processes (0 = encode in-process)")
+    parser.add_argument("--prune", action="store_true", help="Delete indexed FAQs missing from the export")
+    args = parser.parse_args()
+
     print("🚀 Starting Data Ingestion...")
-    
-    faq_path = os.path.join("data", "sample_faqs.json")
-    if not os.path.exists(faq_path):
-        print(f"❌ Error: {faq_path} not found!")
+
+    if not os.path.exists(args.path):
+        print(f"❌ Error: {args.path} not found!")
         return
 
-    with open(faq_path, "r") as f:
-        faqs = json.load(f)
-        
-    documents = []
-    for faq in faqs:
-        doc = {
-            "id": faq["id"],
-            "text": f"Question: {faq['question']}\nAnswer: {faq['answer']}",
-            "metadata": {"category": faq["category"]}
-        }
-        documents.append(doc)
-        
-    print(f"📄 Found {len(documents)} FAQs. Adding to Vector DB...")
-    vector_db.add_documents(documents)
-    print("✅ Ingestion Complete!")
+    print(f"📄 Streaming {args.path}. Syncing Vector DB...")
+    # Only new or changed FAQs are re-embedded; re-running does not duplicate
+    stats = ingest_stream(args.path, batch_size=args.batch_size, workers=args.workers, prune=args.prune)
+    vector_db.wait_for_compaction()
+    print(f"✅ Ingestion Complete! {stats['read']} read, {stats['upserted']} upserted, "
+          f"{stats['unchanged']} unchanged, {stats['deleted']} deleted "
+          f"({stats['records_per_second']:.0f} records/s)")
 
 if __name__ == "__main__":
     ingest_faqs()
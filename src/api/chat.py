@@ -1,148 +1,363 @@
 """
 Chat API Endpoint
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
-from uuid import uuid4
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+import json
 import logging
+import time
 
-from src.database import get_db_dependency
+from src.config import settings
+from src.database import get_db_dependency, run_db
 from src.models.schemas import ChatRequest, ChatResponse, MessageResponse
 from src.models.models import Session as SessionModel, Message
 from src.services.llm_client import llm_client
-from src.services.prompt_orchestrator import orchestrator
+from src.services.llm_scheduler import LLMDeadlineExceeded
+from src.services.model_router import model_router
+from src.services.prompt_orchestrator import orchestrator, AnswerTextStreamParser
+from src.services.response_cache import response_cache
+from src.services.retrieval_worker import retrieval_worker
+from src.services.retriever import used_encoder, vector_db
+from src.services.session_memory import NO_SUMMARY, recent_messages, session_summary, summarizer
+from src.services.stage_timings import begin_request, server_timing, stage, stage_log
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-@router.post("", response_model=ChatResponse)
-async def chat_endpoint(
-    request: ChatRequest,
-    db: Session = Depends(get_db_dependency)
-):
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+}
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _save_user_message(db: Session, session_id: UUID, content: str) -> Tuple[UUID, str]:
     """
-    Send a message to the AI assistant
+    Validate the session and persist the incoming user message
+
+    Returns:
+        (message id, the session's running summary)
     """
-    # 1. Validate Session
-    session = db.query(SessionModel).filter(SessionModel.id == request.session_id).first()
+    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
 
-    # 2. Save User Message
     # Skip token counting to save API quota for demo
-    user_tokens = len(request.message) // 4
-
     user_msg = Message(
-        session_id=session.id,
+        session_id=session_id,
         role="user",
-        content=request.message,
-        tokens=user_tokens
+        content=content,
+        tokens=len(content) // 4
     )
     db.add(user_msg)
     db.commit()
+    return user_msg.id, session_summary(session)
+
 
-    # MOCK FOR DEMO VIDEO (BYPASS API RATE LIMITS)
-    mock_map = {
-        "how do i reset my password?": "To reset your password, click on 'Forgot Password' on the login page. Enter your email address and follow the instructions sent to your inbox.",
-        "how can i update my billing information?": "Go to settings > Billing & Subscription. Click 'Update Payment Method' to add a new card or modify existing details.",
-        "what is your refund policy?": "We offer a full refund within 30 days of purchase if you are not satisfied. Contact support to process the request.",
-        "where can i find my api keys?": "API keys are located in the Developer Dashboard under settings. Do not share your keys publicly.",
-        "how do i contact human support?": "You can reach our support team 24/7 via this chat (just ask for a human) or email support@example.com."
-    }
-    
-    clean_msg = request.message.strip().lower().rstrip('?') + "?" 
-    if clean_msg in mock_map:
-         answer_text = mock_map[clean_msg]
-         confidence = 1.0
-         sources = ["faq_demo"]
-         next_action = "reply"
-         
-         # Log mock hit
-         logger.info(f"Using mock for: {clean_msg}")
-         
-         # Save assistant msg first
-         assistant_msg = Message(
-            session_id=session.id,
-            role="assistant",
-            content=answer_text,
-            confidence=confidence,
-            sources=sources,
-            tokens=len(answer_text) // 4
-         )
-         db.add(assistant_msg)
-         db.commit()
-         db.refresh(assistant_msg)
-         
-         return ChatResponse(
-            message_id=assistant_msg.id,
-            answer_text=answer_text,
-            confidence=confidence,
-            sources=sources,
-            next_action=next_action,
-            action_payload={}
-         )
-
-    # 3. Retrieve History & Build Prompt
-    history_objs = db.query(Message).filter(
-        Message.session_id == session.id
-    ).order_by(Message.timestamp.asc()).all()
-    
-    history_schema = [
+def _load_history(
+    db: Session,
+    session_id: UUID,
+    exclude_id: Optional[UUID] = None,
+    limit: Optional[int] = None,
+    token_budget: Optional[int] = None
+) -> Tuple[List[MessageResponse], bool]:
+    """
+    Load the bounded recent history of a session (see recent_messages)
+
+    Returns:
+        (messages oldest first, whether older messages were left out)
+    """
+    messages, truncated = recent_messages(db, session_id, exclude_id, limit, token_budget)
+    return [
         MessageResponse(
-            id=m.id, role=m.role, content=m.content, 
+            id=m.id, role=m.role, content=m.content,
             confidence=m.confidence, sources=m.sources, timestamp=m.timestamp
-        ) for m in history_objs[:-1] # Exclude current user msg
-    ]
+        ) for m in messages
+    ], truncated
 
-    prompt, retrievals = await orchestrator.build_prompt(
-        user_message=request.message,
-        chat_history=history_schema
+
+def _save_assistant_message(
+    db: Session,
+    session_id: UUID,
+    answer_text: str,
+    confidence: float,
+    sources: List[str],
+    prompt_tokens: Optional[int] = None
+) -> Message:
+    """Persist the assistant reply and bump the session activity timestamp"""
+    assistant_msg = Message(
+        session_id=session_id,
+        role="assistant",
+        content=answer_text,
+        confidence=confidence,
+        sources=sources,
+        tokens=len(answer_text) // 4,
+        prompt_tokens=prompt_tokens
     )
+    db.add(assistant_msg)
 
-    # 4. Call LLM
+    # Update session last active
+    db.query(SessionModel).filter(SessionModel.id == session_id).update(
+        {SessionModel.last_active_at: func.now()}, synchronize_session=False
+    )
+    db.commit()
+    db.refresh(assistant_msg)
+    return assistant_msg
+
+
+def _finish_timings(timings: Dict[str, float], headers=None):
+    """Log a completed request's stage timings, exposing them in a Server-Timing header if enabled"""
+    stage_log.record(timings)
+    if headers is not None and settings.server_timing_enabled:
+        headers["Server-Timing"] = server_timing(timings)
+
+
+def _failure_answer(error: Exception, retrievals: Optional[List[Dict[str, Any]]]) -> Tuple[str, float, List[str], str, dict]:
+    """
+    Reply fields for a failed generation: the top retrieved FAQ when the
+    LLM missed its deadline, otherwise an apology that escalates
+    """
+    if isinstance(error, LLMDeadlineExceeded):
+        degraded = orchestrator.degraded_response(retrievals)
+        if degraded is not None:
+            return (degraded["answer_text"], degraded["confidence"], degraded["sources"],
+                    degraded["next_action"], degraded["action_payload"])
+    return "I apologize, but I encountered a system error.", 0.0, [], "escalate", {}
+
+
+def _single_event_stream(response: ChatResponse, timings: Dict[str, float]) -> StreamingResponse:
+    """Wrap an already complete answer in the streaming event format"""
+    async def events() -> AsyncGenerator[str, None]:
+        yield _sse_event("token", {"text": response.answer_text})
+        yield _sse_event("done", response.model_dump(mode="json"))
+
+    headers = dict(SSE_HEADERS)
+    _finish_timings(timings, headers)
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+async def _stream_llm_answer(
+    db: Session,
+    session_id: UUID,
+    prompt: str,
+    on_complete: Optional[Callable[[ChatResponse], Awaitable[None]]] = None,
+    prompt_tokens: Optional[int] = None,
+    retrievals: Optional[List[Dict[str, Any]]] = None,
+    model_name: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None
+) -> AsyncGenerator[str, None]:
+    """
+    Stream the LLM answer as Server-Sent Events
+
+    Emits 'token' events carrying the answer_text as it is decoded from the
+    partially received JSON, then a final 'done' event with the full
+    ChatResponse once the assistant message has been persisted.
+    """
+    timings = {} if timings is None else timings
+    parser = AnswerTextStreamParser()
+    raw_chunks = []
+
+    started = time.perf_counter()
     try:
-        raw_response = await llm_client.generate_response(prompt)
-        parsed_response = orchestrator.parse_llm_response(raw_response)
-        
+        async for chunk in llm_client.generate_response_stream(prompt, model_name=model_name):
+            if not raw_chunks:
+                timings["llm_first_token"] = time.perf_counter() - started
+            raw_chunks.append(chunk)
+            delta = parser.feed(chunk)
+            if delta:
+                yield _sse_event("token", {"text": delta})
+
+        parsed_response = orchestrator.parse_llm_response("".join(raw_chunks))
         answer_text = parsed_response.get("answer_text", "I'm having trouble connecting right now.")
         confidence = parsed_response.get("confidence", 0.0)
         sources = parsed_response.get("sources", [])
         next_action = parsed_response.get("next_action", "reply")
-        
+        action_payload = {}
+        llm_failed = False
+
     except Exception as e:
         logger.error(f"LLM Error: {e}")
-        answer_text = "I apologize, but I encountered a system error."
-        confidence = 0.0
-        sources = []
-        next_action = "escalate"
+        answer_text, confidence, sources, next_action, action_payload = _failure_answer(e, retrievals)
+        llm_failed = True
+    timings["llm"] = time.perf_counter() - started
 
-    # 5. Save Assistant Message
-    assistant_tokens = len(answer_text) // 4
+    # Flush whatever the incremental parser could not emit (non-JSON output, errors)
+    if not answer_text.startswith(parser.text):
+        yield _sse_event("reset", {})
+        yield _sse_event("token", {"text": answer_text})
+    elif len(answer_text) > len(parser.text):
+        yield _sse_event("token", {"text": answer_text[len(parser.text):]})
 
-    assistant_msg = Message(
-        session_id=session.id,
-        role="assistant",
-        content=answer_text,
+    started = time.perf_counter()
+    assistant_msg = await run_db(
+        _save_assistant_message, db, session_id, answer_text, confidence, sources, prompt_tokens
+    )
+    timings["persist"] = time.perf_counter() - started
+    _finish_timings(timings)
+
+    response = ChatResponse(
+        message_id=assistant_msg.id,
+        answer_text=answer_text,
         confidence=confidence,
         sources=sources,
-        tokens=assistant_tokens
+        next_action=next_action,
+        action_payload=action_payload
     )
-    db.add(assistant_msg)
-    
-    # Update session last active
-    session.last_active_at = func.now()
-    db.commit()
-    db.refresh(assistant_msg)
+    yield _sse_event("done", response.model_dump(mode="json"))
+
+    if on_complete is not None and not llm_failed:
+        await on_complete(response)
+
+
+@router.post("", response_model=ChatResponse)
+async def chat_endpoint(
+    request: ChatRequest,
+    http_response: Response,
+    db: Session = Depends(get_db_dependency)
+):
+    """
+    Send a message to the AI assistant
+
+    When request.stream is true the reply is sent as Server-Sent Events
+    ('token' events with answer text deltas, then a 'done' event with the
+    full ChatResponse) instead of a single JSON body. Time spent per
+    pipeline stage is logged to stage_log (and sent as a Server-Timing
+    header when settings.server_timing_enabled, except on LLM streams).
+    """
+    timings = begin_request()
+
+    # 1. Validate Session & 2. Save User Message
+    session_id = request.session_id
+    with stage("db"):
+        user_msg_id, summary = await run_db(_save_user_message, db, session_id, request.message)
+
+    # 3. Retrieve documents, route & check the semantic response cache
+    retrievals = await orchestrator.retrieve(request.message)
+
+    decision = model_router.route(retrievals, request.message)
+    if decision["route"] == "faq":
+        # Near-exact FAQ match: its stored answer is the reply
+        answer = model_router.direct_answer(decision, retrievals)
+        with stage("persist"):
+            assistant_msg = await run_db(
+                _save_assistant_message, db, session_id,
+                answer["answer_text"], answer["confidence"], answer["sources"]
+            )
+        response = ChatResponse(message_id=assistant_msg.id, **answer)
+        if request.stream:
+            return _single_event_stream(response, timings)
+        _finish_timings(timings, http_response.headers)
+        return response
+
+    cache_namespace = vector_db.index_version
+    query_vector = None
+    # Served from the query embedding cache after a dense search; a confident
+    # BM25 match skipped the encoder, so it is not encoded just for the cache key
+    if response_cache.enabled and retrievals and used_encoder(retrievals):
+        try:
+            query_vector = await retrieval_worker.embed(request.message)
+        except Exception as e:
+            logger.warning(f"Query embedding for response cache failed: {e}")
+
+    if query_vector is not None:
+        with stage("cache"):
+            cached = await response_cache.lookup(cache_namespace, query_vector, retrievals)
+        if cached is not None:
+            logger.info("Serving response from semantic cache")
+            with stage("persist"):
+                assistant_msg = await run_db(
+                    _save_assistant_message, db, session_id,
+                    cached["answer_text"], cached["confidence"], cached["sources"]
+                )
+            response = ChatResponse(message_id=assistant_msg.id, **cached)
+            if request.stream:
+                return _single_event_stream(response, timings)
+            _finish_timings(timings, http_response.headers)
+            return response
+
+    # 4. Retrieve History & Build Prompt
+    with stage("db"):
+        history_schema, history_truncated = await run_db(_load_history, db, session_id, user_msg_id)
+
+    # The cache is shared across sessions: only replies that saw no conversation
+    # (which may hold the user's own details) are stored for reuse
+    cacheable = not history_schema and summary == NO_SUMMARY
+
+    async def cache_response(response: ChatResponse):
+        """Store a successful LLM reply for future paraphrases of this query"""
+        if cacheable and query_vector is not None and response.next_action == "reply":
+            payload = response.model_dump(mode="json", exclude={"message_id"})
+            await response_cache.store(cache_namespace, query_vector, retrievals, payload)
+
+    with stage("prompt"):
+        prompt, _, prompt_tokens = await orchestrator.build_prompt(
+            user_message=request.message,
+            chat_history=history_schema,
+            session_summary=summary,
+            retrievals=retrievals
+        )
+
+    async def after_reply(response: ChatResponse):
+        await cache_response(response)
+        if history_truncated:
+            # Turns that left the window get folded into the summary off the request path
+            summarizer.schedule(session_id)
+
+    # 5. Call LLM
+    if request.stream:
+        return StreamingResponse(
+            _stream_llm_answer(
+                db, session_id, prompt,
+                on_complete=after_reply, prompt_tokens=prompt_tokens,
+                retrievals=retrievals, model_name=decision["model"], timings=timings
+            ),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+
+    try:
+        with stage("llm"):
+            raw_response = await llm_client.generate_response(prompt, model_name=decision["model"])
+        parsed_response = orchestrator.parse_llm_response(raw_response)
+        
+        answer_text = parsed_response.get("answer_text", "I'm having trouble connecting right now.")
+        confidence = parsed_response.get("confidence", 0.0)
+        sources = parsed_response.get("sources", [])
+        next_action = parsed_response.get("next_action", "reply")
+        action_payload = {}
+        llm_failed = False
+        
+    except Exception as e:
+        logger.error(f"LLM Error: {e}")
+        answer_text, confidence, sources, next_action, action_payload = _failure_answer(e, retrievals)
+        llm_failed = True
+
+    # 6. Save Assistant Message
+    with stage("persist"):
+        assistant_msg = await run_db(
+            _save_assistant_message, db, session_id, answer_text, confidence, sources, prompt_tokens
+        )
+    _finish_timings(timings, http_response.headers)
 
-    return ChatResponse(
+    response = ChatResponse(
         message_id=assistant_msg.id,
         answer_text=answer_text,
         confidence=confidence,
         sources=sources,
         next_action=next_action,
-        action_payload={}
+        action_payload=action_payload
     )
+    if not llm_failed:
+        await after_reply(response)
+    return response
@@ -5,21 +5,14 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from uuid import UUID
 
-from src.database import get_db_dependency
+from src.database import get_db_dependency, run_db
 from src.models.schemas import EscalationCreate, EscalationResponse
 from src.models.models import Session as SessionModel
 from src.services.escalation_engine import escalation_engine
 
 router = APIRouter(prefix="/escalate", tags=["Escalation"])
 
-@router.post("", response_model=EscalationResponse, status_code=status.HTTP_201_CREATED)
-async def create_escalation(
-    escalation_data: EscalationCreate,
-    db: Session = Depends(get_db_dependency)
-):
-    """
-    Create an escalation ticket
-    """
+def _create_escalation(db: Session, escalation_data: EscalationCreate) -> EscalationResponse:
     # Validate session
     session = db.query(SessionModel).filter(SessionModel.id == escalation_data.session_id).first()
     if not session:
@@ -29,3 +22,14 @@ async def create_escalation(
         )
         
     return escalation_engine.create_ticket(db, escalation_data)
+
+
+@router.post("", response_model=EscalationResponse, status_code=status.HTTP_201_CREATED)
+async def create_escalation(
+    escalation_data: EscalationCreate,
+    db: Session = Depends(get_db_dependency)
+):
+    """
+    Create an escalation ticket
+    """
+    return await run_db(_create_escalation, db, escalation_data)
@@ -5,20 +5,14 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from uuid import UUID
 
-from src.database import get_db_dependency
+from src.database import get_db_dependency, run_db
 from src.models.schemas import FeedbackCreate
 from src.models.models import Feedback, Session as SessionModel, Message
 
 router = APIRouter(prefix="/feedback", tags=["Feedback"])
 
-@router.post("", status_code=status.HTTP_201_CREATED)
-async def submit_feedback(
-    feedback_data: FeedbackCreate,
-    db: Session = Depends(get_db_dependency)
-):
-    """
-    Submit feedback for a specific message in a session
-    """
+def _save_feedback(db: Session, feedback_data: FeedbackCreate) -> None:
+    """Validate the referenced session/message and store the feedback row"""
     # 1. Validate Session
     session = db.query(SessionModel).filter(SessionModel.id == feedback_data.session_id).first()
     if not session:
@@ -51,5 +45,16 @@ async def submit_feedback(
     
     db.add(new_feedback)
     db.commit()
+
+
+@router.post("", status_code=status.HTTP_201_CREATED)
+async def submit_feedback(
+    feedback_data: FeedbackCreate,
+    db: Session = Depends(get_db_dependency)
+):
+    """
+    Submit feedback for a specific message in a session
+    """
+    await run_db(_save_feedback, db, feedback_data)
     
     return {"status": "success", "message": "Feedback submitted"}
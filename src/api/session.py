@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from uuid import UUID
 
-from src.database import get_db_dependency
+from src.database import get_db_dependency, run_db
 from src.models.models import Session as SessionModel, Message, User
 from src.models.schemas import (
     SessionCreate,
@@ -19,21 +19,8 @@ from src.models.schemas import (
 router = APIRouter(prefix="/session", tags=["Session"])
 
 
-@router.post("", response_model=SessionResponse, status_code=status.HTTP_201_CREATED)
-async def create_session(
-    session_data: SessionCreate,
-    db: Session = Depends(get_db_dependency)
-):
-    """
-    Create a new support session
-    
-    Args:
-        session_data: Session creation data (optional user_id and metadata)
-        db: Database session
-        
-    Returns:
-        SessionResponse with session_id and created_at timestamp
-    """
+def _create_session(db: Session, session_data: SessionCreate) -> SessionModel:
+    """Validate the optional user and insert the session row"""
     # Validate user_id if provided
     if session_data.user_id:
         user = db.query(User).filter(User.id == session_data.user_id).first()
@@ -52,46 +39,17 @@ async def create_session(
     db.add(new_session)
     db.commit()
     db.refresh(new_session)
-    
-    return SessionResponse(
-        session_id=new_session.id,
-        created_at=new_session.created_at
-    )
+    return new_session
 
 
-@router.get("", response_model=List[SessionSummary])
-async def list_sessions(
-    limit: int = 50,
-    db: Session = Depends(get_db_dependency)
-):
-    """
-    List recent sessions
-    """
-    try:
-        sessions = db.query(SessionModel).order_by(
-            SessionModel.last_active_at.desc()
-        ).limit(limit).all()
-        return sessions
-    except Exception as e:
-        print(f"DEBUG: Error listing sessions: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+def _list_sessions(db: Session, limit: int) -> List[SessionModel]:
+    return db.query(SessionModel).order_by(
+        SessionModel.last_active_at.desc()
+    ).limit(limit).all()
 
 
-@router.get("/{session_id}/history", response_model=SessionHistoryResponse)
-async def get_session_history(
-    session_id: UUID,
-    db: Session = Depends(get_db_dependency)
-):
-    """
-    Retrieve conversation history for a session
-    
-    Args:
-        session_id: UUID of the session
-        db: Database session
-        
-    Returns:
-        SessionHistoryResponse with all messages in chronological order
-    """
+def _load_session_history(db: Session, session_id: UUID) -> SessionHistoryResponse:
+    """Fetch a session and all of its messages in chronological order"""
     # Fetch session
     session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
     
@@ -127,6 +85,75 @@ async def get_session_history(
     )
 
 
+def _delete_session(db: Session, session_id: UUID) -> None:
+    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+    
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Session {session_id} not found"
+        )
+    
+    db.delete(session)
+    db.commit()
+
+
+@router.post("", response_model=SessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_session(
+    session_data: SessionCreate,
+    db: Session = Depends(get_db_dependency)
+):
+    """
+    Create a new support session
+    
+    Args:
+        session_data: Session creation data (optional user_id and metadata)
+        db: Database session
+        
+    Returns:
+        SessionResponse with session_id and created_at timestamp
+    """
+    new_session = await run_db(_create_session, db, session_data)
+    
+    return SessionResponse(
+        session_id=new_session.id,
+        created_at=new_session.created_at
+    )
+
+
+@router.get("", response_model=List[SessionSummary])
+async def list_sessions(
+    limit: int = 50,
+    db: Session = Depends(get_db_dependency)
+):
+    """
+    List recent sessions
+    """
+    try:
+        return await run_db(_list_sessions, db, limit)
+    except Exception as e:
+        print(f"DEBUG: Error listing sessions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{session_id}/history", response_model=SessionHistoryResponse)
+async def get_session_history(
+    session_id: UUID,
+    db: Session = Depends(get_db_dependency)
+):
+    """
+    Retrieve conversation history for a session
+    
+    Args:
+        session_id: UUID of the session
+        db: Database session
+        
+    Returns:
+        SessionHistoryResponse with all messages in chronological order
+    """
+    return await run_db(_load_session_history, db, session_id)
+
+
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def close_session(
     session_id: UUID,
@@ -139,15 +166,6 @@ async def close_session(
         session_id: UUID of the session to close
         db: Database session
     """
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
-    
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Session {session_id} not found"
-        )
-    
-    db.delete(session)
-    db.commit()
+    await run_db(_delete_session, db, session_id)
     
     return None
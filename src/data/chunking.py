@@ -0,0 +1,137 @@
+"""
+Document Chunking
+Splits long documents into overlapping chunks that fit the embedding window
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from src.config import settings
+from src.services.retriever import compute_content_hash
+
+TOKEN_RE = re.compile(r"\S+")
+# A sentence runs up to terminal punctuation or a line break
+SENTENCE_RE = re.compile(r"[^.!?\n]+(?:[.!?]+|\n|$)|[.!?\n]+")
+
+# (char_start, char_end, token_count)
+Unit = Tuple[int, int, int]
+
+
+def _token_units(text: str, start: int = 0, end: Optional[int] = None) -> List[Unit]:
+    return [(m.start(), m.end(), 1) for m in TOKEN_RE.finditer(text, start, len(text) if end is None else end)]
+
+
+def _sentence_units(text: str, chunk_size: int) -> List[Unit]:
+    units = []
+    for m in SENTENCE_RE.finditer(text):
+        tokens = _token_units(text, m.start(), m.end())
+        if not tokens:
+            continue
+        if len(tokens) > chunk_size:
+            # A sentence longer than a chunk falls back to token windows
+            units.extend(tokens)
+        else:
+            units.append((tokens[0][0], tokens[-1][1], len(tokens)))
+    return units
+
+
+def chunk_spans(
+    text: str,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    unit: Optional[str] = None
+) -> List[Tuple[int, int]]:
+    """
+    Character spans of the chunks for a text
+
+    Units (sentences or tokens) are packed greedily up to chunk_size tokens;
+    each chunk after the first repeats the trailing units of the previous
+    one, up to chunk_overlap tokens.
+
+    Args:
+        text: Text to split
+        chunk_size: Max tokens per chunk (defaults to settings.chunk_size)
+        chunk_overlap: Tokens shared by consecutive chunks (settings.chunk_overlap)
+        unit: 'sentence' or 'token' (settings.chunk_unit)
+    """
+    chunk_size = chunk_size or settings.chunk_size
+    chunk_overlap = settings.chunk_overlap if chunk_overlap is None else chunk_overlap
+    unit = unit or settings.chunk_unit
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    if unit == "sentence":
+        units = _sentence_units(text, chunk_size)
+    elif unit == "token":
+        units = _token_units(text)
+    else:
+        raise ValueError(f"Unknown chunk unit: {unit} (expected 'sentence' or 'token')")
+
+    spans = []
+    i = 0
+    while i < len(units):
+        j, total = i, 0
+        while j < len(units) and (j == i or total + units[j][2] <= chunk_size):
+            total += units[j][2]
+            j += 1
+        spans.append((units[i][0], units[j - 1][1]))
+        if j == len(units):
+            break
+
+        # Step back over the overlap, always making progress and leaving
+        # room for the next unit so a chunk is never pure overlap
+        back, overlap = j, 0
+        while (
+            back - 1 > i
+            and overlap + units[back - 1][2] <= chunk_overlap
+            and overlap + units[back - 1][2] + units[j][2] <= chunk_size
+        ):
+            back -= 1
+            overlap += units[back][2]
+        i = back
+    return spans
+
+
+def chunk_document(
+    doc: Dict[str, Any],
+    prefix: str = "",
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    unit: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Split a document into chunk documents
+
+    A document that fits in one chunk is returned unchanged. Otherwise each
+    chunk gets the id '<parent id>#c<n>' and records parent_id, chunk_index,
+    chunk_count and its char_start/char_end offsets in the parent text in
+    its metadata. Chunks carry the parent's content hash so unchanged
+    parents can be skipped on re-ingestion.
+
+    Args:
+        doc: Document with 'id', 'text' and optional 'metadata'
+        prefix: Text prepended to chunks that do not start the document
+            (e.g. the FAQ question, so every chunk keeps its subject)
+    """
+    text = doc.get("text", "")
+    spans = chunk_spans(text, chunk_size, chunk_overlap, unit)
+    if len(spans) <= 1:
+        return [doc]
+
+    parent_id = doc.get("id")
+    content_hash = doc.get("content_hash") or compute_content_hash(doc)
+    chunks = []
+    for index, (start, end) in enumerate(spans):
+        metadata = dict(doc.get("metadata") or {})
+        metadata.update({
+            "parent_id": parent_id,
+            "chunk_index": index,
+            "chunk_count": len(spans),
+            "char_start": start,
+            "char_end": end,
+        })
+        chunks.append({
+            "id": f"{parent_id}#c{index}",
+            "text": (prefix if start > 0 else "") + text[start:end],
+            "metadata": metadata,
+            "content_hash": content_hash,
+        })
+    return chunks
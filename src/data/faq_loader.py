@@ -1,25 +1,166 @@
 """
 FAQ Data Loader
-Loads FAQ dataset from JSON/CSV and populates Vector DB
+Loads FAQ dataset from JSON/JSON Lines/CSV and populates Vector DB
 """
 import json
 import csv
 import os
-from typing import List, Dict, Any
-from src.services.retriever import vector_db
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
+import numpy as np
+from src.config import settings
+from src.data.chunking import chunk_document
+from src.services.encoders import create_encoder
+from src.services.retriever import vector_db, compute_content_hash
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Size of the reads used when incrementally parsing a JSON array
+JSON_READ_CHUNK = 1 << 20
+
+
 def load_faqs_from_json(file_path: str) -> List[Dict[str, Any]]:
     """Load FAQs from JSON file"""
     with open(file_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     return data
 
-def process_and_index_faqs(faqs: List[Dict[str, Any]]):
+
+def iter_faqs(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream FAQ records from disk without loading the whole file
+
+    Supports JSON Lines (.jsonl/.ndjson), CSV with id/question/answer/category
+    columns, and a top-level JSON array (.json), which is decoded
+    element by element.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ext == ".csv":
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+    else:
+        yield from _iter_json_array(file_path)
+
+
+def _iter_json_array(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Decode the elements of a top-level JSON array while reading it in chunks"""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != "[":
+                    raise ValueError(f"{file_path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if started and pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            decoded = False
+            if pos < len(buffer):
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    decoded = True
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+
+            if not decoded:
+                if eof:
+                    raise ValueError(f"{file_path}: unterminated JSON array")
+                chunk = f.read(JSON_READ_CHUNK)
+                eof = not chunk
+                # Drop consumed input so the buffer stays bounded by one element + one chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield item
+            pos = end
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most `size` items"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def faq_to_document(faq: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the indexed document (with its content hash) for one FAQ"""
+    # Create a text representation for embedding
+    # We assume the user searches for the question or content related to the answer
+    text = f"Question: {faq['question']}\nAnswer: {faq['answer']}"
+
+    doc = {
+        "id": faq.get("id"),
+        "text": text,
+        "metadata": {
+            "category": faq.get("category"),
+            "question": faq.get("question"),
+            "answer": faq.get("answer")
+        }
+    }
+    doc["content_hash"] = compute_content_hash(doc)
+    return doc
+
+
+def _plan_batch(
+    faqs: List[Dict[str, Any]],
+    seen_ids: Optional[Set[Any]] = None
+) -> Tuple[int, List[Dict[str, Any]], List[Any]]:
+    """
+    Chunk the new or changed FAQs of a batch
+
+    Returns:
+        (number of changed FAQs, chunk documents to upsert, ids of
+        previously indexed chunks those FAQs no longer produce)
+    """
+    changed, chunks, stale = 0, [], []
+    for faq in faqs:
+        doc = faq_to_document(faq)
+        if seen_ids is not None:
+            seen_ids.add(doc["id"])
+        if vector_db.get_content_hash(doc["id"]) == doc["content_hash"]:
+            continue
+        changed += 1
+        doc_chunks = chunk_document(doc, prefix=f"Question: {faq['question']}\n")
+        new_ids = {chunk["id"] for chunk in doc_chunks}
+        stale.extend(i for i in vector_db.chunk_ids(doc["id"]) if i not in new_ids)
+        chunks.extend(doc_chunks)
+    return changed, chunks, stale
+
+
+def _write_batch(chunks: List[Dict[str, Any]], stale: List[Any], embeddings: Optional[np.ndarray] = None):
+    """Upsert the new chunks, then drop the ones they replace"""
+    if chunks:
+        vector_db.upsert_documents(chunks, embeddings)
+    if stale:
+        vector_db.delete_documents(stale)
+
+
+def process_and_index_faqs(faqs: List[Dict[str, Any]], prune: bool = False) -> Dict[str, int]:
     """
-    Process FAQs and add to vector DB
+    Process FAQs and upsert the new or changed ones into the vector DB
     Format:
     {
         "id": "...",
@@ -27,27 +168,151 @@ def process_and_index_faqs(faqs: List[Dict[str, Any]]):
         "answer": "...",
         "category": "..."
     }
+
+    Unchanged FAQs (same content hash as the indexed copy) are skipped.
+    Long FAQs are indexed as overlapping chunks (see src.data.chunking).
+    With prune=True, indexed documents missing from `faqs` are deleted.
     """
-    documents = []
-    for faq in faqs:
-        # Create a text representation for embedding
-        # We assume the user searches for the question or content related to the answer
-        text = f"Question: {faq['question']}\nAnswer: {faq['answer']}"
-        
-        doc = {
-            "id": faq.get("id"),
-            "text": text,
-            "metadata": {
-                "category": faq.get("category"),
-                "question": faq.get("question"),
-                "answer": faq.get("answer")
-            }
-        }
-        documents.append(doc)
-    
-    if documents:
-        vector_db.add_documents(documents)
-        logger.info(f"Successfully indexed {len(documents)} FAQs")
+    seen_ids = set()
+    changed, chunks, stale = _plan_batch(faqs, seen_ids)
+    _write_batch(chunks, stale)
+
+    deleted = 0
+    if prune:
+        stale_ids = [doc_id for doc_id in vector_db.parent_ids() if doc_id not in seen_ids]
+        if stale_ids:
+            deleted = len(stale_ids)
+            vector_db.delete_documents(stale_ids)
+
+    stats = {"upserted": changed, "unchanged": len(seen_ids) - changed, "deleted": deleted}
+    logger.info(f"Indexed FAQs: {stats}")
+    return stats
+
+
+# Encoder held by each ingestion worker process
+_worker_encoder = None
+
+
+def _init_encoder_worker(backend: str, model_name: str):
+    global _worker_encoder
+    _worker_encoder = create_encoder(backend, model_name)
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return np.array(_worker_encoder.encode(texts)).astype('float32')
+
+
+def ingest_stream(
+    file_path: str,
+    batch_size: int = 256,
+    workers: int = 0,
+    prune: bool = False,
+    log_every: int = 10
+) -> Dict[str, Any]:
+    """
+    Stream a large FAQ/KB export into the vector DB in fixed-size batches
+
+    Records are read incrementally, unchanged documents are skipped by
+    content hash, long ones are split into chunks, and each batch is
+    encoded and flushed to the index (via the write-ahead log) before the
+    next is read, so memory stays bounded by a few batches regardless of
+    file size. Automatic compaction is deferred until the whole export has
+    been written. Into an untrained IVF/PQ index, batches are held back until
+    there are enough vectors to train it at full size (or the export ends),
+    so the coarse quantizer is not sized to the first batch.
+
+    Args:
+        file_path: .jsonl/.ndjson, .csv or .json export
+        batch_size: Documents per encode call / index flush
+        workers: Encoder processes (0 = encode in this process)
+        prune: Delete indexed documents that are absent from the export
+        log_every: Report progress every N batches
+
+    Returns:
+        Counters plus elapsed seconds and throughput
+    """
+    stats = {"read": 0, "upserted": 0, "unchanged": 0, "chunks": 0, "deleted": 0}
+    seen_ids = set() if prune else None
+    start = time.perf_counter()
+
+    def changed_documents() -> Iterator[Tuple[int, List[Dict[str, Any]], List[Any]]]:
+        for faqs in batched(iter_faqs(file_path), batch_size):
+            changed, chunks, stale = _plan_batch(faqs, seen_ids)
+            stats["read"] += len(faqs)
+            stats["unchanged"] += len(faqs) - changed
+            if chunks:
+                yield changed, chunks, stale
+
+    train_target = vector_db.training_size()
+    held = []  # (batch, embeddings) waiting for enough vectors to train on
+
+    def write_held(batch_number: int):
+        nonlocal train_target
+        train_target = 0
+        batch = (
+            sum(changed for (changed, _, _), _ in held),
+            [chunk for (_, chunks, _), _ in held for chunk in chunks],
+            [doc_id for (_, _, stale), _ in held for doc_id in stale],
+        )
+        embeddings = np.vstack([embeddings for _, embeddings in held])
+        held.clear()
+        flush(batch_number, batch, embeddings)
+
+    def flush(batch_number: int, batch, embeddings: np.ndarray):
+        if train_target:
+            held.append((batch, embeddings))
+            if sum(len(e) for _, e in held) >= train_target:
+                write_held(batch_number)
+            return
+        changed, chunks, stale = batch
+        _write_batch(chunks, stale, embeddings)
+        stats["upserted"] += changed
+        stats["chunks"] += len(chunks)
+        if batch_number % log_every == 0:
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"Ingested {stats['read']} records ({stats['upserted']} upserted) "
+                f"in {elapsed:.1f}s - {stats['read'] / max(elapsed, 1e-9):.0f} records/s"
+            )
+
+    # One compaction at the end instead of one per wal_compaction_threshold writes
+    with vector_db.bulk_load():
+        if workers > 0:
+            # Encode ahead on a process pool; at most 2 batches per worker in flight
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_encoder_worker,
+                initargs=(settings.encoder_backend, settings.embedding_model)
+            ) as pool:
+                in_flight = deque()
+                for batch_number, batch in enumerate(changed_documents(), start=1):
+                    texts = [chunk["text"] for chunk in batch[1]]
+                    in_flight.append((batch_number, batch, pool.submit(_encode_in_worker, texts)))
+                    if len(in_flight) >= 2 * workers:
+                        number, pending, future = in_flight.popleft()
+                        flush(number, pending, future.result())
+                while in_flight:
+                    number, pending, future = in_flight.popleft()
+                    flush(number, pending, future.result())
+        else:
+            for batch_number, batch in enumerate(changed_documents(), start=1):
+                texts = [chunk["text"] for chunk in batch[1]]
+                flush(batch_number, batch, np.array(vector_db.encoder.encode(texts)).astype('float32'))
+        if held:
+            write_held(0)
+
+        if prune:
+            stale_ids = [doc_id for doc_id in vector_db.parent_ids() if doc_id not in seen_ids]
+            if stale_ids:
+                stats["deleted"] = len(stale_ids)
+                vector_db.delete_documents(stale_ids)
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["records_per_second"] = round(stats["read"] / max(elapsed, 1e-9), 1)
+    logger.info(f"Ingestion finished: {stats}")
+    return stats
+
 
 def load_sample_data(sample_path: str = "./data/sample_faqs.json"):
     """Load sample data if exists"""
@@ -1,29 +1,60 @@
 """
 Database connection and session management
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Generator, TypeVar
+import asyncio
+import functools
 from src.config import settings
-from src.models.models import Base
+from src.models.models import Base, Message
+
+T = TypeVar("T")
 
 
 # Create database engine
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Bounded pool for blocking DB work issued from async endpoints.
+# Sized to the connection pool so a worker thread never queues for a connection.
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.db_executor_workers or (settings.db_pool_size + settings.db_max_overflow),
+    thread_name_prefix="db"
+)
+
+
+# Columns added to existing tables since they were first created: (table, column, DDL type)
+ADDED_COLUMNS = (
+    ("messages", "prompt_tokens", "INTEGER"),
+)
+
+
+def upgrade_schema(bind: Engine):
+    """Add columns and indexes that create_all() skips on tables that already exist"""
+    existing = inspect(bind)
+    with bind.begin() as conn:
+        for table, column, ddl_type in ADDED_COLUMNS:
+            if column not in {c["name"] for c in existing.get_columns(table)}:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+        for index in Message.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
 
-def init_db():
-    """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+def init_db(bind: Engine = engine):
+    """Initialize database tables and upgrade ones created by older versions"""
+    Base.metadata.create_all(bind=bind)
+    upgrade_schema(bind)
 
 
 @contextmanager
@@ -61,3 +92,17 @@ def get_db_dependency() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run blocking SQLAlchemy work on the DB executor instead of the event loop
+
+    Usage:
+        messages = await run_db(_load_messages, db, session_id)
+
+    A Session must only be used by one thread at a time; endpoints await each
+    call before touching the same session again.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
@@ -2,13 +2,16 @@
 FastAPI Application Entry Point
 AI Customer Support Bot
 """
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
 from src.config import settings
 from src.database import init_db
 from src.api import session, chat, feedback, escalation
+from src.services.warmup import readiness, warm_up
 
 
 @asynccontextmanager
@@ -19,8 +22,19 @@ async def lifespan(app: FastAPI):
     init_db()
     print(f"DEBUG: Loaded LLM Model: {settings.llm_model}")
     print("✅ Database initialized")
+
+    # Warm up models and indexes; /ready reports 503 until this finishes
+    warmup_task = None
+    if settings.warmup_mode == "blocking":
+        await warm_up()
+    elif settings.warmup_mode == "background":
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        readiness.ready = True
     yield
     # Shutdown
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
     print("👋 Shutting down...")
 
 
@@ -58,13 +72,23 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the encoder, index and LLM client are warm"""
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.report()
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {
         "message": "AI Customer Support Bot API",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "ready": "/ready"
     }
 
 # Mount static files if frontend build exists (Production)
@@ -1,7 +1,7 @@
 """
 SQLAlchemy ORM models for database tables
 """
-from sqlalchemy import Column, String, Integer, Float, Text, DateTime, ForeignKey, CheckConstraint, Uuid, JSON
+from sqlalchemy import Column, String, Integer, Float, Text, DateTime, ForeignKey, CheckConstraint, Uuid, JSON, Index
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.sql import func
 import uuid
@@ -39,10 +39,16 @@ class Message(Base):
     role = Column(String(50), nullable=False)  # 'user' | 'assistant' | 'system'
     content = Column(Text, nullable=False)
     tokens = Column(Integer)
+    prompt_tokens = Column(Integer)  # estimated size of the prompt that produced this reply
     confidence = Column(Float)
     sources = Column(JSON)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Serves "newest messages of a session" without scanning the whole table
+    __table_args__ = (
+        Index("ix_messages_session_timestamp", "session_id", "timestamp"),
+    )
+
 
 class Escalation(Base):
     """Escalation ticket table"""
@@ -25,10 +25,9 @@ Possible values for 'next_action': 'reply', 'escalate', 'create_ticket'.
 Use 'escalate' if confidence is low (< 0.5) or user is angry.
 """
 
-RAG_PROMPT_TEMPLATE = """
-SYSTEM INSTRUCTIONS:
-{system_prompt}
-
+# Per-request part of the prompt; sent on its own when the system prompt
+# goes to the model as a system instruction / cached content
+CONTEXT_PROMPT_TEMPLATE = """
 SESSION CONTEXT:
 Summary: {session_summary}
 
@@ -44,6 +43,27 @@ USER QUERY:
 RESPONSE (JSON ONLY):
 """
 
+RAG_PROMPT_TEMPLATE = """
+SYSTEM INSTRUCTIONS:
+{system_prompt}
+""" + CONTEXT_PROMPT_TEMPLATE
+
+SUMMARY_PROMPT_TEMPLATE = """
+You maintain a running summary of a customer support conversation.
+Update the summary with the new messages below. Keep the customer's goal,
+account details they gave, steps already tried, answers given and anything
+still unresolved. Drop greetings and small talk. Write plain text in the
+third person, under {max_words} words.
+
+CURRENT SUMMARY:
+{previous_summary}
+
+NEW MESSAGES:
+{conversation}
+
+UPDATED SUMMARY:
+"""
+
 FEW_SHOT_EXAMPLES = [
     {
         "user": "How do I update my billing email?",
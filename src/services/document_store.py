@@ -0,0 +1,177 @@
+"""
+Memory-mapped Document Store
+Columnar on-disk storage for the documents behind the FAISS vectors
+"""
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Each column is an int64 offsets array (n + 1 entries) plus a UTF-8 blob.
+# 'id' and 'text' hold the raw strings; 'extra' holds every other document
+# key (e.g. 'metadata') as a JSON object per row.
+COLUMNS = ("id", "text", "extra")
+
+
+class StringColumn:
+    """Read-only view of one variable-length string column"""
+
+    def __init__(self, directory: str, name: str):
+        self.offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        self._file = open(os.path.join(directory, f"{name}.blob"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # Zero-length files cannot be mapped
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._blob[start:end].decode("utf-8")
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+class _ColumnWriter:
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self._blob = open(os.path.join(directory, f"{name}.blob.tmp"), "wb")
+        self._offsets = [0]
+
+    def append(self, value: str):
+        data = value.encode("utf-8")
+        self._blob.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def commit(self):
+        """Flush and atomically move the column files into place"""
+        self._blob.close()
+        offsets_tmp = os.path.join(self.directory, f"{self.name}.offsets.tmp.npy")
+        np.save(offsets_tmp, np.array(self._offsets, dtype=np.int64))
+        os.replace(offsets_tmp, os.path.join(self.directory, f"{self.name}.offsets.npy"))
+        os.replace(
+            os.path.join(self.directory, f"{self.name}.blob.tmp"),
+            os.path.join(self.directory, f"{self.name}.blob")
+        )
+
+
+class DocumentStore:
+    """
+    List-like document container backed by memory-mapped columns
+
+    Persisted rows are only decoded when accessed, so opening a large store
+    costs no heap and search materializes just the k hit documents.
+    Documents added since the last save live in an in-memory tail.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._columns: Optional[Dict[str, StringColumn]] = None
+        self._tail: List[Dict[str, Any]] = []
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(directory, f"{name}.offsets.npy")) for name in COLUMNS
+        )
+
+    @classmethod
+    def from_documents(cls, docs: Iterable[Dict[str, Any]]) -> "DocumentStore":
+        """Build an unsaved store from in-memory documents (e.g. a legacy pickle)"""
+        store = cls()
+        store.extend(docs)
+        return store
+
+    def _open(self) -> Dict[str, StringColumn]:
+        """Map the columns on first access"""
+        if self._columns is None:
+            if self.directory and self.exists(self.directory):
+                self._columns = {name: StringColumn(self.directory, name) for name in COLUMNS}
+            else:
+                self._columns = {}
+        return self._columns
+
+    @property
+    def _persisted_count(self) -> int:
+        columns = self._open()
+        return len(columns["id"]) if columns else 0
+
+    def __len__(self) -> int:
+        return self._persisted_count + len(self._tail)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("document index out of range")
+
+        persisted = self._persisted_count
+        if i >= persisted:
+            return dict(self._tail[i - persisted])
+
+        columns = self._columns
+        doc = {"id": json.loads(columns["id"][i]), "text": columns["text"][i]}
+        doc.update(json.loads(columns["extra"][i]))
+        return doc
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, doc: Dict[str, Any]):
+        self._tail.append(doc)
+
+    def extend(self, docs: Iterable[Dict[str, Any]]):
+        self._tail.extend(docs)
+
+    def save(self, directory: Optional[str] = None):
+        """
+        Write all rows to the columnar format and re-map them
+
+        Rows are streamed from the current mapping, so memory stays bounded
+        by the unsaved tail rather than the corpus size.
+        """
+        directory = directory or self.directory
+        write_documents(directory, self)
+
+        self.close()
+        self.directory = directory
+        self._tail = []
+
+    def close(self):
+        """Release the column mappings (they are re-mapped on next access)"""
+        if self._columns:
+            for column in self._columns.values():
+                column.close()
+        self._columns = None
+
+
+def write_documents(directory: str, docs: Iterable[Dict[str, Any]]):
+    """Stream documents into the columnar format in the given directory"""
+    os.makedirs(directory, exist_ok=True)
+
+    writers = {name: _ColumnWriter(directory, name) for name in COLUMNS}
+    for doc in docs:
+        writers["id"].append(json.dumps(doc.get("id")))
+        writers["text"].append(doc.get("text", ""))
+        extra = {k: v for k, v in doc.items() if k not in ("id", "text")}
+        writers["extra"].append(json.dumps(extra, default=str))
+
+    for writer in writers.values():
+        writer.commit()
@@ -0,0 +1,175 @@
+"""
+Embedding Encoder Backends
+Sentence embedding models behind a common encode() interface
+"""
+import json
+import os
+from typing import List, Optional
+import numpy as np
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 'torch'     - SentenceTransformer on PyTorch (full precision)
+# 'onnx'      - the same transformer exported to ONNX, run with ONNX Runtime
+# 'onnx_int8' - the ONNX export with dynamically quantized int8 weights
+ENCODER_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+ONNX_CONFIG_FILE = "encoder_config.json"
+
+
+class SentenceTransformerEncoder:
+    """Full-precision SentenceTransformer encoder"""
+
+    def __init__(self, model_name: str, threads: int = 0):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            # Inherited by forked workers; keeps N workers from oversubscribing the cores
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype="float32")
+
+
+def pool_embeddings(hidden: np.ndarray, attention_mask: np.ndarray, mode: str = "mean", normalize: bool = True) -> np.ndarray:
+    """
+    Reduce token embeddings to one vector per text, as the
+    SentenceTransformer Pooling/Normalize modules do
+
+    Args:
+        hidden: Token embeddings, shape (batch, seq, dim)
+        attention_mask: 1 for real tokens, shape (batch, seq)
+        mode: 'mean', 'cls' or 'max'
+        normalize: L2-normalize the pooled vectors
+    """
+    mask = attention_mask[..., None].astype("float32")
+    if mode == "cls":
+        pooled = hidden[:, 0]
+    elif mode == "max":
+        pooled = np.where(mask > 0, hidden, -np.inf).max(axis=1)
+    elif mode == "mean":
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+    else:
+        raise ValueError(f"Unsupported pooling mode: {mode}")
+
+    pooled = pooled.astype("float32")
+    if normalize:
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+    return pooled
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = True) -> str:
+    """
+    Export a SentenceTransformer's transformer to ONNX (optionally int8)
+
+    Needs PyTorch and onnx once, at export time; serving only needs
+    onnxruntime and the tokenizer saved alongside the model.
+
+    Returns:
+        Path of the model file to serve
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    os.makedirs(output_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    st_model.tokenizer.save_pretrained(output_dir)
+
+    pooling = next((m for m in st_model if isinstance(m, models.Pooling)), None)
+    config = {
+        "model_name": model_name,
+        "pooling": pooling.get_pooling_mode_str() if pooling else "mean",
+        "normalize": any(isinstance(m, models.Normalize) for m in st_model),
+        "max_seq_length": st_model.max_seq_length,
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump(config, f)
+
+    dummy = st_model.tokenizer(["export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    model_path = os.path.join(output_dir, "model.onnx")
+    logger.info(f"Exporting {model_name} to {model_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(dummy[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    if not quantize:
+        return model_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantized_path = os.path.join(output_dir, "model_int8.onnx")
+    logger.info(f"Quantizing {model_path} to int8...")
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+class OnnxEncoder:
+    """
+    ONNX Runtime encoder (CPU), exported on first use and cached under
+    settings.encoder_cache_dir
+    """
+
+    def __init__(self, model_name: str, quantize: bool = True, cache_dir: Optional[str] = None, threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "The onnx encoder backends need onnxruntime: pip install -r requirements-onnx.txt"
+            ) from e
+        from transformers import AutoTokenizer
+
+        model_dir = os.path.join(cache_dir or settings.encoder_cache_dir, model_name.replace("/", "__"))
+        model_path = os.path.join(model_dir, "model_int8.onnx" if quantize else "model.onnx")
+        if not os.path.exists(model_path):
+            model_path = export_onnx(model_name, model_dir, quantize=quantize)
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE)) as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, settings.embedding_dim), dtype="float32")
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.config["max_seq_length"],
+                return_tensors="np",
+            )
+            feeds = {name: value.astype("int64") for name, value in tokens.items() if name in self._input_names}
+            hidden = self.session.run(["last_hidden_state"], feeds)[0]
+            batches.append(pool_embeddings(
+                hidden, tokens["attention_mask"], self.config["pooling"], self.config["normalize"]
+            ))
+        return np.vstack(batches)
+
+
+def create_encoder(backend: str, model_name: str):
+    """Instantiate the encoder for a backend in ENCODER_BACKENDS"""
+    if backend == "torch":
+        return SentenceTransformerEncoder(model_name, threads=settings.encoder_threads)
+    if backend in ("onnx", "onnx_int8"):
+        return OnnxEncoder(model_name, quantize=backend == "onnx_int8", threads=settings.encoder_threads)
+    raise ValueError(f"Unknown encoder backend: {backend} (expected one of {', '.join(ENCODER_BACKENDS)})")
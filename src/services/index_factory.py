@@ -0,0 +1,234 @@
+"""
+FAISS Index Factory
+Builds, trains and tunes the ANN index types supported by VectorDB
+"""
+import math
+import time
+import faiss
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 'flat'     - exact L2 search (brute force baseline)
+# 'flat_ip'  - exact inner-product search on L2-normalized vectors (cosine)
+# 'ivf_flat' - inverted lists over k-means cells, full vectors (tune nprobe)
+# 'ivf_pq'   - inverted lists with product-quantized codes (tune nprobe)
+# 'hnsw'     - graph-based search (tune efSearch)
+INDEX_TYPES = ("flat", "flat_ip", "ivf_flat", "ivf_pq", "hnsw")
+
+# How full vectors are stored by flat, ivf_flat and hnsw indexes
+# (ivf_pq always stores compressed codes)
+VECTOR_STORAGE = {
+    "float32": None,
+    "float16": faiss.ScalarQuantizer.QT_fp16,  # half the memory, near-lossless
+    "int8": faiss.ScalarQuantizer.QT_8bit,  # a quarter of the memory, trained per-dimension ranges
+}
+
+# FAISS recommends at least this many training points per k-means centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def create_index(
+    index_type: str,
+    dim: int,
+    n_train: Optional[int] = None,
+    nlist: Optional[int] = None,
+    pq_m: Optional[int] = None,
+    pq_nbits: Optional[int] = None,
+    hnsw_m: Optional[int] = None,
+    storage: Optional[str] = None
+) -> faiss.Index:
+    """
+    Create an (untrained) index of the given type
+
+    Args:
+        index_type: One of INDEX_TYPES
+        dim: Vector dimension
+        n_train: Number of training vectors available; IVF/PQ sizes are
+            clamped so small corpora can still be trained
+        nlist, pq_m, pq_nbits, hnsw_m: Overrides for the settings defaults
+        storage: One of VECTOR_STORAGE (defaults to settings.faiss_vector_storage)
+    """
+    nlist = nlist or settings.faiss_nlist
+    pq_m = pq_m or settings.faiss_pq_m
+    pq_nbits = pq_nbits or settings.faiss_pq_nbits
+    hnsw_m = hnsw_m or settings.faiss_hnsw_m
+    storage = storage or settings.faiss_vector_storage
+    if storage not in VECTOR_STORAGE:
+        raise ValueError(f"Unknown vector storage: {storage} (expected one of {', '.join(VECTOR_STORAGE)})")
+    qtype = VECTOR_STORAGE[storage]
+
+    if n_train is not None:
+        nlist = max(1, min(nlist, n_train // MIN_POINTS_PER_CENTROID))
+        pq_nbits = max(1, min(pq_nbits, int(math.log2(max(2, n_train // MIN_POINTS_PER_CENTROID)))))
+
+    if index_type == "flat":
+        if qtype is not None:
+            return faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+        return faiss.IndexFlatL2(dim)
+    if index_type == "flat_ip":
+        if qtype is not None:
+            return faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(dim)
+    if index_type == "ivf_flat":
+        if qtype is not None:
+            return faiss.IndexIVFScalarQuantizer(faiss.IndexFlatL2(dim), dim, nlist, qtype, faiss.METRIC_L2)
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist, faiss.METRIC_L2)
+    if index_type == "ivf_pq":
+        if dim % pq_m != 0:
+            raise ValueError(f"faiss_pq_m={pq_m} must divide the embedding dimension {dim}")
+        return faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, pq_nbits)
+    if index_type == "hnsw":
+        if qtype is not None:
+            return faiss.IndexHNSWSQ(dim, qtype, hnsw_m)
+        return faiss.IndexHNSWFlat(dim, hnsw_m)
+
+    raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+
+
+def training_size(index_type: str, nlist: Optional[int] = None, pq_nbits: Optional[int] = None) -> int:
+    """
+    Training vectors needed for full-size IVF/PQ parameters (create_index
+    clamps them to smaller training sets); 0 for index types that need none
+    """
+    if index_type not in ("ivf_flat", "ivf_pq"):
+        return 0
+    size = (nlist or settings.faiss_nlist) * MIN_POINTS_PER_CENTROID
+    if index_type == "ivf_pq":
+        size = max(size, (2 ** (pq_nbits or settings.faiss_pq_nbits)) * MIN_POINTS_PER_CENTROID)
+    return size
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray):
+    """Train the index on corpus vectors if it needs training"""
+    if index.is_trained:
+        return
+    start = time.perf_counter()
+    index.train(np.ascontiguousarray(vectors, dtype="float32"))
+    logger.info(f"Trained FAISS index on {len(vectors)} vectors in {time.perf_counter() - start:.2f}s")
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Apply query-time parameters; those that do not apply to the index type are ignored"""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # e.g. nprobe on a flat index
+
+
+def prepare_vectors(index: faiss.Index, vectors: np.ndarray) -> np.ndarray:
+    """Cast to float32 and L2-normalize when the index scores by inner product"""
+    vectors = np.array(vectors, dtype="float32")
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def to_l2_distances(index: faiss.Index, scores: np.ndarray) -> np.ndarray:
+    """
+    Express search scores as squared L2 distances between unit vectors so
+    'score' means "lower is closer" regardless of index type
+    """
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        return 2.0 - 2.0 * scores
+    return scores
+
+
+def build_index(index_type: str, vectors: np.ndarray, **overrides) -> faiss.Index:
+    """Create, train and fill an index with the given vectors"""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = create_index(index_type, vectors.shape[1], n_train=len(vectors), **overrides)
+    vectors = prepare_vectors(index, vectors)
+    train_index(index, vectors)
+    index.add(vectors)
+    return index
+
+
+def evaluate_index(
+    index: faiss.Index,
+    queries: np.ndarray,
+    ground_truth: np.ndarray,
+    k: int = 10,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Measure recall@k against exact-search ground truth and per-query latency
+
+    Args:
+        index: Index under test
+        queries: Query vectors
+        ground_truth: Row ids returned by the flat baseline, shape (n_queries, k)
+    """
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    queries = prepare_vectors(index, queries)
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0])
+
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, ground_truth))
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "recall_at_k": hits / float(ground_truth.size),
+        "latency_ms_p50": float(np.percentile(latencies_ms, 50)),
+        "latency_ms_p95": float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def recall_latency_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    index_types: List[str],
+    k: int = 10,
+    nprobe_values: Sequence[int] = (1, 4, 16, 64),
+    ef_search_values: Sequence[int] = (16, 64, 256)
+) -> List[Dict[str, Any]]:
+    """
+    Build each index type over the corpus and compare it with the flat baseline
+
+    Returns:
+        One row per (index type, search parameter) combination
+    """
+    start = time.perf_counter()
+    baseline = build_index("flat", vectors, storage="float32")
+    build_s = time.perf_counter() - start
+    _, ground_truth = baseline.search(np.ascontiguousarray(queries, dtype="float32"), k)
+
+    row = evaluate_index(baseline, queries, ground_truth, k=k)
+    row.update({"index_type": "flat", "build_s": build_s})
+    report = [row]
+
+    for index_type in index_types:
+        if index_type == "flat":
+            continue
+        start = time.perf_counter()
+        index = build_index(index_type, vectors)
+        build_s = time.perf_counter() - start
+
+        if index_type.startswith("ivf"):
+            sweeps = [{"nprobe": n} for n in nprobe_values]
+        elif index_type == "hnsw":
+            sweeps = [{"ef_search": ef} for ef in ef_search_values]
+        else:
+            sweeps = [{}]
+
+        for params in sweeps:
+            row = evaluate_index(index, queries, ground_truth, k=k, **params)
+            row.update({"index_type": index_type, "build_s": build_s})
+            report.append(row)
+
+    return report
@@ -0,0 +1,252 @@
+"""
+LLM Backends
+Providers behind LLMClient: Google Gemini, or a local simulation for load
+tests and offline benchmarks
+"""
+import asyncio
+import json
+import math
+import random
+import re
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = ("gemini", "simulated")
+
+
+class GeminiCachedContentProvider:
+    """Gemini cached content API (genai must be configured first)"""
+
+    def create(self, model_name: str, system_instruction: str, ttl_seconds: int):
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=model_name,
+            system_instruction=system_instruction,
+            ttl=timedelta(seconds=ttl_seconds)
+        )
+
+    def extend(self, handle, ttl_seconds: int):
+        handle.update(ttl=timedelta(seconds=ttl_seconds))
+
+    def model(self, handle):
+        import google.generativeai as genai
+        return genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+
+class GeminiBackend:
+    """
+    Google Gemini through the google.generativeai SDK (imported on first use)
+
+    A backend hands out model objects exposing
+    generate_content_async(prompt, generation_config=None, stream=False)
+    and count_tokens(text), as genai.GenerativeModel does.
+    """
+
+    def __init__(self):
+        self._configured = False
+
+    def _configure(self):
+        import google.generativeai as genai
+        if not self._configured:
+            if not settings.gemini_api_key or "your_gemini_api_key" in settings.gemini_api_key:
+                logger.warning("Invalid or missing Gemini API key")
+            genai.configure(api_key=settings.gemini_api_key)
+            self._configured = True
+        return genai
+
+    def model(self, name: str, system_instruction: Optional[str] = None):
+        genai = self._configure()
+        return genai.GenerativeModel(name, system_instruction=system_instruction)
+
+    def generation_config(self):
+        genai = self._configure()
+        return genai.types.GenerationConfig(
+            temperature=settings.llm_temperature,
+            max_output_tokens=settings.llm_max_tokens,
+        )
+
+    def cache_provider(self):
+        return GeminiCachedContentProvider()
+
+
+class SimulatedLLMError(Exception):
+    """Injected provider failure; `code` makes it retryable like a real 429/503"""
+
+    def __init__(self, code: int):
+        super().__init__(f"Simulated LLM error {code}")
+        self.code = code
+
+
+class SimulatedResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class SimulatedTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+
+DOC_LINE_RE = re.compile(r"^\d+\) \[([^\]]*)\] (.*)$")
+
+
+class SimulatedModel:
+    """
+    Deterministic stand-in for a Gemini model
+
+    RAG prompts get a valid JSON reply quoting the top retrieved document;
+    other prompts (e.g. summaries) get plain text. Time to first token is
+    drawn from a lognormal distribution around `latency_ms`, output is
+    paced at `tokens_per_second`, and `error_rate` of the calls fail with
+    a retryable 429/503 before any output. The randomness is seeded by
+    (seed, prompt, attempt), where attempt counts this model's calls with
+    the prompt: a replayed workload behaves the same regardless of request
+    interleaving, while retries and hedges of a prompt draw afresh.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        system_instruction: Optional[str] = None,
+        latency_ms: float = 600.0,
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 80.0,
+        chunk_tokens: int = 8,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.model_name = name
+        self.system_instruction = system_instruction
+        self.latency = latency_ms / 1000
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.error_rate = error_rate
+        self.seed = seed
+        self.calls = 0
+        self._attempts: Dict[int, int] = {}  # prompt hash -> calls so far
+
+    def count_tokens(self, text: str) -> SimulatedTokenCount:
+        return SimulatedTokenCount((len(text) + 3) // 4)
+
+    def reply(self, prompt: str) -> str:
+        """The reply text for a prompt (without delays)"""
+        if "RESPONSE (JSON ONLY)" not in prompt:
+            # Auxiliary prompt (summaries): echo the tail before the final cue line
+            words = prompt.strip().rsplit("\n", 1)[0].split()
+            return " ".join(words[-60:])
+
+        docs = self._documents(prompt)
+        if not docs:
+            answer = {
+                "answer_text": "I don't have that information right now. Would you like me to open a ticket?",
+                "confidence": 0.3,
+                "sources": [],
+                "next_action": "escalate",
+                "action_payload": {}
+            }
+        else:
+            doc_id, text = docs[0]
+            snippet = text.split("Answer:", 1)[-1].strip()
+            answer = {
+                "answer_text": f"{snippet} [{doc_id}]",
+                "confidence": 0.85,
+                "sources": [doc_id],
+                "next_action": "reply",
+                "action_payload": {}
+            }
+        return json.dumps(answer)
+
+    @staticmethod
+    def _documents(prompt: str) -> List[tuple]:
+        section = prompt.split("RETRIEVED DOCUMENTS:", 1)[-1].split("RECENT HISTORY:", 1)[0]
+        docs = []
+        for line in section.strip().splitlines():
+            match = DOC_LINE_RE.match(line.strip())
+            if match:
+                docs.append((match.group(1), match.group(2)))
+            elif docs:
+                # Continuation of a multi-line document
+                docs[-1] = (docs[-1][0], docs[-1][1] + "\n" + line)
+        return docs
+
+    def _start(self, prompt: str) -> tuple:
+        self.calls += 1
+        key = hash(prompt)
+        attempt = self._attempts[key] = self._attempts.get(key, 0) + 1
+        rng = random.Random(f"{self.seed}:{self.model_name}:{prompt}:{attempt}")
+        if rng.random() < self.error_rate:
+            raise SimulatedLLMError(rng.choice((429, 503)))
+        first_token = self.latency * math.exp(rng.gauss(0.0, self.latency_sigma))
+        return first_token, self.reply(prompt)
+
+    def _chunks(self, text: str) -> List[str]:
+        size = self.chunk_tokens * 4
+        return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+    async def generate_content_async(self, prompt: str, generation_config: Any = None, stream: bool = False):
+        first_token, text = self._start(prompt)
+        await asyncio.sleep(first_token)
+        if stream:
+            return self._stream(text)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(text) / 4 / self.tokens_per_second)
+        return SimulatedResponse(text)
+
+    async def _stream(self, text: str) -> AsyncIterator[SimulatedResponse]:
+        delay = self.chunk_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for i, chunk in enumerate(self._chunks(text)):
+            if i and delay:
+                await asyncio.sleep(delay)
+            yield SimulatedResponse(chunk)
+
+
+class SimulatedCacheProvider:
+    """In-memory cached content for the simulated backend"""
+
+    def __init__(self, backend: "SimulatedBackend"):
+        self.backend = backend
+
+    def create(self, model_name: str, system_instruction: str, ttl_seconds: int):
+        return {"model": model_name, "system_instruction": system_instruction}
+
+    def extend(self, handle, ttl_seconds: int):
+        pass
+
+    def model(self, handle):
+        return self.backend.model(handle["model"], handle["system_instruction"])
+
+
+class SimulatedBackend:
+    """Local simulated models configured from the llm_sim_* settings"""
+
+    def model(self, name: str, system_instruction: Optional[str] = None) -> SimulatedModel:
+        return SimulatedModel(
+            name,
+            system_instruction,
+            latency_ms=settings.llm_sim_latency_ms,
+            latency_sigma=settings.llm_sim_latency_sigma,
+            tokens_per_second=settings.llm_sim_tokens_per_second,
+            chunk_tokens=settings.llm_sim_chunk_tokens,
+            error_rate=settings.llm_sim_error_rate,
+            seed=settings.llm_sim_seed
+        )
+
+    def generation_config(self) -> Dict[str, Any]:
+        return {"temperature": settings.llm_temperature, "max_output_tokens": settings.llm_max_tokens}
+
+    def cache_provider(self) -> SimulatedCacheProvider:
+        return SimulatedCacheProvider(self)
+
+
+def create_backend(name: str):
+    """Instantiate the LLM backend for a name in LLM_BACKENDS"""
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "simulated":
+        return SimulatedBackend()
+    raise ValueError(f"Unknown LLM backend: {name} (expected one of {', '.join(LLM_BACKENDS)})")
@@ -1,82 +1,331 @@
 """
-LLM Client to interact with Google Gemini API
+LLM Client to interact with Google Gemini API (or a simulated backend)
 """
-import google.generativeai as genai
-from typing import AsyncGenerator, Dict, Any, List, Optional
+import asyncio
+import threading
+import time
+from typing import AsyncGenerator, Callable, Dict, Any, List, Optional
 from src.config import settings
+from src.prompts.prompts import SYSTEM_PROMPT
+from src.services.llm_backends import create_backend
+from src.services.llm_scheduler import LatencyTracker, LLMDeadlineExceeded, LLMScheduler
+from src.services.prompt_assembler import estimate_tokens
 import logging
 
 logger = logging.getLogger(__name__)
 
+# How the invariant system prompt reaches the model:
+# 'cached'             - provider-side cached content (falls back to 'system_instruction')
+# 'system_instruction' - set once on the model instance, not repeated in each prompt
+# 'inline'             - rendered into every prompt
+SYSTEM_PROMPT_MODES = ("cached", "system_instruction", "inline")
+
+
+class ContextCache:
+    """
+    Provider-side cache of the system prompt with lifetime management.
+
+    The entry is created on first use, its TTL is extended once it is within
+    `refresh_seconds` of expiring, and it is recreated if it has already
+    expired. A failed create or extend (e.g. the prefix is below the
+    provider's minimum cacheable size) disables the cache for
+    `retry_seconds`, during which model() returns None so callers fall back.
+    """
+
+    def __init__(
+        self,
+        provider,
+        model_name: str,
+        system_instruction: str,
+        ttl_seconds: int = 3600,
+        refresh_seconds: int = 300,
+        retry_seconds: int = 600,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.provider = provider
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.ttl = ttl_seconds
+        self.refresh = min(refresh_seconds, ttl_seconds // 2)
+        self.retry = retry_seconds
+        self.clock = clock
+        self._handle = None
+        self._model = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "extended": 0, "failures": 0}
+
+    def needs_refresh(self) -> bool:
+        now = self.clock()
+        if now < self._retry_at:
+            return False
+        return self._handle is None or now >= self._expires_at - self.refresh
+
+    def current(self):
+        """Cached model if the entry has not expired, else None (no I/O)"""
+        return self._model if self._handle is not None and self.clock() < self._expires_at else None
+
+    def model(self):
+        """Model bound to the cached prefix, refreshing the entry if due (blocking)"""
+        with self._lock:
+            if not self.needs_refresh():
+                return self.current()
+            now = self.clock()
+            try:
+                if self._handle is not None and now < self._expires_at:
+                    self.provider.extend(self._handle, self.ttl)
+                    self.stats["extended"] += 1
+                else:
+                    self._handle = self.provider.create(self.model_name, self.system_instruction, self.ttl)
+                    self._model = self.provider.model(self._handle)
+                    self.stats["created"] += 1
+                    logger.info(f"Created cached content for the system prompt (ttl {self.ttl}s)")
+                self._expires_at = now + self.ttl
+            except Exception as e:
+                self.stats["failures"] += 1
+                self._retry_at = now + self.retry
+                logger.warning(f"Context caching unavailable, retrying in {self.retry}s: {e}")
+                # An entry that is still live keeps serving until it expires
+            return self.current()
+
+
 class LLMClient:
-    def __init__(self):
-        """Initialize Gemini client"""
+    def __init__(
+        self,
+        system_prompt: str = SYSTEM_PROMPT,
+        cache_provider=None,
+        scheduler: Optional[LLMScheduler] = None,
+        backend=None
+    ):
+        """Initialize the client for settings.llm_backend (nothing is loaded yet)"""
+        self.backend = backend or create_backend(settings.llm_backend)
+        self.scheduler = scheduler or LLMScheduler(
+            max_in_flight=settings.llm_max_in_flight,
+            rpm=settings.llm_rpm_limit,
+            tpm=settings.llm_tpm_limit,
+            max_retries=settings.llm_max_retries,
+            backoff_base=settings.llm_backoff_base_seconds,
+            backoff_max=settings.llm_backoff_max_seconds,
+            queue_timeout=settings.llm_queue_timeout_seconds
+        )
+        self.latency = LatencyTracker()
         self._model = None
+        self._system_model = None
+        self._named_models: Dict[Any, Any] = {}  # (model name, with system instruction) -> model
         self._generation_config = None
+        self.system_prompt = system_prompt
+        self.context_cache = ContextCache(
+            cache_provider or self.backend.cache_provider(),
+            settings.llm_model,
+            system_prompt,
+            ttl_seconds=settings.llm_cache_ttl_seconds,
+            refresh_seconds=settings.llm_cache_refresh_seconds,
+            retry_seconds=settings.llm_cache_retry_seconds
+        )
+
+    @property
+    def system_prompt_mode(self) -> str:
+        mode = settings.llm_system_prompt_mode
+        if mode not in SYSTEM_PROMPT_MODES:
+            raise ValueError(f"Unknown llm_system_prompt_mode: {mode} (expected one of {', '.join(SYSTEM_PROMPT_MODES)})")
+        return mode
+
+    @property
+    def inline_system_prompt(self) -> bool:
+        """Whether prompts must carry the system prompt themselves"""
+        return self.system_prompt_mode == "inline"
 
     @property
     def model(self):
-        """Lazy load Gemini model"""
+        """Lazy load the default model (the provider SDK is only imported here)"""
         if self._model is None:
-            if not settings.gemini_api_key or "your_gemini_api_key" in settings.gemini_api_key:
-                logger.warning("Invalid or missing Gemini API key")
-            
-            genai.configure(api_key=settings.gemini_api_key)
-            self._model = genai.GenerativeModel(settings.llm_model)
-            self._generation_config = genai.types.GenerationConfig(
-                temperature=settings.llm_temperature,
-                max_output_tokens=settings.llm_max_tokens,
-            )
+            self._model = self.backend.model(settings.llm_model)
         return self._model
 
+    @property
+    def system_model(self):
+        """Model with the system prompt set as its system instruction"""
+        if self._system_model is None:
+            self._system_model = self.backend.model(settings.llm_model, system_instruction=self.system_prompt)
+        return self._system_model
+
     @property
     def generation_config(self):
         if self._generation_config is None:
-            # Trigger model load to init config
-            _ = self.model
+            self._generation_config = self.backend.generation_config()
         return self._generation_config
 
+    def _cached_model(self):
+        _ = self.model  # Configures the SDK before the cache API is used
+        return self.context_cache.model()
+
+    def prepare_system_model(self):
+        """Create the model (and cached content) used for system-prompted calls (blocking)"""
+        if self.system_prompt_mode == "cached" and self._cached_model() is not None:
+            return
+        if self.system_prompt_mode != "inline":
+            _ = self.system_model
+
+    def _named_model(self, name: str, with_system_prompt: bool):
+        """
+        Model other than settings.llm_model (fast tier, hedge fallback);
+        cached content is per model, so these take the system prompt as an
+        instruction
+        """
+        system = with_system_prompt and not self.inline_system_prompt
+        model = self._named_models.get((name, system))
+        if model is None:
+            model = self.backend.model(name, system_instruction=self.system_prompt if system else None)
+            self._named_models[(name, system)] = model
+        return model
+
+    async def _model_for(self, with_system_prompt: bool, model_name: Optional[str] = None):
+        """
+        Model for a request: one carrying the system prompt unless it is
+        inlined in the prompt text (or not wanted)
+
+        Args:
+            model_name: Model to use instead of settings.llm_model
+        """
+        if model_name and model_name != settings.llm_model:
+            return self._named_model(model_name, with_system_prompt)
+        mode = self.system_prompt_mode
+        if not with_system_prompt or mode == "inline":
+            return self.model
+        if mode == "cached":
+            model = self.context_cache.current()
+            if self.context_cache.needs_refresh():
+                loop = asyncio.get_running_loop()
+                refresh = loop.run_in_executor(None, self._cached_model)
+                # A live entry keeps serving while its TTL is extended
+                if model is None:
+                    model = await refresh
+            if model is not None:
+                return model
+        return self.system_model
+
+    def hedge_delay(self) -> float:
+        """Seconds before a hedge is fired: the configured percentile of recent latencies"""
+        observed = self.latency.percentile(settings.llm_hedge_percentile)
+        return settings.llm_hedge_delay_seconds if observed is None else observed
+
     async def generate_response_stream(
-        self, 
+        self,
         prompt: str,
+        with_system_prompt: bool = True,
+        deadline: Optional[float] = None,
+        model_name: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """
         Generate streaming response from Gemini
-        
+
         Args:
             prompt: The full prompt string
-            
+            with_system_prompt: Apply the system prompt (per
+                settings.llm_system_prompt_mode); False for auxiliary calls
+            deadline: Seconds for the whole stream (default
+                settings.llm_deadline_seconds, 0 for none); raises
+                LLMDeadlineExceeded when it passes
+            model_name: Model to use instead of settings.llm_model
+
         Yields:
             Chunks of generated text
         """
-        try:
-            response = await self.model.generate_content_async(
+        deadline = settings.llm_deadline_seconds if deadline is None else deadline
+
+        async def start():
+            model = await self._model_for(with_system_prompt, model_name)
+            return await model.generate_content_async(
                 prompt,
                 generation_config=self.generation_config,
                 stream=True
             )
-            
-            async for chunk in response:
+
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + deadline if deadline else None
+        chunks = self.scheduler.stream(start, tokens=estimate_tokens(prompt))
+        try:
+            while True:
+                try:
+                    if expires_at is None:
+                        chunk = await chunks.__anext__()
+                    else:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, expires_at - loop.time()))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    if expires_at is not None and loop.time() >= expires_at:
+                        raise LLMDeadlineExceeded(f"LLM stream exceeded its {deadline:.1f}s deadline")
+                    raise
                 if chunk.text:
                     yield chunk.text
-                    
+
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            yield f"Error: {str(e)}"
+            raise e
+        finally:
+            await chunks.aclose()
 
     async def generate_response(
-        self, 
-        prompt: str
+        self,
+        prompt: str,
+        with_system_prompt: bool = True,
+        deadline: Optional[float] = None,
+        model_name: Optional[str] = None
     ) -> str:
         """
         Generate complete response (non-streaming)
+
+        Identical prompts in flight at the same time share one call. With
+        settings.llm_hedge_enabled, a second request (to llm_hedge_model if
+        set) is fired once the first has run longer than hedge_delay() and
+        the first result wins.
+
+        Args:
+            deadline: Seconds for the whole call including retries and
+                hedging (default settings.llm_deadline_seconds, 0 for none);
+                raises LLMDeadlineExceeded when it passes
+            model_name: Model to use instead of settings.llm_model
         """
-        try:
-            response = await self.model.generate_content_async(
+        deadline = settings.llm_deadline_seconds if deadline is None else deadline
+        tokens = estimate_tokens(prompt)
+
+        async def call(name: Optional[str], record_latency: bool):
+            model = await self._model_for(with_system_prompt, name)
+            start = time.perf_counter()
+            response = await model.generate_content_async(
                 prompt,
                 generation_config=self.generation_config
             )
+            if record_latency:
+                self.latency.record(time.perf_counter() - start)
             return response.text
+
+        def primary():
+            # Hedge delays are derived from the default model's latencies
+            return self.scheduler.run(lambda: call(model_name, not model_name), tokens=tokens)
+
+        def hedge():
+            return self.scheduler.run(lambda: call(settings.llm_hedge_model or model_name, False), tokens=tokens)
+
+        def work():
+            if settings.llm_hedge_enabled:
+                return self.scheduler.hedged(primary, hedge, self.hedge_delay())
+            return primary()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            generation = self.scheduler.single_flight((with_system_prompt, model_name, prompt), work)
+            if not deadline:
+                return await generation
+            try:
+                return await asyncio.wait_for(generation, deadline)
+            except asyncio.TimeoutError:
+                if loop.time() - started >= deadline:
+                    raise LLMDeadlineExceeded(f"LLM call exceeded its {deadline:.1f}s deadline")
+                raise
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             raise e
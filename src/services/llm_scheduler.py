@@ -0,0 +1,284 @@
+"""
+LLM Request Scheduler
+Concurrency cap, RPM/TPM rate limiting, retry with backoff and
+coalescing of identical in-flight requests
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying (google.api_core exceptions expose them as .code)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMOverloadedError(RuntimeError):
+    """No request slot became free within the queue timeout"""
+
+
+class LLMDeadlineExceeded(asyncio.TimeoutError):
+    """A generation did not complete within its deadline"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, transient server errors and timeouts"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        return int(getattr(error, "code", None)) in RETRYABLE_STATUS
+    except (TypeError, ValueError):
+        return False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2^attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    Rate limiter refilling `per_minute` units per minute, with bursts up to
+    one minute's worth. Units are reserved up front (the balance may go
+    negative), so concurrent callers are served in arrival order.
+    A non-positive rate disables the limit.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` units
+
+        Returns:
+            Seconds to wait before they are actually available
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        # A single request larger than the bucket still goes through, after a full refill
+        self._tokens -= min(amount, self.capacity)
+        return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self, amount: float = 1):
+        delay = self.reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class LatencyTracker:
+    """Recent call latencies, for percentile-based hedge delays"""
+
+    def __init__(self, window: int = 256, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """p-th percentile (0-100) of the window, None until min_samples calls"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class LLMScheduler:
+    """
+    Runs LLM calls with at most `max_in_flight` concurrently, paced by
+    request-per-minute and token-per-minute buckets. Retryable failures are
+    retried with jittered exponential backoff (outside the concurrency
+    slot). Calls sharing a key while one is in flight share its result.
+    Callers wait up to `queue_timeout` seconds for a slot before
+    LLMOverloadedError is raised.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        queue_timeout: float = 30.0
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "overloaded": 0, "hedged": 0, "hedge_wins": 0}
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Semaphores and futures are bound to a loop; start fresh on a new one
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._inflight = {}
+            self._waiters = {}
+
+    async def _acquire_slot(self, tokens: int):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["overloaded"] += 1
+            raise LLMOverloadedError(f"No LLM slot free after {self.queue_timeout:.0f}s")
+        try:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def _backoff(self, attempt: int, error: Exception):
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+        self.stats["retries"] += 1
+        logger.warning(f"LLM call failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int = 0, key: Optional[Hashable] = None) -> T:
+        """
+        Run `call` under the limits, retrying retryable errors
+
+        Args:
+            call: Starts a fresh attempt each time it is invoked
+            tokens: Estimated tokens charged to the TPM bucket
+            key: Identical in-flight calls (same key) are coalesced
+        """
+        self._bind_loop()
+        if key is None:
+            return await self._run(call, tokens)
+        return await self.single_flight(key, lambda: self._run(call, tokens))
+
+    async def single_flight(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Share one execution of `work` among concurrent callers using the same key
+
+        The work runs as its own task, so a caller that gives up (e.g. on its
+        own deadline) leaves it running for the others; it is cancelled only
+        once every caller has gone.
+        """
+        self._bind_loop()
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = self._loop.create_task(work())
+            self._waiters[key] = 0
+            # Callers may all be gone; don't warn about an unretrieved exception
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.stats["coalesced"] += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if not self._waiters[key] and not task.done():
+                    task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+
+    async def _run(self, call: Callable[[], Awaitable[T]], tokens: int) -> T:
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_slot(tokens)
+            try:
+                self.stats["calls"] += 1
+                return await call()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            finally:
+                self._semaphore.release()
+            await self._backoff(attempt, error)
+
+    async def stream(
+        self,
+        start: Callable[[], Awaitable[AsyncIterator[Any]]],
+        tokens: int = 0
+    ) -> AsyncGenerator[Any, None]:
+        """
+        Stream chunks under the limits, holding a slot until the stream ends
+
+        Opening the stream is retried like run(); once a chunk has been
+        yielded, errors propagate (the caller has already forwarded output).
+        """
+        self._bind_loop()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_slot(tokens)
+            emitted = False
+            try:
+                self.stats["calls"] += 1
+                async for chunk in await start():
+                    emitted = True
+                    yield chunk
+                return
+            except Exception as e:
+                if emitted or attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            finally:
+                self._semaphore.release()
+            await self._backoff(attempt, error)
+
+    async def hedged(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        backup: Callable[[], Awaitable[T]],
+        delay: float
+    ) -> T:
+        """
+        First successful result of `primary` and, if it has not finished
+        after `delay` seconds, `backup`; the slower one is cancelled.
+        No backup is started while every slot is taken, so hedges never
+        add load under saturation.
+        """
+        self._bind_loop()
+        tasks = [asyncio.ensure_future(primary())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and not self._semaphore.locked():
+                self.stats["hedged"] += 1
+                tasks.append(asyncio.ensure_future(backup()))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
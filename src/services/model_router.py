@@ -0,0 +1,124 @@
+"""
+Model Router
+Chooses per request between a direct FAQ answer, a fast model and the
+full model, from how decisively retrieval matched
+"""
+from typing import Any, Dict, List, Optional
+from src.config import settings
+from src.services.sparse_index import tokenize
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 'faq'  - answer with the matched FAQ's stored answer, no generation
+# 'fast' - RAG prompt on settings.llm_fast_model
+# 'full' - RAG prompt on settings.llm_model
+ROUTES = ("faq", "fast", "full")
+
+
+def similarity(doc: Dict[str, Any]) -> Optional[float]:
+    """
+    Cosine similarity of a dense hit: 'score' is the squared L2 distance
+    between unit vectors, so cos = 1 - d / 2. None for lexical-only hits.
+    """
+    if doc.get("score") is None:
+        return None
+    return 1.0 - float(doc["score"]) / 2.0
+
+
+def lexical_match(query: Optional[str], doc: Dict[str, Any]) -> bool:
+    """
+    Whether a query matches a short-circuit hit's FAQ question closely
+    enough to answer with it: long enough, and covering most of its terms
+    """
+    question = (doc.get("metadata") or {}).get("question")
+    if not query or not question:
+        return False
+    query_terms, question_terms = set(tokenize(query)), set(tokenize(question))
+    if len(query_terms) < settings.route_lexical_min_terms or not question_terms:
+        return False
+    return len(query_terms & question_terms) / len(question_terms) >= settings.route_lexical_coverage
+
+
+def lexical_confidence(retrievals: List[Dict[str, Any]]) -> float:
+    """Top BM25 score's share of the top two (1.0 for a lone hit)"""
+    top = float(retrievals[0]["bm25_score"])
+    runner_up = float(retrievals[1].get("bm25_score") or 0.0) if len(retrievals) > 1 else 0.0
+    return top / (top + runner_up) if top + runner_up > 0 else 0.0
+
+
+class ModelRouter:
+    """
+    Routes on the top hit's similarity and its margin over the runner-up:
+
+    - similarity >= route_faq_similarity and margin >= route_faq_margin,
+      with a stored FAQ answer: answer directly
+    - similarity >= confidence_threshold: the fast model (if configured)
+    - otherwise (weak or no dense match): the full model
+
+    A hit from a confident BM25 short-circuit has no dense score; it already
+    contains every query term and clearly beats the runner-up, so it goes to
+    the fast model, or is answered directly when the query restates its FAQ
+    question (see lexical_match).
+    """
+
+    def __init__(self):
+        self.stats = {route: 0 for route in ROUTES}
+
+    def route(self, retrievals: Optional[List[Dict[str, Any]]], query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Args:
+            retrievals: Hits for the query, best first
+            query: The user query (needed to answer lexical hits directly)
+
+        Returns:
+            {"route", "model" (None for the default model), "similarity", "margin",
+            "lexical" (routed on a BM25 short-circuit hit)}
+        """
+        top = similarity(retrievals[0]) if retrievals else None
+        runner_up = similarity(retrievals[1]) if retrievals and len(retrievals) > 1 else None
+        margin = None
+        if top is not None:
+            margin = top - runner_up if runner_up is not None else top
+
+        lexical = top is None and bool(retrievals) and bool(retrievals[0].get("shortcircuit"))
+
+        route = "full"
+        if settings.router_enabled and (top is not None or lexical):
+            answer = (retrievals[0].get("metadata") or {}).get("answer")
+            if lexical:
+                if answer and lexical_match(query, retrievals[0]):
+                    route = "faq"
+                elif settings.llm_fast_model:
+                    route = "fast"
+            elif answer and top >= settings.route_faq_similarity and margin >= settings.route_faq_margin:
+                route = "faq"
+            elif settings.llm_fast_model and top >= settings.confidence_threshold:
+                route = "fast"
+
+        self.stats[route] += 1
+        decision = {
+            "route": route,
+            "model": settings.llm_fast_model if route == "fast" else None,
+            "similarity": top,
+            "margin": margin,
+            "lexical": lexical,
+        }
+        logger.debug(f"Routing decision: {decision}")
+        return decision
+
+    def direct_answer(self, decision: Dict[str, Any], retrievals: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Response fields answering straight from the top FAQ"""
+        doc = retrievals[0]
+        confidence = lexical_confidence(retrievals) if decision["lexical"] else decision["similarity"]
+        return {
+            "answer_text": doc["metadata"]["answer"],
+            "confidence": round(confidence, 3),
+            "sources": [doc.get("id", "unknown")],
+            "next_action": "reply",
+            "action_payload": {"route": "faq"}
+        }
+
+
+# Global router instance
+model_router = ModelRouter()
@@ -0,0 +1,38 @@
+"""
+Preload-and-Fork Support
+Loads read-only state once in the gunicorn master so workers share it copy-on-write
+"""
+import gc
+from src.config import settings
+from src.database import engine
+from src.services.reranker import reranker
+from src.services.retriever import vector_db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def preload_shared_state():
+    """
+    Load model weights, the FAISS index and the lookup tables before forking
+
+    No inference runs here: torch/OpenMP thread pools started in the master
+    are not fork-safe, so each worker runs its first encode during its own
+    warm-up. gc.freeze() moves everything loaded so far out of the collector's
+    reach, so GC passes in the workers do not touch (and copy) those pages.
+    """
+    _ = vector_db.encoder  # weights only
+    vector_db.wait_for_compaction()
+    vector_db.document_ids()  # builds the id map (and BM25, if the snapshot has no postings)
+    if settings.rerank_enabled:
+        _ = reranker.model
+
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded shared state ({len(vector_db.documents)} documents) in the master process")
+
+
+def reset_after_fork():
+    """Drop resources inherited from the master that must not be shared"""
+    # Pooled connections (e.g. opened by init_db) belong to the master
+    engine.dispose(close=False)
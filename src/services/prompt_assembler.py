@@ -0,0 +1,182 @@
+"""
+Prompt Assembler
+Fills a precompiled prompt template while packing the variable sections
+into a token budget
+"""
+from string import Formatter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from src.config import settings
+from src.models.schemas import MessageResponse
+from src.prompts.prompts import CONTEXT_PROMPT_TEMPLATE, RAG_PROMPT_TEMPLATE, SYSTEM_PROMPT
+import logging
+
+logger = logging.getLogger(__name__)
+
+NO_DOCUMENTS = "No relevant documents found."
+TRUNCATED = " …"
+
+# Variable sections in packing order (highest priority first) and the
+# largest share of the remaining budget each may take. Whatever a section
+# leaves unused flows down to the next one.
+SECTION_SHARES = (
+    ("retrieved_context", 0.7),
+    ("session_summary", 0.25),
+    ("chat_history", 1.0),
+)
+
+# A truncated document or summary shorter than this is not worth including
+MIN_TRUNCATED_TOKENS = 24
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate token count (about 4 characters per token, the same
+    estimate stored in Message.tokens); Gemini has no local tokenizer and
+    count_tokens is a network call
+    """
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text to roughly `tokens` tokens at a word boundary"""
+    if estimate_tokens(text) <= tokens:
+        return text
+    limit = max(0, tokens * 4 - len(TRUNCATED))
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + TRUNCATED
+
+
+class PromptAssembler:
+    """
+    Prompt template split once into literal segments and fields.
+
+    Fields given in `static` (the system prompt) are substituted at
+    construction, so the fixed instructions prefix is built and counted
+    once; each request only counts and packs the variable sections.
+    `reserved_tokens` accounts for a prefix sent separately (system
+    instruction or cached content) against the same budget.
+    """
+
+    def __init__(
+        self,
+        template: str,
+        static: Optional[Dict[str, str]] = None,
+        budget: Optional[int] = None,
+        reserved_tokens: int = 0
+    ):
+        static = static or {}
+        self._segments: List[Tuple[str, Optional[str]]] = []
+        literal = ""
+        for text, field, _, _ in Formatter().parse(template):
+            literal += text
+            if field is None:
+                continue
+            if field in static:
+                literal += static[field]
+            else:
+                self._segments.append((literal, field))
+                literal = ""
+        self._segments.append((literal, None))
+        self.fields = [field for _, field in self._segments if field is not None]
+        # Text sent alongside the prompt (a system instruction) still counts
+        self.static_tokens = reserved_tokens + sum(estimate_tokens(text) for text, _ in self._segments)
+        self.reserved_tokens = reserved_tokens
+        self._budget = budget
+
+    @property
+    def budget(self) -> int:
+        """Prompt token budget (settings.prompt_token_budget, or a multiple of the reply size)"""
+        if self._budget is not None:
+            return self._budget
+        return settings.prompt_token_budget or settings.prompt_budget_ratio * settings.llm_max_tokens
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(text + (values[field] if field else "") for text, field in self._segments)
+
+    def assemble(
+        self,
+        user_query: str,
+        retrievals: Sequence[Dict[str, Any]],
+        chat_history: Sequence[MessageResponse],
+        session_summary: str
+    ) -> Tuple[str, List[Dict[str, Any]], int]:
+        """
+        Build the prompt within the token budget
+
+        The user query is always kept (truncated only if it alone overflows).
+        Documents are packed in rank order and history newest first; the
+        first document or summary that does not fit is truncated, history
+        messages are dropped whole.
+
+        Returns:
+            (prompt, the retrievals included, estimated input tokens
+            including reserved_tokens)
+        """
+        remaining = self.budget - self.static_tokens
+        user_query = truncate_to_tokens(user_query, max(remaining, MIN_TRUNCATED_TOKENS))
+        remaining -= estimate_tokens(user_query)
+
+        values = {"user_query": user_query}
+        included: List[Dict[str, Any]] = []
+        for section, share in SECTION_SHARES:
+            allowance = int(max(remaining, 0) * share)
+            if section == "retrieved_context":
+                text, included = self._pack_documents(retrievals, allowance)
+            elif section == "session_summary":
+                text = self._pack_summary(session_summary, allowance)
+            else:
+                text = self._pack_history(chat_history, allowance)
+            values[section] = text
+            remaining -= estimate_tokens(text)
+
+        if len(included) < len(retrievals):
+            logger.debug(f"Prompt budget kept {len(included)}/{len(retrievals)} documents")
+
+        prompt = self.render(values)
+        return prompt, included, self.reserved_tokens + estimate_tokens(prompt)
+
+    @staticmethod
+    def _pack_documents(retrievals: Sequence[Dict[str, Any]], allowance: int) -> Tuple[str, List[Dict[str, Any]]]:
+        lines, included, used = [], [], 0
+        for doc in retrievals:
+            line = f"{len(lines) + 1}) [{doc.get('id', 'unknown')}] {doc['text']}"
+            tokens = estimate_tokens(line) + 1  # newline
+            if used + tokens > allowance:
+                left = allowance - used
+                if left >= MIN_TRUNCATED_TOKENS:
+                    lines.append(truncate_to_tokens(line, left - 1))
+                    included.append(doc)
+                break
+            lines.append(line)
+            included.append(doc)
+            used += tokens
+        return ("\n".join(lines) if lines else NO_DOCUMENTS), included
+
+    @staticmethod
+    def _pack_summary(summary: str, allowance: int) -> str:
+        if estimate_tokens(summary) <= allowance:
+            return summary
+        if allowance < MIN_TRUNCATED_TOKENS:
+            return ""
+        return truncate_to_tokens(summary, allowance)
+
+    @staticmethod
+    def _pack_history(chat_history: Sequence[MessageResponse], allowance: int) -> str:
+        lines, used = [], 0
+        for msg in reversed(chat_history):
+            line = f"{msg.role.capitalize()}: {msg.content}"
+            tokens = estimate_tokens(line) + 1
+            if used + tokens > allowance:
+                break
+            lines.append(line)
+            used += tokens
+        return "\n".join(reversed(lines))
+
+
+# Global assemblers: the RAG prompt with the system prompt precompiled in,
+# and the per-request part alone for when the model carries the system prompt
+prompt_assembler = PromptAssembler(RAG_PROMPT_TEMPLATE, {"system_prompt": SYSTEM_PROMPT})
+context_assembler = PromptAssembler(CONTEXT_PROMPT_TEMPLATE, reserved_tokens=estimate_tokens(SYSTEM_PROMPT))
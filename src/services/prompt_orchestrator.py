@@ -3,53 +3,86 @@ Prompt Orchestrator Service
 Constructs the final prompt for the LLM using context and templates
 """
 import json
-from typing import List, Dict, Any, Optional
-from src.prompts.prompts import SYSTEM_PROMPT, RAG_PROMPT_TEMPLATE
-from src.services.retriever import vector_db
+from typing import List, Dict, Any, Optional, Tuple
+from src.config import settings
+from src.services.llm_client import llm_client
+from src.services.prompt_assembler import context_assembler, prompt_assembler
+from src.services.reranker import reranker
+from src.services.retrieval_worker import retrieval_worker
+from src.services.stage_timings import stage
 from src.models.schemas import MessageResponse
 
+DEGRADED_ANSWER_TEMPLATE = "I'm taking longer than usual to respond, but this from our help center should help:\n\n{answer}"
+DEGRADED_CONFIDENCE = 0.5
+
+
 class PromptOrchestrator:
     def __init__(self):
         pass
 
+    async def retrieve(self, user_message: str, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Retrieve relevant documents for the user message
+        """
+        # For a production app, we might rewrite the query based on history here
+        if not settings.rerank_enabled:
+            return await retrieval_worker.search(user_message, k=k)
+
+        # Re-rank a wider candidate set; falls back to retrieval order on budget overrun
+        candidates = await retrieval_worker.search(user_message, k=max(k, settings.rerank_candidates))
+        with stage("rerank"):
+            return await reranker.rerank(user_message, candidates, k)
+
     async def build_prompt(
         self,
         user_message: str,
         chat_history: List[MessageResponse],
-        session_summary: str = "No previous summary."
-    ) -> str:
+        session_summary: str = "No previous summary.",
+        retrievals: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[str, List[Dict[str, Any]], int]:
         """
-        Construct the complete prompt with RAG context
+        Construct the complete prompt with RAG context, packed into the
+        prompt token budget
+
+        Returns:
+            (prompt, the retrieved documents it includes, estimated prompt tokens)
         """
-        # 1. Retrieve relevant documents
-        # For a production app, we might rewrite the query based on history here
-        retrievals = vector_db.search(user_message, k=3)
-        
-        # 2. Format retrieved context
-        if retrievals:
-            context_str = "\n".join(
-                [f"{i+1}) [{doc.get('id', 'unknown')}] {doc['text']}" 
-                 for i, doc in enumerate(retrievals)]
-            )
-        else:
-            context_str = "No relevant documents found."
-            
-        # 3. Format chat history (last 5 messages)
-        recent_history = chat_history[-5:] if chat_history else []
-        history_str = "\n".join(
-            [f"{msg.role.capitalize()}: {msg.content}" for msg in recent_history]
-        )
-        
-        # 4. Fill template
-        prompt = RAG_PROMPT_TEMPLATE.format(
-            system_prompt=SYSTEM_PROMPT,
-            session_summary=session_summary,
-            retrieved_context=context_str,
-            chat_history=history_str,
-            user_query=user_message
+        # 1. Retrieve relevant documents (unless the caller already did)
+        if retrievals is None:
+            retrievals = await self.retrieve(user_message)
+
+        # 2. Keep the newest session_memory_window messages
+        window = settings.session_memory_window
+        recent_history = chat_history[-window:] if chat_history and window > 0 else []
+
+        # 3. Pack documents, summary and history into the budget; the system
+        #    prompt is left out when the model already carries it
+        assembler = prompt_assembler if llm_client.inline_system_prompt else context_assembler
+        return assembler.assemble(
+            user_query=user_message,
+            retrievals=retrievals,
+            chat_history=recent_history,
+            session_summary=session_summary
         )
-        
-        return prompt, retrievals
+
+    def degraded_response(self, retrievals: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Answer from the top retrieved FAQ, for when the LLM misses its deadline
+
+        Returns:
+            Response fields, or None without a retrieved document
+        """
+        if not retrievals:
+            return None
+        doc = retrievals[0]
+        answer = (doc.get("metadata") or {}).get("answer") or doc["text"]
+        return {
+            "answer_text": DEGRADED_ANSWER_TEMPLATE.format(answer=answer),
+            "confidence": DEGRADED_CONFIDENCE,
+            "sources": [doc.get("id", "unknown")],
+            "next_action": "reply",
+            "action_payload": {"degraded": True}
+        }
 
     def parse_llm_response(self, llm_text: str) -> Dict[str, Any]:
         """
@@ -74,5 +107,106 @@ class PromptOrchestrator:
                 "action_payload": {}
             }
 
+
+class AnswerTextStreamParser:
+    """
+    Incrementally extracts the "answer_text" value from a JSON object
+    that is still being streamed by the LLM.
+
+    Feed raw chunks as they arrive; each call returns only the newly
+    decoded characters of the answer so they can be forwarded to the client.
+    """
+
+    _KEY = '"answer_text"'
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._state = "key"  # 'key' -> 'colon' -> 'open_quote' -> 'value' -> 'done'
+        self.text = ""
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consume a chunk of raw LLM output
+
+        Returns:
+            Newly decoded answer_text characters (may be empty)
+        """
+        self._buffer += chunk
+        out = []
+
+        while self._state != "done":
+            if self._state == "key":
+                idx = self._buffer.find(self._KEY, self._pos)
+                if idx == -1:
+                    # Keep enough tail to match a key split across chunks
+                    self._pos = max(self._pos, len(self._buffer) - len(self._KEY))
+                    break
+                self._pos = idx + len(self._KEY)
+                self._state = "colon"
+            elif self._state in ("colon", "open_quote"):
+                expected = ":" if self._state == "colon" else '"'
+                while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                    self._pos += 1
+                if self._pos >= len(self._buffer):
+                    break
+                if self._buffer[self._pos] != expected:
+                    # Not the key we want (e.g. the word inside another value); keep scanning
+                    self._state = "key"
+                    continue
+                self._pos += 1
+                self._state = "open_quote" if self._state == "colon" else "value"
+            else:
+                decoded = self._decode_value(out)
+                if not decoded:
+                    break
+
+        new_text = "".join(out)
+        self.text += new_text
+        return new_text
+
+    def _decode_value(self, out: List[str]) -> bool:
+        """Decode as much of the string value as is available; False when more input is needed"""
+        buf = self._buffer
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            if ch == '"':
+                self._pos += 1
+                self._state = "done"
+                return True
+            if ch != "\\":
+                out.append(ch)
+                self._pos += 1
+                continue
+
+            # Escape sequence - wait until it is complete
+            if self._pos + 1 >= len(buf):
+                return False
+            esc = buf[self._pos + 1]
+            if esc == "u":
+                if self._pos + 6 > len(buf):
+                    return False
+                code = int(buf[self._pos + 2:self._pos + 6], 16)
+                # Surrogate pairs arrive as two consecutive \uXXXX escapes
+                if 0xD800 <= code < 0xDC00:
+                    if self._pos + 12 > len(buf):
+                        return False
+                    low = int(buf[self._pos + 8:self._pos + 12], 16)
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    self._pos += 12
+                else:
+                    out.append(chr(code))
+                    self._pos += 6
+            else:
+                out.append(self._ESCAPES.get(esc, esc))
+                self._pos += 2
+        return False
+
+
 # Global instance
 orchestrator = PromptOrchestrator()
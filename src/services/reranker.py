@@ -0,0 +1,130 @@
+"""
+Cross-Encoder Re-ranker
+Re-scores retrieval candidates under a per-request latency budget
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import numpy as np
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RerankDeadlineExceeded(Exception):
+    """Scoring was stopped because the caller's budget had run out"""
+
+
+class Reranker:
+    """
+    Scores (query, document) pairs with a cross-encoder in batches on a
+    dedicated thread pool.
+
+    Each call gets a hard budget: if the predicted cost (from a running
+    average of the per-pair time) exceeds it, or scoring does not finish in
+    time, the candidates are returned in their retrieval order instead.
+    The job itself carries the deadline too: one still queued behind other
+    work when it passes is dropped without running, and a running one stops
+    at the next batch, so abandoned jobs do not delay later requests.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        budget_ms: float = 150.0,
+        batch_size: int = 32,
+        max_workers: int = 1
+    ):
+        self.model_name = model_name
+        self.budget = max(0.0, budget_ms) / 1000
+        self.batch_size = batch_size
+        self._model = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        self._seconds_per_pair: Optional[float] = None  # Running average, unknown until first call
+        self.stats = {"reranked": 0, "timeouts": 0, "skipped": 0, "errors": 0, "abandoned": 0}
+
+    @property
+    def model(self):
+        """Lazy load the cross-encoder (and torch with it)"""
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            logger.info(f"Loading re-ranking model {self.model_name}...")
+            self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def score(self, query: str, docs: List[Dict[str, Any]], deadline: Optional[float] = None) -> np.ndarray:
+        """
+        Relevance score per document (higher is better)
+
+        Args:
+            deadline: time.monotonic() value; once it has passed, scoring
+                stops before the next batch with RerankDeadlineExceeded
+        """
+        model = self.model
+        start = time.perf_counter()
+        scores = []
+        for i in range(0, len(docs), self.batch_size):
+            if deadline is not None and time.monotonic() >= deadline:
+                self.stats["abandoned"] += 1
+                raise RerankDeadlineExceeded(f"Re-ranking deadline passed after {i}/{len(docs)} pairs")
+            batch = docs[i:i + self.batch_size]
+            scores.extend(model.predict([(query, doc["text"]) for doc in batch], batch_size=self.batch_size))
+        scores = np.asarray(scores, dtype="float32")
+        per_pair = (time.perf_counter() - start) / len(docs)
+        if self._seconds_per_pair is None:
+            self._seconds_per_pair = per_pair
+        else:
+            self._seconds_per_pair = 0.8 * self._seconds_per_pair + 0.2 * per_pair
+        return scores
+
+    async def rerank(self, query: str, candidates: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+        """
+        Return the top k candidates by cross-encoder score
+
+        Falls back to the first k candidates (retrieval order) when the
+        budget would be exceeded or scoring fails.
+        """
+        if len(candidates) <= 1:
+            return candidates[:k]
+
+        if self._seconds_per_pair is not None and self._seconds_per_pair * len(candidates) > self.budget:
+            # Not worth starting: the estimate alone blows the budget. Decay
+            # the estimate so a transient slowdown does not disable re-ranking
+            self.stats["skipped"] += 1
+            self._seconds_per_pair *= 0.9
+            return candidates[:k]
+
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.budget
+        try:
+            scores = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self.score, query, candidates, deadline),
+                timeout=self.budget
+            )
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(f"Re-ranking exceeded {self.budget * 1000:.0f}ms; using retrieval order")
+            return candidates[:k]
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Re-ranking failed: {e}")
+            return candidates[:k]
+
+        self.stats["reranked"] += 1
+        order = np.argsort(-scores, kind="stable")[:k]
+        results = []
+        for i in order:
+            doc = candidates[i]
+            doc["rerank_score"] = float(scores[i])
+            results.append(doc)
+        return results
+
+
+# Global re-ranker instance (the model loads on first use)
+reranker = Reranker(
+    settings.rerank_model,
+    budget_ms=settings.rerank_budget_ms,
+    batch_size=settings.rerank_batch_size
+)
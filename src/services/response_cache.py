@@ -0,0 +1,192 @@
+"""
+Semantic Response Cache
+Reuses a generated answer when a new query is a close paraphrase of a
+cached one and retrieval returned the same documents
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype="float32").ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def documents_key(retrievals: List[Dict[str, Any]]) -> str:
+    """Stable key for the set of retrieved document ids"""
+    ids = sorted(str(doc.get("id", "unknown")) for doc in retrievals)
+    return hashlib.sha1("|".join(ids).encode("utf-8")).hexdigest()
+
+
+class LocalResponseCacheBackend:
+    """In-process backend: entries grouped by (namespace, documents key), LRU bounded"""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # (namespace, doc_key) -> list of (stored_at, unit vector, payload)
+        self._groups: "OrderedDict[Tuple[str, str], List[Tuple[float, np.ndarray, Dict[str, Any]]]]" = OrderedDict()
+        self._size = 0
+
+    async def candidates(self, namespace: str, doc_key: str) -> List[Tuple[np.ndarray, Dict[str, Any]]]:
+        group = self._groups.get((namespace, doc_key))
+        if not group:
+            return []
+        self._groups.move_to_end((namespace, doc_key))
+        now = time.time()
+        live = [e for e in group if now - e[0] < self.ttl_seconds]
+        self._size -= len(group) - len(live)
+        self._groups[(namespace, doc_key)] = live
+        return [(vector, payload) for _, vector, payload in live]
+
+    async def add(self, namespace: str, doc_key: str, vector: np.ndarray, payload: Dict[str, Any]):
+        self._groups.setdefault((namespace, doc_key), []).append((time.time(), vector, payload))
+        self._groups.move_to_end((namespace, doc_key))
+        self._size += 1
+        while self._size > self.max_entries and self._groups:
+            _, evicted = self._groups.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def clear(self):
+        self._groups.clear()
+        self._size = 0
+
+
+class RedisResponseCacheBackend:
+    """Redis backend shared by all workers; one capped list per (namespace, documents key)"""
+
+    def __init__(self, url: str, ttl_seconds: float = 86400, max_per_key: int = 50, prefix: str = "respcache"):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self.ttl_seconds = int(ttl_seconds)
+        self.max_per_key = max_per_key
+        self.prefix = prefix
+
+    def _key(self, namespace: str, doc_key: str) -> str:
+        return f"{self.prefix}:{namespace}:{doc_key}"
+
+    async def candidates(self, namespace: str, doc_key: str) -> List[Tuple[np.ndarray, Dict[str, Any]]]:
+        raw_entries = await self._redis.lrange(self._key(namespace, doc_key), 0, -1)
+        entries = []
+        for raw in raw_entries:
+            entry = json.loads(raw)
+            entries.append((np.asarray(entry["vector"], dtype="float32"), entry["payload"]))
+        return entries
+
+    async def add(self, namespace: str, doc_key: str, vector: np.ndarray, payload: Dict[str, Any]):
+        key = self._key(namespace, doc_key)
+        entry = json.dumps({"vector": vector.tolist(), "payload": payload}, default=str)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, entry)
+            pipe.ltrim(key, 0, self.max_per_key - 1)
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def clear(self):
+        async for key in self._redis.scan_iter(match=f"{self.prefix}:*"):
+            await self._redis.delete(key)
+
+
+class SemanticResponseCache:
+    """
+    Looks up answers by query embedding within a cosine distance of a cached
+    query, restricted to entries generated from the same retrieved documents.
+
+    The namespace is the vector index version, so entries are invalidated
+    as soon as the FAQ index changes.
+    """
+
+    def __init__(self, backend=None, max_distance: float = 0.05):
+        self.backend = backend
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def lookup(
+        self,
+        namespace: str,
+        query_vector,
+        retrievals: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached response payload closest to the query, if close enough"""
+        if not self.enabled or not retrievals:
+            return None
+
+        try:
+            candidates = await self.backend.candidates(namespace, documents_key(retrievals))
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+            return None
+
+        query = _unit(query_vector)
+        best_payload, best_distance = None, None
+        for vector, payload in candidates:
+            distance = 1.0 - float(np.dot(query, vector))
+            if best_distance is None or distance < best_distance:
+                best_payload, best_distance = payload, distance
+
+        if best_distance is not None and best_distance <= self.max_distance:
+            self.hits += 1
+            return best_payload
+
+        self.misses += 1
+        return None
+
+    async def store(
+        self,
+        namespace: str,
+        query_vector,
+        retrievals: List[Dict[str, Any]],
+        payload: Dict[str, Any]
+    ):
+        """Cache a generated response payload for later paraphrases"""
+        if not self.enabled or not retrievals:
+            return
+        try:
+            await self.backend.add(namespace, documents_key(retrievals), _unit(query_vector), payload)
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {e}")
+
+    async def clear(self):
+        if self.enabled:
+            await self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def create_response_cache() -> SemanticResponseCache:
+    """Build the response cache selected by settings.response_cache_backend"""
+    backend_name = settings.response_cache_backend.lower()
+    if backend_name == "redis":
+        backend = RedisResponseCacheBackend(
+            settings.redis_url,
+            ttl_seconds=settings.response_cache_ttl_seconds
+        )
+    elif backend_name == "local":
+        backend = LocalResponseCacheBackend(
+            max_entries=settings.response_cache_max_entries,
+            ttl_seconds=settings.response_cache_ttl_seconds
+        )
+    elif backend_name == "none":
+        backend = None
+    else:
+        raise ValueError(f"Unknown response cache backend: {settings.response_cache_backend}")
+
+    return SemanticResponseCache(backend, max_distance=settings.response_cache_max_distance)
+
+
+# Global response cache instance
+response_cache = create_response_cache()
@@ -0,0 +1,131 @@
+"""
+Retrieval Worker
+Micro-batches concurrent vector searches and runs them off the event loop
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+from src.config import settings
+from src.services.retriever import VectorDB, vector_db
+from src.services.stage_timings import record_stage, take_thread_stages
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (query, future awaiting its results)
+PendingQuery = Tuple[str, asyncio.Future]
+
+
+class RetrievalWorker:
+    """
+    Collects queries arriving within a short window (or until the batch is
+    full), then encodes and searches them with a single batched call on a
+    dedicated thread pool. Each waiting coroutine receives its own results.
+    """
+
+    def __init__(
+        self,
+        db: VectorDB,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 3.0,
+        max_workers: int = 1
+    ):
+        self.vector_db = db
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[int, List[PendingQuery]] = {}  # keyed by k
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"queries": 0, "batches": 0}
+
+    async def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Search for relevant documents, sharing the encode/search with
+        any other queries submitted in the same window
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures and timers are bound to a loop; start fresh on a new one
+            self._loop = loop
+            self._pending = {}
+            self._timers = {}
+
+        future = loop.create_future()
+        batch = self._pending.setdefault(k, [])
+        batch.append((query, future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(k)
+        elif len(batch) == 1:
+            self._timers[k] = loop.call_later(self.max_wait, self._flush, k)
+
+        start = time.perf_counter()
+        results, embed_seconds = await future
+        # The batch's encode time is charged to each query waiting on it
+        record_stage("embed", embed_seconds)
+        record_stage("search", time.perf_counter() - start - embed_seconds)
+        return results
+
+    async def embed(self, query: str):
+        """Query embedding (usually served from the query cache) computed off the event loop"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        vectors = await loop.run_in_executor(self._executor, self.vector_db.embed_queries, [query])
+        record_stage("embed", time.perf_counter() - start)
+        return vectors[0]
+
+    def _flush(self, k: int):
+        """Hand the pending batch for k to the executor"""
+        timer = self._timers.pop(k, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(k, [])
+        if not batch:
+            return
+
+        task = self._loop.create_task(self._run_batch(batch, k))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[PendingQuery], k: int):
+        # Identical queries in one window are only encoded once
+        unique_queries = list(dict.fromkeys(query for query, _ in batch))
+
+        try:
+            results, embed_seconds = await self._loop.run_in_executor(
+                self._executor, self._search_batch, unique_queries, k
+            )
+        except Exception as e:
+            logger.error(f"Retrieval batch failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["queries"] += len(batch)
+        self.stats["batches"] += 1
+
+        by_query = dict(zip(unique_queries, results))
+        for query, future in batch:
+            if not future.done():
+                # Callers may mutate their results, so hand out copies
+                future.set_result(([doc.copy() for doc in by_query[query]], embed_seconds))
+
+    def _search_batch(self, queries: List[str], k: int) -> Tuple[List[List[Dict[str, Any]]], float]:
+        """Batched search on the executor, with the time spent encoding"""
+        take_thread_stages()
+        results = self.vector_db.search_batch(queries, k)
+        return results, take_thread_stages().get("embed", 0.0)
+
+
+# Global retrieval worker instance
+retrieval_worker = RetrievalWorker(
+    vector_db,
+    max_batch_size=settings.retrieval_batch_size,
+    max_wait_ms=settings.retrieval_batch_wait_ms,
+    max_workers=settings.retrieval_workers
+)
@@ -3,101 +3,913 @@ Vector Database Service using FAISS for RAG
 """
 import faiss
 import numpy as np
+import base64
+import hashlib
+import json
 import pickle
 import os
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
 from src.config import settings
+from src.services.document_store import DocumentStore, write_documents
+from src.services.embedding_cache import EmbeddingCache
+from src.services.encoders import create_encoder
+from src.services.index_factory import (
+    create_index,
+    train_index,
+    set_search_params,
+    prepare_vectors,
+    to_l2_distances,
+    training_size,
+)
+from src.services.sparse_index import BM25Index, PersistedPostings, reciprocal_rank_fusion
+from src.services.stage_timings import record_thread_stage
 import logging
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+
+
+def used_encoder(hits: Iterable[Dict[str, Any]]) -> bool:
+    """Whether a result list came from a search that encoded the query (dense or fused hits)"""
+    return any("score" in hit or "rrf_score" in hit for hit in hits)
+
+
+def compute_content_hash(doc: Dict[str, Any]) -> str:
+    """Hash of the embedded text and metadata, used to skip unchanged documents"""
+    payload = json.dumps(
+        {"text": doc.get("text", ""), "metadata": doc.get("metadata")},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def remap_ids(index: faiss.Index, mapping: np.ndarray):
+    """
+    Rewrite the vector ids of an IndexIDMap2 or IVF index in place through
+    `mapping` (old id -> new id); vectors mapped to -1 are never returned
+    """
+    mapping = np.asarray(mapping, dtype='int64')
+    if isinstance(index, faiss.IndexIDMap2):
+        ids = faiss.vector_to_array(index.id_map)
+        new_ids = np.where(ids >= 0, mapping[np.maximum(ids, 0)], -1) if len(ids) else ids
+        faiss.copy_array_to_vector(new_ids.astype('int64'), index.id_map)
+        index.construct_rev_map()
+        return
+
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids_ptr = invlists.get_ids(list_no)
+        ids = faiss.rev_swig_ptr(ids_ptr, size).copy()
+        invlists.release_ids(list_no, ids_ptr)
+        codes_ptr = invlists.get_codes(list_no)
+        codes = faiss.rev_swig_ptr(codes_ptr, size * invlists.code_size).copy()
+        invlists.release_codes(list_no, codes_ptr)
+        new_ids = np.where(ids >= 0, mapping[np.maximum(ids, 0)], -1).astype('int64')
+        invlists.update_entries(list_no, 0, size, faiss.swig_ptr(new_ids), faiss.swig_ptr(codes))
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer. A waiting writer blocks new
+    readers, so a steady stream of searches cannot starve it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
 class VectorDB:
+    """
+    FAISS index plus document store, keyed by document id
+
+    On disk the index lives in an immutable snapshot directory (index.faiss
+    + columnar docstore) named by the CURRENT file, followed by an
+    append-only write-ahead log of upserts/deletes. Writes only append to
+    the log; compaction folds it into a new snapshot in the background.
+
+    Vector ids in the FAISS index are row positions in the document store:
+    IVF indexes keep them in their inverted lists, other types are wrapped
+    in an IndexIDMap2. Replaced or deleted rows are removed from the index
+    where the index type supports it and are tombstoned until compaction.
+
+    Chunk documents (see src.data.chunking) name their parent in
+    metadata['parent_id']; deleting a parent id deletes all of its chunks
+    and search can collapse chunk hits back to one result per parent.
+
+    A BM25 index over the same rows backs the sparse and hybrid retrieval
+    modes. Each snapshot stores its postings memory-mapped next to the
+    docstore, so opening them costs no heap; only for a snapshot without
+    them (legacy layout) is BM25 rebuilt from the documents, in memory,
+    along with the id map.
+
+    Nothing is read from disk at construction: the snapshot and log are
+    loaded on first use of the index or documents (normally by the
+    startup warm-up), so importing this module stays cheap.
+    """
+
     def __init__(self):
         """Initialize FAISS index and embedding model"""
         self._encoder = None
-        self.index = None
-        self.documents = []  # Stores metadata corresponding to vectors
-        
-        # Load existing index if available
-        self._load_index()
+        self._encoder_name = None
+        self._encoder_backend = None
+        self.query_cache = EmbeddingCache(
+            max_entries=settings.query_cache_size,
+            ttl_seconds=settings.query_cache_ttl_seconds
+        )
+        self._index = None
+        self._documents = DocumentStore()  # Stores metadata corresponding to vectors
+        self.sparse = BM25Index()  # Lexical index over the same rows
+        self._sparse_persisted = False  # Opened on the snapshot's postings
+        self._index_version = "empty"  # Changes whenever the persisted index changes
+
+        self._id_to_row: Optional[Dict[Any, int]] = None  # Built lazily from the store
+        self._hashes: Dict[Any, str] = {}
+        self._chunks: Dict[Any, Set[Any]] = {}  # parent id -> live chunk ids
+        self._parent_of: Dict[Any, Any] = {}  # chunk id -> parent id
+        self._dead: Set[int] = set()
+        self._snapshot = None
+        self._wal_ops = 0
+        self._write_lock = threading.RLock()  # Serializes writers and compaction
+        self._swap_lock = threading.Lock()  # Keeps (index, documents) consistent for readers
+        self._index_lock = ReadWriteLock()  # Searches vs in-place changes to the live faiss index
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._bulk_loads = 0  # Open bulk_load() blocks; auto-compaction waits for them
+
+        # Existing index is loaded on first access
+        self._loaded = False
+        self._loading = False
+        self._load_lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        """Load the persisted index once; re-entrant for the loading thread itself"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded or self._loading:
+                return
+            self._loading = True
+            try:
+                self._load_index()
+                self._loaded = True
+            finally:
+                self._loading = False
+
+    @property
+    def index(self):
+        self._ensure_loaded()
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+
+    @property
+    def documents(self) -> DocumentStore:
+        self._ensure_loaded()
+        return self._documents
+
+    @documents.setter
+    def documents(self, value: DocumentStore):
+        self._documents = value
+
+    @property
+    def index_version(self) -> str:
+        self._ensure_loaded()
+        return self._index_version
+
+    @index_version.setter
+    def index_version(self, value: str):
+        self._index_version = value
 
     @property
     def encoder(self):
-        """Lazy load encoder"""
-        if self._encoder is None:
-            logger.info("Loading embedding model...")
-            self._encoder = SentenceTransformer(settings.embedding_model)
+        """Lazy load encoder (reloaded if settings.embedding_model or encoder_backend changes)"""
+        if (
+            self._encoder is None
+            or self._encoder_name != settings.embedding_model
+            or self._encoder_backend != settings.encoder_backend
+        ):
+            self.load_encoder(settings.embedding_model, settings.encoder_backend)
         return self._encoder
 
+    def load_encoder(self, model_name: str, backend: str = "torch"):
+        """Load an embedding model; cached query vectors from another model are dropped"""
+        logger.info(f"Loading embedding model {model_name} ({backend})...")
+        self._encoder = create_encoder(backend, model_name)
+        if (self._encoder_name, self._encoder_backend) != (model_name, backend):
+            self.query_cache.clear()
+        self._encoder_name = model_name
+        self._encoder_backend = backend
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Encode queries, serving repeats from the query embedding cache
+
+        Returns:
+            float32 array of shape (len(queries), dim)
+        """
+        start = time.perf_counter()
+        encoder = self.encoder
+        vectors = [self.query_cache.get(q) for q in queries]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        if missing:
+            # Encode each distinct missing query once
+            to_encode = list(dict.fromkeys(queries[i] for i in missing))
+            encoded = dict(zip(to_encode, np.array(encoder.encode(to_encode)).astype('float32')))
+            for i in missing:
+                vectors[i] = encoded[queries[i]]
+                self.query_cache.put(queries[i], vectors[i])
+
+        record_thread_stage("embed", time.perf_counter() - start)
+        return np.vstack(vectors).astype('float32')
+
+    @property
+    def _wal_file(self) -> str:
+        return os.path.join(settings.faiss_index_path, "wal.jsonl")
+
+    @property
+    def _current_file(self) -> str:
+        return os.path.join(settings.faiss_index_path, "CURRENT")
+
     def _load_index(self):
-        """Load FAISS index from disk"""
-        index_file = os.path.join(settings.faiss_index_path, "index.faiss")
-        docs_file = os.path.join(settings.faiss_index_path, "documents.pkl")
-        
-        if os.path.exists(index_file) and os.path.exists(docs_file):
-            logger.info("Loading existing FAISS index...")
-            self.index = faiss.read_index(index_file)
-            with open(docs_file, "rb") as f:
-                self.documents = pickle.load(f)
+        """Load the latest snapshot from disk and replay the write-ahead log"""
+        root = settings.faiss_index_path
+        snapshot = None
+        if os.path.exists(self._current_file):
+            with open(self._current_file) as f:
+                snapshot = f.read().strip()
+
+        if snapshot:
+            logger.info(f"Loading FAISS snapshot {snapshot}...")
+            snapshot_dir = os.path.join(root, snapshot)
+            self.index = self._with_row_ids(faiss.read_index(os.path.join(snapshot_dir, "index.faiss")))
+            # Columns are memory-mapped lazily; nothing is unpickled into the heap
+            self.documents = DocumentStore(os.path.join(snapshot_dir, "docstore"))
+            if PersistedPostings.exists(os.path.join(snapshot_dir, "bm25")):
+                self.sparse = BM25Index(directory=os.path.join(snapshot_dir, "bm25"))
+                self._sparse_persisted = True
+            self._snapshot = snapshot
+        elif os.path.exists(os.path.join(root, "index.faiss")):
+            logger.info("Loading existing FAISS index (legacy layout)...")
+            index = faiss.read_index(os.path.join(root, "index.faiss"))
+            if DocumentStore.exists(os.path.join(root, "docstore")):
+                self.documents = DocumentStore(os.path.join(root, "docstore"))
+            else:
+                with open(os.path.join(root, "documents.pkl"), "rb") as f:
+                    self.documents = DocumentStore.from_documents(pickle.load(f))
+            self.index = self._with_row_ids(index)
+            # Legacy ingestion could add the same FAQ twice; keep the newest row
+            self._ensure_id_map()
         else:
-            logger.info("Initializing new FAISS index...")
-            # Valid dimension for all-MiniLM-L6-v2 is 384
-            self.index = faiss.IndexFlatL2(384) 
-            self.documents = []
+            logger.info(f"Initializing new FAISS index ({settings.faiss_index_type})...")
+            self.index = self._new_index()
+            self.documents = DocumentStore()
+
+        self.set_search_params(settings.faiss_nprobe, settings.faiss_ef_search)
+        self._replay_wal()
+        self._refresh_index_version()
+
+    def _new_index(self, n_train: Optional[int] = None) -> faiss.Index:
+        """Empty index of the configured type, addressed by document row ids"""
+        base = create_index(settings.faiss_index_type, settings.embedding_dim, n_train=n_train)
+        return self._row_addressed(base)
+
+    @staticmethod
+    def _row_addressed(base: faiss.Index) -> faiss.Index:
+        """
+        Address an empty index by row ids. IVF indexes take ids natively (an
+        IndexIDMap2 around one shifts its id table on remove_ids while the
+        inverted lists keep their ids, mismatching every later row).
+        """
+        if faiss.try_extract_index_ivf(base) is not None:
+            return base
+        return faiss.IndexIDMap2(base)
+
+    @staticmethod
+    def _with_row_ids(index: faiss.Index) -> faiss.Index:
+        """Address an index whose vectors are implicitly numbered 0..n-1 by row ids"""
+        if isinstance(index, faiss.IndexIDMap2):
+            inner = faiss.downcast_index(index.index)
+            if faiss.try_extract_index_ivf(inner) is None:
+                return index
+            # Written by an earlier version: move the ids into the inverted lists
+            ivf = faiss.clone_index(inner)
+            remap_ids(ivf, faiss.vector_to_array(index.id_map))
+            logger.warning("Converted an IndexIDMap2-wrapped IVF index; rebuild it if rows were ever deleted")
+            return ivf
+        if isinstance(index, faiss.IndexIDMap):
+            raise ValueError("IndexIDMap indexes cannot be converted; rebuild the index")
+        if faiss.try_extract_index_ivf(index) is not None:
+            # Sequentially added IVF ids already are row positions
+            return index
+
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+
+        index.reset()
+        wrapped = faiss.IndexIDMap2(index)
+        if vectors is not None:
+            wrapped.add_with_ids(vectors, np.arange(len(vectors), dtype='int64'))
+        return wrapped
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune the recall/latency trade-off of IVF (nprobe) and HNSW (efSearch) indexes"""
+        set_search_params(self.index, nprobe=nprobe, ef_search=ef_search)
 
     def save_index(self):
-        """Save FAISS index and documents to disk"""
+        """Write a compacted snapshot of the index and documents, then truncate the log"""
+        self.compact()
+
+    def _refresh_index_version(self):
+        """Derive the version from the persisted state so every worker agrees on it"""
+        self.index_version = f"{self._snapshot or 'base'}+{self._wal_ops}"
+
+    def _append_wal(self, entries: List[Dict[str, Any]]):
         os.makedirs(settings.faiss_index_path, exist_ok=True)
-        
-        index_file = os.path.join(settings.faiss_index_path, "index.faiss")
-        docs_file = os.path.join(settings.faiss_index_path, "documents.pkl")
-        
-        faiss.write_index(self.index, index_file)
-        with open(docs_file, "wb") as f:
-            pickle.dump(self.documents, f)
-            
+        with open(self._wal_file, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._wal_ops += len(entries)
+        self._refresh_index_version()
+
+    def _replay_wal(self):
+        """Re-apply logged writes on top of the snapshot (no re-encoding needed)"""
+        if not os.path.exists(self._wal_file):
+            return
+        docs, vectors, replayed = [], [], 0
+        with open(self._wal_file, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                replayed += 1
+                if entry["op"] == "upsert":
+                    docs.append(entry["doc"])
+                    vectors.append(np.frombuffer(base64.b64decode(entry["vector"]), dtype='float32'))
+                    continue
+                # Apply pending upserts before a delete so ordering is preserved
+                if docs:
+                    self._apply_upserts(docs, np.vstack(vectors))
+                    docs, vectors = [], []
+                self._apply_delete(entry["ids"])
+        if docs:
+            self._apply_upserts(docs, np.vstack(vectors))
+        self._wal_ops = replayed
+        logger.info(f"Replayed {replayed} write-ahead log entries")
+
+    def _ensure_id_map(self):
+        """Build the document id -> row map (and content hashes) from the store"""
+        if self._id_to_row is not None:
+            return
+        self._id_to_row = {}
+        duplicates = []
+        for row, doc in enumerate(self.documents):
+            if row in self._dead:
+                continue
+            doc_id = doc.get("id")
+            if doc_id in self._id_to_row:
+                duplicates.append(self._id_to_row[doc_id])
+            self._id_to_row[doc_id] = row
+            self._hashes[doc_id] = doc.get("content_hash") or compute_content_hash(doc)
+            self._track_parent(doc)
+            if not self._sparse_persisted:
+                self.sparse.add(row, doc.get("text", ""))
+        if duplicates:
+            logger.info(f"Dropping {len(duplicates)} duplicate document rows")
+            self._remove_rows(duplicates)
+
+    @staticmethod
+    def parent_id(doc: Dict[str, Any]) -> Any:
+        """Id of the document a (chunk) document belongs to"""
+        return (doc.get("metadata") or {}).get("parent_id", doc.get("id"))
+
+    def _track_parent(self, doc: Dict[str, Any]):
+        doc_id, parent = doc.get("id"), self.parent_id(doc)
+        if parent != doc_id:
+            self._parent_of[doc_id] = parent
+            self._chunks.setdefault(parent, set()).add(doc_id)
+
+    def _untrack_parent(self, doc_id: Any):
+        parent = self._parent_of.pop(doc_id, None)
+        if parent is not None:
+            self._chunks[parent].discard(doc_id)
+            if not self._chunks[parent]:
+                del self._chunks[parent]
+
+    def _remove_rows(self, rows: List[int]):
+        try:
+            with self._index_lock.write():
+                self.index.remove_ids(np.array(rows, dtype='int64'))
+        except RuntimeError:
+            pass  # e.g. HNSW: filtered out at search time instead
+        self._dead.update(rows)
+        for row in rows:
+            self.sparse.remove(row)
+
+    def _apply_upserts(self, docs: List[Dict[str, Any]], vectors: np.ndarray):
+        self._ensure_id_map()
+        if not self.index.is_trained:
+            if self.index.ntotal == 0:
+                # Size IVF/PQ parameters to the corpus actually available for training
+                index = self._new_index(n_train=len(vectors))
+                set_search_params(index, nprobe=settings.faiss_nprobe, ef_search=settings.faiss_ef_search)
+                with self._swap_lock:
+                    self.index = index
+            with self._index_lock.write():
+                train_index(self.index, prepare_vectors(self.index, vectors))
+
+        start = len(self.documents)
+        rows = np.arange(start, start + len(docs), dtype='int64')
+        vectors = prepare_vectors(self.index, vectors)
+        # Searches run outside the write lock; faiss indexes must not change under them
+        with self._index_lock.write():
+            self.index.add_with_ids(vectors, rows)
+        self.documents.extend(docs)
+
+        replaced = []
+        for row, doc in zip(rows, docs):
+            doc_id = doc.get("id")
+            self.sparse.add(int(row), doc.get("text", ""))
+            if doc_id in self._id_to_row:
+                replaced.append(self._id_to_row[doc_id])
+            self._id_to_row[doc_id] = int(row)
+            self._hashes[doc_id] = doc["content_hash"]
+            self._untrack_parent(doc_id)
+            self._track_parent(doc)
+        if replaced:
+            self._remove_rows(replaced)
+
+    def _apply_delete(self, ids: Iterable[Any]):
+        self._ensure_id_map()
+        # A parent id also deletes all of its chunks
+        ids = list(dict.fromkeys(
+            doc_id for parent in ids for doc_id in [parent, *self._chunks.get(parent, ())]
+        ))
+        rows = [self._id_to_row.pop(doc_id) for doc_id in ids if doc_id in self._id_to_row]
+        for doc_id in ids:
+            self._hashes.pop(doc_id, None)
+            self._untrack_parent(doc_id)
+        if rows:
+            self._remove_rows(rows)
+        return len(rows)
+
+    def training_size(self) -> int:
+        """Vectors the next upsert should bring to train the index at full size (0 once trained)"""
+        with self._write_lock:
+            if self.index.is_trained:
+                return 0
+            return training_size(settings.faiss_index_type)
+
+    def document_ids(self) -> List[Any]:
+        """Ids of all live documents"""
+        with self._write_lock:
+            self._ensure_id_map()
+            return list(self._id_to_row)
+
+    def parent_ids(self) -> List[Any]:
+        """Ids of all live documents, with chunks reported as their parent"""
+        with self._write_lock:
+            self._ensure_id_map()
+            return list(dict.fromkeys(self._parent_of.get(doc_id, doc_id) for doc_id in self._id_to_row))
+
+    def chunk_ids(self, parent_id: Any) -> List[Any]:
+        """Ids of the live documents stored for a parent (its chunks, or itself)"""
+        with self._write_lock:
+            self._ensure_id_map()
+            ids = sorted(self._chunks.get(parent_id, ()), key=str)
+            if parent_id in self._id_to_row:
+                ids.append(parent_id)
+            return ids
+
+    def get_content_hash(self, doc_id: Any) -> Optional[str]:
+        """Content hash of the live document (or chunked parent) with this id, if indexed"""
+        with self._write_lock:
+            self._ensure_id_map()
+            if doc_id in self._hashes:
+                return self._hashes[doc_id]
+            # Chunks carry their parent's hash
+            chunks = self._chunks.get(doc_id)
+            return self._hashes.get(next(iter(chunks))) if chunks else None
+
+    def upsert_documents(self, docs: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None) -> int:
+        """
+        Insert or replace documents by id
+
+        Args:
+            docs: List of dicts with 'text' and 'id' keys
+            embeddings: Precomputed vectors (encoded here when omitted)
+
+        Returns:
+            Number of documents written
+        """
+        # The last occurrence of an id within one call wins
+        keep = sorted({doc.get("id"): i for i, doc in enumerate(docs)}.values())
+        docs = [docs[i] for i in keep]
+        if not docs:
+            return 0
+        if embeddings is not None:
+            embeddings = np.asarray(embeddings)[keep]
+        else:
+            embeddings = self.encoder.encode([doc['text'] for doc in docs])
+        embeddings = np.array(embeddings).astype('float32')
+
+        docs = [dict(doc, content_hash=doc.get("content_hash") or compute_content_hash(doc)) for doc in docs]
+
+        with self._write_lock:
+            self._apply_upserts(docs, embeddings)
+            self._append_wal([
+                {"op": "upsert", "doc": doc, "vector": base64.b64encode(vector.tobytes()).decode("ascii")}
+                for doc, vector in zip(docs, embeddings)
+            ])
+        self._maybe_compact()
+        return len(docs)
+
+    def delete_documents(self, ids: List[Any]) -> int:
+        """
+        Delete documents by id
+
+        Returns:
+            Number of documents that existed and were removed
+        """
+        with self._write_lock:
+            removed = self._apply_delete(ids)
+            if removed:
+                self._append_wal([{"op": "delete", "ids": list(ids)}])
+        self._maybe_compact()
+        return removed
+
     def add_documents(self, docs: List[Dict[str, Any]]):
         """
-        Add documents to vector DB
-        
+        Add documents to vector DB (documents with an existing id replace it)
+
         Args:
             docs: List of dicts with 'text' and 'id' keys
         """
-        texts = [doc['text'] for doc in docs]
-        if not texts:
+        count = self.upsert_documents(docs)
+        if count:
+            logger.info(f"Added {count} documents to vector DB")
+
+    @contextmanager
+    def bulk_load(self) -> Iterator[None]:
+        """
+        Defer automatic compaction for a run of many writes, then compact once
+        (if the log has grown past the threshold) when the last block exits
+
+        Usage:
+            with vector_db.bulk_load():
+                for batch in batches:
+                    vector_db.upsert_documents(batch)
+        """
+        with self._write_lock:
+            self._bulk_loads += 1
+        try:
+            yield
+        finally:
+            with self._write_lock:
+                self._bulk_loads -= 1
+                finished = not self._bulk_loads
+            if finished and self._wal_ops >= settings.wal_compaction_threshold:
+                self.wait_for_compaction()
+                self.compact()
+
+    def _maybe_compact(self):
+        """Start a background compaction once the log grows past the threshold"""
+        if self._bulk_loads or self._wal_ops < settings.wal_compaction_threshold:
             return
-            
-        embeddings = self.encoder.encode(texts)
-        self.index.add(np.array(embeddings).astype('float32'))
-        self.documents.extend(docs)
-        self.save_index()
-        logger.info(f"Added {len(docs)} documents to vector DB")
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, name="faiss-compaction", daemon=True)
+        self._compaction_thread.start()
+
+    def compact(self):
+        """
+        Fold the write-ahead log into a new snapshot
+
+        Live rows are renumbered densely; tombstoned rows and their vectors
+        are dropped. Readers keep using the previous (index, documents) pair
+        until the new one is swapped in.
+        """
+        with self._write_lock:
+            self._ensure_id_map()
+            live_rows = sorted(self._id_to_row.values())
+            old_to_new = np.full(len(self.documents), -1, dtype='int64')
+            old_to_new[live_rows] = np.arange(len(live_rows), dtype='int64')
+
+            index = faiss.clone_index(self.index)
+            remap_ids(index, old_to_new)
 
-    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+            snapshot = self._next_snapshot_name()
+            snapshot_dir = os.path.join(settings.faiss_index_path, snapshot)
+            os.makedirs(snapshot_dir, exist_ok=True)
+            faiss.write_index(index, os.path.join(snapshot_dir, "index.faiss"))
+            write_documents(os.path.join(snapshot_dir, "docstore"), (self.documents[r] for r in live_rows))
+            self.sparse.write(os.path.join(snapshot_dir, "bm25"), old_to_new)
+
+            # Publish the snapshot, then drop the log it supersedes
+            tmp_current = self._current_file + ".tmp"
+            with open(tmp_current, "w") as f:
+                f.write(snapshot)
+            os.replace(tmp_current, self._current_file)
+            if os.path.exists(self._wal_file):
+                os.remove(self._wal_file)
+
+            sparse = BM25Index(directory=os.path.join(snapshot_dir, "bm25"))
+            set_search_params(index, nprobe=settings.faiss_nprobe, ef_search=settings.faiss_ef_search)
+            with self._swap_lock:
+                self.index = index
+                self.documents = DocumentStore(os.path.join(snapshot_dir, "docstore"))
+                self.sparse = sparse
+            self._sparse_persisted = True
+            # The old store is not closed: searches that captured it before the
+            # swap may still read it, and its mappings outlive the deleted files
+
+            self._id_to_row = {doc_id: int(old_to_new[row]) for doc_id, row in self._id_to_row.items()}
+            self._dead = set()
+            self._snapshot = snapshot
+            self._wal_ops = 0
+            self._refresh_index_version()
+
+            self._remove_stale_snapshots(keep={snapshot})
+            logger.info(f"Compacted {len(live_rows)} documents into {snapshot}")
+
+    def wait_for_compaction(self):
+        """Block until a running background compaction has finished"""
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+
+    def _next_snapshot_name(self) -> str:
+        number = int(self._snapshot.split("-")[-1]) + 1 if self._snapshot else 1
+        return f"snapshot-{number:06d}"
+
+    def _remove_stale_snapshots(self, keep: Set[str]):
+        """Delete superseded snapshots and legacy files (open mappings stay valid)"""
+        root = settings.faiss_index_path
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.startswith("snapshot-") and name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+            elif name in ("index.faiss", "documents.pkl"):
+                os.remove(path)
+            elif name == "docstore":
+                shutil.rmtree(path, ignore_errors=True)
+
+    def rebuild_index(
+        self,
+        index_type: Optional[str] = None,
+        batch_size: int = 256,
+        storage: Optional[str] = None
+    ):
+        """
+        Re-encode all documents into a freshly trained index of the given type
+
+        Args:
+            index_type: One of index_factory.INDEX_TYPES (defaults to settings.faiss_index_type)
+            batch_size: Documents encoded per encode call
+            storage: One of index_factory.VECTOR_STORAGE (defaults to settings.faiss_vector_storage)
+        """
+        index_type = index_type or settings.faiss_index_type
+        with self._write_lock:
+            self._ensure_id_map()
+            live_rows = sorted(self._id_to_row.values())
+            if not live_rows:
+                self.index = self._row_addressed(create_index(index_type, settings.embedding_dim, storage=storage))
+                return
+
+            vectors = np.vstack([
+                np.array(self.encoder.encode(
+                    [self.documents[r]['text'] for r in live_rows[i:i + batch_size]]
+                )).astype('float32')
+                for i in range(0, len(live_rows), batch_size)
+            ])
+            index = self._row_addressed(
+                create_index(index_type, vectors.shape[1], n_train=len(vectors), storage=storage)
+            )
+            vectors = prepare_vectors(index, vectors)
+            train_index(index, vectors)
+            index.add_with_ids(vectors, np.array(live_rows, dtype='int64'))
+            set_search_params(index, nprobe=settings.faiss_nprobe, ef_search=settings.faiss_ef_search)
+            with self._swap_lock:
+                self.index = index
+            self.compact()
+        logger.info(f"Rebuilt {index_type} index over {len(live_rows)} documents")
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        collapse: Optional[bool] = None,
+        mode: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
         """
         Search for relevant documents
-        
+
         Args:
             query: User query string
             k: Number of results to return
-            
+            collapse: Return one hit per parent document (defaults to settings.collapse_chunks)
+            mode: 'dense', 'sparse' or 'hybrid' (defaults to settings.retrieval_mode)
+
         Returns:
             List of relevant documents with scores
         """
-        if self.index.ntotal == 0:
-            return []
-            
-        query_vector = self.encoder.encode([query])
-        distances, indices = self.index.search(np.array(query_vector).astype('float32'), k)
-        
+        return self.search_batch([query], k=k, collapse=collapse, mode=mode)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 3,
+        collapse: Optional[bool] = None,
+        mode: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with one encode call and one index search
+
+        Args:
+            queries: User query strings
+            k: Number of results to return per query
+            collapse: Return one hit per parent document (defaults to
+                settings.collapse_chunks). A collapsed hit is the parent's
+                best-scoring chunk, with 'id' set to the parent id and the
+                chunk's own id under 'chunk_id'.
+            mode: 'dense', 'sparse' or 'hybrid' (defaults to
+                settings.retrieval_mode). Hybrid merges BM25 and vector
+                candidates by reciprocal rank fusion, and skips the encoder
+                for queries whose top BM25 hit is confident.
+
+        Returns:
+            One result list per query, in input order. Hits from the vector
+            search carry 'score' (squared L2 distance, lower is closer), BM25
+            hits carry 'bm25_score' and fused hits 'rrf_score'. Hits of a
+            query answered by a confident BM25 match alone are flagged
+            'shortcircuit'.
+        """
+        collapse = settings.collapse_chunks if collapse is None else collapse
+        mode = mode or settings.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode} (expected one of {', '.join(RETRIEVAL_MODES)})")
+        self._ensure_loaded()
+        if mode != "dense" and not self._sparse_persisted and self._id_to_row is None:
+            # Without persisted postings the sparse index is built along with the id map
+            with self._write_lock:
+                self._ensure_id_map()
+
+        with self._swap_lock:
+            index, documents, dead, sparse = self.index, self.documents, self._dead, self.sparse
+
+        if index.ntotal == 0 or not queries:
+            return [[] for _ in queries]
+
+        # Over-fetch when tombstoned vectors or sibling chunks may take result slots
+        fetch_k = (k * settings.chunk_overfetch if collapse else k) + min(len(dead), k)
+        if mode == "dense":
+            return self._dense_search(queries, k, fetch_k, index, documents, dead, collapse)
+
+        sparse_hits = [sparse.search(query, fetch_k) for query in queries]
+        if mode == "sparse":
+            return [
+                self._collect_hits(((row, {"bm25_score": s}) for row, s in hits), documents, dead, k, collapse)
+                for hits in sparse_hits
+            ]
+
+        batch_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        dense_rows = []
+        for i, (query, hits) in enumerate(zip(queries, sparse_hits)):
+            if settings.sparse_shortcircuit and sparse.is_confident(query, hits, settings.sparse_confidence_margin):
+                # A confident lexical match needs no query embedding
+                batch_results[i] = self._collect_hits(
+                    ((row, {"bm25_score": s, "shortcircuit": True}) for row, s in hits), documents, dead, k, collapse
+                )
+            else:
+                dense_rows.append(i)
+
+        if dense_rows:
+            query_vectors = prepare_vectors(index, self.embed_queries([queries[i] for i in dense_rows]))
+            for i, dense in zip(dense_rows, self._dense_candidates(index, query_vectors, fetch_k)):
+                fields: Dict[int, Dict[str, float]] = {}
+                for row, distance in dense:
+                    fields.setdefault(row, {})["score"] = distance
+                for row, bm25_score in sparse_hits[i]:
+                    fields.setdefault(row, {})["bm25_score"] = bm25_score
+                fused = reciprocal_rank_fusion(
+                    [[row for row, _ in dense], [row for row, _ in sparse_hits[i]]], k=settings.rrf_k
+                )
+                batch_results[i] = self._collect_hits(
+                    ((row, dict(fields[row], rrf_score=s)) for row, s in fused), documents, dead, k, collapse
+                )
+
+        return batch_results
+
+    def _dense_candidates(self, index: faiss.Index, query_vectors: np.ndarray, fetch_k: int) -> List[List[Tuple[int, float]]]:
+        """(row, L2 distance) candidates per query vector, best first"""
+        with self._index_lock.read():
+            scores, indices = index.search(query_vectors, fetch_k)
+        distances = to_l2_distances(index, scores)
+        return [
+            [(int(idx), float(distance)) for idx, distance in zip(row_indices, row_distances) if idx != -1]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+
+    def _dense_search(
+        self,
+        queries: List[str],
+        k: int,
+        fetch_k: int,
+        index: faiss.Index,
+        documents: DocumentStore,
+        dead: Set[int],
+        collapse: bool
+    ) -> List[List[Dict[str, Any]]]:
+        query_vectors = prepare_vectors(index, self.embed_queries(queries))
+
+        batch_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        pending = list(range(len(queries)))
+        while pending:
+            short = []
+            for i, hits in zip(pending, self._dense_candidates(index, query_vectors[pending], fetch_k)):
+                batch_results[i] = self._collect_hits(
+                    ((row, {"score": distance}) for row, distance in hits), documents, dead, k, collapse
+                )
+                # Every candidate was a real hit but they were used up by
+                # tombstones or sibling chunks: widen the search for this query
+                if len(batch_results[i]) < k and len(hits) == fetch_k and fetch_k < index.ntotal:
+                    short.append(i)
+            pending = short
+            fetch_k *= 2
+
+        return batch_results
+
+    def _collect_hits(
+        self,
+        candidates: Iterable[Tuple[int, Dict[str, float]]],
+        documents: DocumentStore,
+        dead: Set[int],
+        k: int,
+        collapse: bool
+    ) -> List[Dict[str, Any]]:
+        """Materialize up to k live hits for one query, one per parent when collapsing"""
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx != -1 and idx < len(self.documents):
-                doc = self.documents[idx].copy()
-                doc['score'] = float(distances[0][i])
-                results.append(doc)
-                
+        parents = set()
+        for idx, fields in candidates:
+            if idx >= len(documents) or idx in dead:
+                continue
+            # Only the hit rows are materialized from the store
+            doc = documents[idx]
+            doc.update(fields)
+            if collapse:
+                parent = self.parent_id(doc)
+                # Hits arrive best-first, so the first chunk seen per parent wins
+                if parent in parents:
+                    continue
+                parents.add(parent)
+                if parent != doc.get("id"):
+                    doc['chunk_id'] = doc['id']
+                    doc['id'] = parent
+            results.append(doc)
+            if len(results) == k:
+                break
         return results
 
 # Global VectorDB instance
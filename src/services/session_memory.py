@@ -0,0 +1,185 @@
+"""
+Session Memory
+Bounded recent history plus a rolling summary of the older turns
+"""
+import asyncio
+from datetime import datetime
+from typing import Callable, List, Optional, Set, Tuple
+from uuid import UUID
+from sqlalchemy.orm import Session
+from src.config import settings
+from src.database import SessionLocal, run_db
+from src.models.models import Message, Session as SessionModel
+from src.prompts.prompts import SUMMARY_PROMPT_TEMPLATE
+from src.services.llm_client import llm_client
+import logging
+
+logger = logging.getLogger(__name__)
+
+NO_SUMMARY = "No previous summary."
+
+
+def recent_messages(
+    db: Session,
+    session_id: UUID,
+    exclude_id: Optional[UUID] = None,
+    limit: Optional[int] = None,
+    token_budget: Optional[int] = None
+) -> Tuple[List[Message], bool]:
+    """
+    Newest messages of a session, oldest first
+
+    Only the newest `limit` rows (plus one, to detect older ones) are read
+    via the (session_id, timestamp) index, then trimmed from the oldest end
+    to fit `token_budget` using the stored per-message token counts. The
+    newest message is always kept.
+
+    Args:
+        exclude_id: Message to leave out (the user message just saved)
+        limit: Max messages (defaults to settings.session_memory_window)
+        token_budget: Max total tokens, 0 for no cap
+            (defaults to settings.session_history_token_budget)
+
+    Returns:
+        (messages, truncated) where truncated is True when older messages
+        of the session were left out
+    """
+    limit = settings.session_memory_window if limit is None else limit
+    token_budget = settings.session_history_token_budget if token_budget is None else token_budget
+
+    query = db.query(Message).filter(Message.session_id == session_id)
+    if exclude_id is not None:
+        query = query.filter(Message.id != exclude_id)
+    newest = query.order_by(Message.timestamp.desc()).limit(max(limit, 0) + 1).all()
+
+    kept = []
+    used = 0
+    for m in newest[:max(limit, 0)]:
+        tokens = m.tokens if m.tokens is not None else len(m.content) // 4
+        if token_budget and kept and used + tokens > token_budget:
+            break
+        used += tokens
+        kept.append(m)
+
+    kept.reverse()
+    return kept, len(kept) < len(newest)
+
+
+def session_summary(session: SessionModel) -> str:
+    """Running summary stored on the session, or the prompt placeholder"""
+    return (session.session_metadata or {}).get("summary") or NO_SUMMARY
+
+
+class SessionSummarizer:
+    """
+    Folds messages that fell out of the history window into a running
+    summary kept in Session.session_metadata ("summary", plus
+    "summary_until": timestamp of the last message folded in).
+
+    Runs as background tasks after a reply has been sent, so the request
+    path only ever reads the stored summary. At most one fold per session
+    is in flight; a skipped schedule is caught up by the next one since
+    every fold picks up all pending messages.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._in_flight: Set[UUID] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"folds": 0, "messages": 0, "errors": 0}
+
+    def schedule(self, session_id: UUID):
+        """Start a background fold for a session (no-op if one is running)"""
+        if not settings.summary_enabled or session_id in self._in_flight:
+            return
+        self._in_flight.add(session_id)
+        task = asyncio.get_running_loop().create_task(self._run(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait_idle(self):
+        """Wait for the scheduled folds to finish"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def _run(self, session_id: UUID):
+        try:
+            await self.summarize(session_id)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Summarizing session {session_id} failed: {e}")
+        finally:
+            self._in_flight.discard(session_id)
+
+    async def summarize(self, session_id: UUID) -> bool:
+        """
+        Fold the pending messages of a session into its summary
+
+        Returns:
+            True when the summary was updated
+        """
+        pending = await run_db(self._pending, session_id)
+        if pending is None:
+            return False
+        previous, conversation, until, count = pending
+
+        prompt = SUMMARY_PROMPT_TEMPLATE.format(
+            previous_summary=previous or NO_SUMMARY,
+            conversation=conversation,
+            max_words=settings.summary_max_words
+        )
+        summary = (await llm_client.generate_response(prompt, with_system_prompt=False)).strip()
+        if not summary:
+            return False
+
+        await run_db(self._store, session_id, summary, until)
+        self.stats["folds"] += 1
+        self.stats["messages"] += count
+        return True
+
+    def _pending(self, session_id: UUID) -> Optional[Tuple[Optional[str], str, datetime, int]]:
+        """Messages older than the history window and not yet summarized"""
+        db = self.session_factory()
+        try:
+            session = db.get(SessionModel, session_id)
+            if session is None:
+                return None
+            recent, truncated = recent_messages(db, session_id)
+            if not truncated or not recent:
+                return None
+
+            metadata = session.session_metadata or {}
+            query = db.query(Message).filter(
+                Message.session_id == session_id,
+                Message.timestamp < recent[0].timestamp
+            )
+            if metadata.get("summary_until"):
+                query = query.filter(Message.timestamp > datetime.fromisoformat(metadata["summary_until"]))
+            # Capped so one fold never sends an unbounded transcript; the rest follows next turn
+            messages = query.order_by(Message.timestamp.asc()).limit(settings.summary_max_messages).all()
+            if len(messages) < settings.summary_min_messages:
+                return None
+
+            conversation = "\n".join(f"{m.role.capitalize()}: {m.content}" for m in messages)
+            return metadata.get("summary"), conversation, messages[-1].timestamp, len(messages)
+        finally:
+            db.close()
+
+    def _store(self, session_id: UUID, summary: str, until: datetime):
+        db = self.session_factory()
+        try:
+            session = db.get(SessionModel, session_id)
+            if session is None:
+                return
+            # Reassign so SQLAlchemy sees the JSON column change
+            metadata = dict(session.session_metadata or {})
+            metadata["summary"] = summary
+            metadata["summary_until"] = until.isoformat()
+            session.session_metadata = metadata
+            db.commit()
+        finally:
+            db.close()
+
+
+# Global summarizer instance
+summarizer = SessionSummarizer()
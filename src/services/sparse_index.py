@@ -0,0 +1,294 @@
+"""
+Sparse Lexical Index
+Inverted index with BM25 scoring (memory-mapped postings plus an in-memory
+delta), and reciprocal rank fusion
+"""
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+# Words, numbers and compound identifiers such as error codes ("err-4012")
+# or key prefixes ("sk_live"); compounds are also indexed by their parts.
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+PART_RE = re.compile(r"[a-z0-9]+")
+
+
+# Persisted postings, CSR by term: sorted term hashes, offsets into the
+# rows/tfs arrays (rows ascending within a term), and the length of each
+# row in terms (-1 for rows that are not indexed)
+POSTINGS_FILES = ("terms", "offsets", "rows", "tfs", "lengths")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text"""
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        parts = PART_RE.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def term_hash(term: str) -> int:
+    """Stable signed 64-bit key of a term in the persisted postings"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class PersistedPostings:
+    """Read-only postings written by BM25Index.write, memory-mapped on load"""
+
+    def __init__(self, directory: str):
+        for name in POSTINGS_FILES:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return all(os.path.exists(os.path.join(directory, f"{name}.npy")) for name in POSTINGS_FILES)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, term frequencies) of a term"""
+        key = term_hash(term)
+        i = int(np.searchsorted(self.terms, key))
+        if i == len(self.terms) or self.terms[i] != key:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.rows[start:end], self.tfs[start:end]
+
+
+class BM25Index:
+    """
+    Inverted index over document-store rows scored with Okapi BM25
+
+    Rows are the same positions used as FAISS vector ids, so sparse and
+    dense hits refer to the same documents.
+
+    Opened on a directory, the postings written there (see write()) are
+    memory-mapped, so a large index costs no heap and is shared by forked
+    workers like the docstore. Rows added later live in an in-memory delta;
+    removed persisted rows are masked until the next write.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, directory: Optional[str] = None):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # term -> row -> tf
+        self._terms: Dict[int, Tuple[str, ...]] = {}  # row -> distinct terms
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._base: Optional[PersistedPostings] = None
+        self._base_count = 0
+        self._base_removed: Set[int] = set()
+        self._removed_array: Optional[np.ndarray] = None
+        if directory is not None:
+            self._base = PersistedPostings(directory)
+            indexed = np.asarray(self._base.lengths) >= 0
+            self._base_count = int(indexed.sum())
+            self._total_length = int(np.asarray(self._base.lengths)[indexed].sum())
+        self._lock = threading.Lock()
+
+    @property
+    def persisted(self) -> bool:
+        """Whether the index was opened on persisted postings"""
+        return self._base is not None
+
+    def __len__(self) -> int:
+        return len(self._lengths) + self._base_count
+
+    def _in_base(self, row: int) -> bool:
+        base = self._base
+        return (
+            base is not None and 0 <= row < len(base.lengths)
+            and base.lengths[row] >= 0 and row not in self._base_removed
+        )
+
+    def _remove_base(self, row: int):
+        self._base_removed.add(row)
+        self._removed_array = None
+        self._base_count -= 1
+        self._total_length -= int(self._base.lengths[row])
+
+    def _base_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        rows, tfs = self._base.postings(term)
+        if self._base_removed and len(rows):
+            if self._removed_array is None:
+                self._removed_array = np.fromiter(self._base_removed, dtype=np.int64)
+            keep = ~np.isin(rows, self._removed_array)
+            rows, tfs = rows[keep], tfs[keep]
+        return rows, tfs
+
+    def add(self, row: int, text: str):
+        counts = Counter(tokenize(text))
+        with self._lock:
+            if row in self._lengths:
+                self._remove(row)
+            elif self._in_base(row):
+                self._remove_base(row)
+            for term, tf in counts.items():
+                self._postings[term][row] = tf
+            self._terms[row] = tuple(counts)
+            self._lengths[row] = sum(counts.values())
+            self._total_length += self._lengths[row]
+
+    def remove(self, row: int):
+        with self._lock:
+            if row in self._lengths:
+                self._remove(row)
+            elif self._in_base(row):
+                self._remove_base(row)
+
+    def _remove(self, row: int):
+        for term in self._terms.pop(row, ()):
+            postings = self._postings[term]
+            postings.pop(row, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(row, 0)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Rank rows for a query
+
+        Returns:
+            Up to k (row, BM25 score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self)
+            if not terms or n == 0:
+                return []
+            avg_length = max(self._total_length / n, 1e-9)
+            scores: Dict[int, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term) or {}
+                if self._base is not None:
+                    base_rows, base_tfs = self._base_postings(term)
+                else:
+                    base_rows = base_tfs = ()
+                df = len(postings) + len(base_rows)
+                if not df:
+                    continue
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                for row, tf in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._lengths[row] / avg_length)
+                    scores[row] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+                if len(base_rows):
+                    tfs = base_tfs.astype(np.float64)
+                    norm = self.k1 * (1.0 - self.b + self.b * self._base.lengths[base_rows] / avg_length)
+                    contributions = idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+                    for row, score in zip(base_rows.tolist(), contributions.tolist()):
+                        scores[row] += score
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def coverage(self, row: int, query: str) -> float:
+        """Fraction of the distinct query terms that occur in a row"""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        if row in self._terms:
+            return len(terms.intersection(self._terms[row])) / len(terms)
+        if not self._in_base(row):
+            return 0.0
+        found = 0
+        for term in terms:
+            rows, _ = self._base.postings(term)
+            i = int(np.searchsorted(rows, row))
+            found += i < len(rows) and rows[i] == row
+        return found / len(terms)
+
+    def is_confident(self, query: str, hits: Sequence[Tuple[int, float]], margin: float) -> bool:
+        """
+        Whether the top lexical hit can be trusted without dense retrieval:
+        it contains every query term and outscores the runner-up by `margin`
+        """
+        if not hits or self.coverage(hits[0][0], query) < 1.0:
+            return False
+        return len(hits) == 1 or hits[0][1] >= margin * hits[1][1]
+
+    def write(self, directory: str, old_to_new: Optional[Sequence[int]] = None):
+        """
+        Persist the whole index (persisted part and delta) for opening with
+        BM25Index(directory=...)
+
+        Args:
+            old_to_new: Row renumbering; rows mapped to -1 are dropped
+        """
+        hashes: List[np.ndarray] = []
+        rows: List[np.ndarray] = []
+        tfs: List[np.ndarray] = []
+        row_lengths: Dict[int, int] = {}
+        with self._lock:
+            base = self._base
+            if base is not None:
+                base_hashes = np.repeat(np.asarray(base.terms), np.diff(np.asarray(base.offsets)))
+                base_rows = np.asarray(base.rows)
+                keep = ~np.isin(base_rows, np.fromiter(self._base_removed, dtype=np.int64))
+                hashes.append(base_hashes[keep])
+                rows.append(base_rows[keep])
+                tfs.append(np.asarray(base.tfs)[keep])
+                lengths = np.asarray(base.lengths)
+                for row in np.flatnonzero(lengths >= 0).tolist():
+                    if row not in self._base_removed:
+                        row_lengths[row] = int(lengths[row])
+            for term, postings in self._postings.items():
+                hashes.append(np.full(len(postings), term_hash(term), dtype=np.int64))
+                rows.append(np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)))
+                tfs.append(np.fromiter(postings.values(), dtype=np.int32, count=len(postings)))
+            row_lengths.update(self._lengths)
+
+        hash_array = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.int64)
+        row_array = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        tf_array = np.concatenate(tfs).astype(np.int32) if tfs else np.empty(0, dtype=np.int32)
+        length_rows = np.fromiter(row_lengths.keys(), dtype=np.int64, count=len(row_lengths))
+        length_values = np.fromiter(row_lengths.values(), dtype=np.int32, count=len(row_lengths))
+        if old_to_new is not None:
+            old_to_new = np.asarray(old_to_new, dtype=np.int64)
+            row_array = old_to_new[row_array]
+            length_rows = old_to_new[length_rows]
+            keep = row_array >= 0
+            hash_array, row_array, tf_array = hash_array[keep], row_array[keep], tf_array[keep]
+            keep = length_rows >= 0
+            length_rows, length_values = length_rows[keep], length_values[keep]
+
+        order = np.lexsort((row_array, hash_array))
+        hash_array, row_array, tf_array = hash_array[order], row_array[order], tf_array[order]
+        terms, starts = np.unique(hash_array, return_index=True)
+        lengths = np.full(int(length_rows.max()) + 1 if len(length_rows) else 0, -1, dtype=np.int32)
+        lengths[length_rows] = length_values
+
+        arrays = {
+            "terms": terms.astype(np.int64),
+            "offsets": np.append(starts, len(hash_array)).astype(np.int64),
+            "rows": row_array.astype(np.int64),
+            "tfs": tf_array,
+            "lengths": lengths,
+        }
+        os.makedirs(directory, exist_ok=True)
+        for name, array in arrays.items():
+            tmp = os.path.join(directory, f"{name}.tmp.npy")
+            np.save(tmp, array)
+            os.replace(tmp, os.path.join(directory, f"{name}.npy"))
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = 60, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    Merge ranked lists of rows by reciprocal rank fusion
+
+    Each row scores sum(1 / (k + rank)) over the lists it appears in
+    (rank starting at 1).
+
+    Returns:
+        (row, fused score) pairs, best first
+    """
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] += 1.0 / (k + rank)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:limit] if limit is not None else fused
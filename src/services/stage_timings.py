@@ -0,0 +1,113 @@
+"""
+Stage Timings
+Wall-clock time each chat request spends in the pipeline stages, for
+benchmarks and the optional Server-Timing response header
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Pipeline stages in request order:
+# db      - session validation, user message insert, history load
+# embed   - query encoding (batched retrieval and the response cache key)
+# search  - index search and batching wait, excluding embed
+# rerank  - cross-encoder re-ranking
+# cache   - semantic response cache lookup
+# prompt  - prompt assembly
+# llm     - generation (the whole stream when streaming; streams also
+#           report time to the first chunk as llm_first_token)
+# persist - assistant message insert
+STAGES = ("db", "embed", "search", "rerank", "cache", "prompt", "llm", "persist")
+
+_request: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+# Executor threads (no context propagation) accumulate here and hand the totals back
+_thread = threading.local()
+
+
+def begin_request() -> Dict[str, float]:
+    """Start collecting stage timings for the current request (task context)"""
+    timings: Dict[str, float] = {}
+    _request.set(timings)
+    return timings
+
+
+def record_stage(name: str, seconds: float):
+    """Add time to a stage of the current request (no-op outside a request)"""
+    timings = _request.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as part of a stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_thread_stage(name: str, seconds: float):
+    """Add time to a stage from a worker thread; collect with take_thread_stages()"""
+    totals = getattr(_thread, "totals", None)
+    if totals is None:
+        totals = _thread.totals = {}
+    totals[name] = totals.get(name, 0.0) + seconds
+
+
+def take_thread_stages() -> Dict[str, float]:
+    """Stage time recorded on this thread since the last call"""
+    totals = getattr(_thread, "totals", None) or {}
+    _thread.totals = {}
+    return totals
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Server-Timing header value (durations in milliseconds)"""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def percentiles(values: List[float], points=(50, 95, 99)) -> Dict[str, float]:
+    """{'p50': ..., 'p95': ..., 'p99': ..., 'mean': ...} in milliseconds"""
+    if not values:
+        return {}
+    ms = np.asarray(values) * 1000
+    report = {f"p{p}": float(np.percentile(ms, p)) for p in points}
+    report["mean"] = float(ms.mean())
+    return report
+
+
+class StageLog:
+    """Stage timings of recently completed requests"""
+
+    def __init__(self, window: int = 10000):
+        self._samples = deque(maxlen=window)
+
+    def record(self, timings: Dict[str, float]):
+        self._samples.append(dict(timings))
+
+    def clear(self):
+        self._samples.clear()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage percentiles over the requests that went through each stage"""
+        samples = list(self._samples)
+        report = {}
+        for name in STAGES + tuple(sorted({n for s in samples for n in s} - set(STAGES))):
+            values = [s[name] for s in samples if name in s]
+            if values:
+                report[name] = {"count": len(values), **percentiles(values)}
+        return report
+
+
+# Global log of completed chat requests
+stage_log = StageLog()
@@ -0,0 +1,103 @@
+"""
+Startup Warm-up
+Loads models and touches indexes before a worker takes traffic
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.config import settings
+from src.services.llm_client import llm_client
+from src.services.reranker import reranker
+from src.services.retriever import vector_db
+import logging
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERY = "How do I reset my password?"
+
+
+class Readiness:
+    """Outcome of the warm-up steps, reported by the /ready endpoint"""
+
+    def __init__(self):
+        self.ready = False
+        self.finished = False
+        self.started_at = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, name: str, seconds: float, error: Optional[str] = None):
+        self.steps[name] = {"status": "error" if error else "ok", "seconds": round(seconds, 3)}
+        if error:
+            self.steps[name]["error"] = error
+
+    def report(self) -> Dict[str, Any]:
+        if self.ready:
+            status = "ready"
+        else:
+            status = "failed" if self.finished else "warming_up"
+        return {"status": status, "steps": self.steps}
+
+
+def _warm_encoder():
+    # Loads (downloading if needed) the model and runs a first inference
+    vector_db.encoder.encode([WARMUP_QUERY])
+
+
+def _warm_index():
+    # Maps the docstore and BM25 postings (or builds them) and runs a search
+    vector_db.search(WARMUP_QUERY, k=1)
+
+
+def _warm_reranker():
+    reranker.score(WARMUP_QUERY, [{"text": WARMUP_QUERY}, {"text": "warm up"}])
+
+
+def _warm_llm_client():
+    # Configures the Gemini client and the system prompt model (creating the
+    # cached content in 'cached' mode); no generation request is sent
+    _ = llm_client.model
+    _ = llm_client.generation_config
+    llm_client.prepare_system_model()
+
+
+def warmup_steps() -> List[Tuple[str, Callable[[], None]]]:
+    steps = [("encoder", _warm_encoder), ("index", _warm_index)]
+    if settings.rerank_enabled:
+        steps.append(("reranker", _warm_reranker))
+    steps.append(("llm_client", _warm_llm_client))
+    return steps
+
+
+def warm_up_sync(state: Optional[Readiness] = None) -> bool:
+    """
+    Run every warm-up step, recording timings and failures
+
+    Returns:
+        True when all steps succeeded (the worker is marked ready)
+    """
+    state = state or readiness
+    state.started_at = time.time()
+    ok = True
+    for name, step in warmup_steps():
+        start = time.perf_counter()
+        try:
+            step()
+            state.record(name, time.perf_counter() - start)
+        except Exception as e:
+            ok = False
+            logger.error(f"Warm-up step '{name}' failed: {e}")
+            state.record(name, time.perf_counter() - start, error=str(e))
+    state.ready = ok
+    state.finished = True
+    logger.info(f"Warm-up finished: {state.report()}")
+    return ok
+
+
+async def warm_up() -> bool:
+    """Run the warm-up off the event loop so /health keeps answering"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, warm_up_sync)
+
+
+# Global readiness state
+readiness = Readiness()
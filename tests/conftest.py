@@ -1,6 +1,8 @@
 """
 Global pytest configuration and fixtures
 """
+import asyncio
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -10,6 +12,8 @@ from typing import Generator
 from src.main import app
 from src.database import get_db_dependency
 from src.models.models import Base
+from src.config import settings
+from src.services.response_cache import response_cache
 
 # Use a single test database for all tests
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test_suite.db"
@@ -61,3 +65,38 @@ def client(db_session):
     app.dependency_overrides[get_db_dependency] = override_get_db
     yield TestClient(app)
     app.dependency_overrides = {}
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Keep cached LLM answers from leaking between tests"""
+    yield
+    asyncio.run(response_cache.clear())
+
+
+class HashEncoder:
+    """Deterministic bag-of-characters stand-in for SentenceTransformer"""
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), settings.embedding_dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for ch in text.lower():
+                vectors[row, ord(ch) % settings.embedding_dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+@pytest.fixture
+def make_vector_db(tmp_path, monkeypatch):
+    """Factory for VectorDB instances persisted under a temporary directory"""
+    from src.services.retriever import VectorDB
+
+    monkeypatch.setattr(settings, "faiss_index_path", str(tmp_path))
+
+    def factory():
+        db = VectorDB()
+        db._encoder = HashEncoder()
+        db._encoder_name = settings.embedding_model
+        db._encoder_backend = settings.encoder_backend
+        return db
+
+    return factory
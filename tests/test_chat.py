@@ -2,6 +2,8 @@
 Integration tests for chat endpoint
 (Mocks external LLM and Vector DB services)
 """
+import json
+import numpy as np
 import pytest
 from unittest.mock import AsyncMock, patch
 from uuid import uuid4
@@ -32,7 +34,8 @@ async def test_chat_happy_path(client):
         mock_llm.return_value = mock_response_json
         
         with patch.object(llm_client, "count_tokens", return_value=10):
-            with patch.object(vector_db, "search", return_value=[{"text": "Reset password info...", "id": "faq_reset"}]):
+            with patch.object(vector_db, "search_batch", return_value=[[{"text": "Reset password info...", "id": "faq_reset"}]]), \
+                 patch.object(vector_db, "embed_queries", return_value=np.ones((1, 4), dtype="float32")):
                 
                 # 3. Send message
                 payload = {
@@ -84,3 +87,168 @@ async def test_chat_llm_failure_handling(client):
             data = response.json()
             assert data["answer_text"] == "This is not JSON."
             assert data["confidence"] == 0.5  # Fallback confidence
+
+@pytest.mark.asyncio
+async def test_chat_streaming(client):
+    """Test SSE streaming of answer_text while the JSON is still arriving"""
+    create_res = client.post("/session", json={})
+    session_id = create_res.json()["session_id"]
+
+    chunks = [
+        '{"answer_text": "Open the ',
+        'billing page\\nand click ',
+        '\\"Update\\".", "confidence": 0.8, ',
+        '"sources": ["faq_billing"], "next_action": "reply", "action_payload": {}}'
+    ]
+
+    async def fake_stream(prompt, **kwargs):
+        for chunk in chunks:
+            yield chunk
+
+    with patch.object(llm_client, "generate_response_stream", side_effect=fake_stream):
+        payload = {"session_id": session_id, "message": "Billing question", "stream": True}
+        response = client.post("/chat", json=payload)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == 'Open the billing page\nand click "Update".'
+
+    name, done = events[-1]
+    assert name == "done"
+    assert done["confidence"] == 0.8
+    assert done["sources"] == ["faq_billing"]
+
+    # Assistant message is persisted once the stream finishes
+    msgs = client.get(f"/session/{session_id}/history").json()["messages"]
+    assert [m["role"] for m in msgs] == ["user", "assistant"]
+    assert msgs[1]["content"] == 'Open the billing page\nand click "Update".'
+    assert msgs[1]["id"] == done["message_id"]
+
+
+@pytest.mark.asyncio
+async def test_chat_semantic_cache_reuses_answer(client):
+    """A paraphrase retrieving the same documents is answered from the response cache"""
+    create_res = client.post("/session", json={})
+    session_id = create_res.json()["session_id"]
+
+    mock_response_json = '{"answer_text": "Refunds take 5-10 days.", "confidence": 0.9, "sources": ["faq_refund"], "next_action": "reply", "action_payload": {}}'
+    docs = [[{"text": "Refund policy...", "id": "faq_refund", "score": 0.8}]]  # dense hit
+    vectors = {
+        "What is your refund policy?": np.array([[1.0, 0.0, 0.0]], dtype="float32"),
+        "Tell me your refund policy": np.array([[0.99, 0.05, 0.0]], dtype="float32"),
+        "Unrelated question": np.array([[0.0, 1.0, 0.0]], dtype="float32"),
+    }
+
+    with patch.object(llm_client, "generate_response", new_callable=AsyncMock) as mock_llm, \
+         patch.object(vector_db, "search_batch", return_value=docs), \
+         patch.object(vector_db, "embed_queries", side_effect=lambda qs: vectors[qs[0]]):
+        mock_llm.return_value = mock_response_json
+
+        first = client.post("/chat", json={"session_id": session_id, "message": "What is your refund policy?"})
+        second = client.post("/chat", json={"session_id": session_id, "message": "Tell me your refund policy"})
+        assert mock_llm.await_count == 1
+
+        client.post("/chat", json={"session_id": session_id, "message": "Unrelated question"})
+        assert mock_llm.await_count == 2
+
+    assert second.status_code == 200
+    assert second.json()["answer_text"] == first.json()["answer_text"]
+    assert second.json()["message_id"] != first.json()["message_id"]
+
+    msgs = client.get(f"/session/{session_id}/history").json()["messages"]
+    assert len(msgs) == 6
+
+
+
+@pytest.mark.asyncio
+async def test_chat_semantic_cache_not_shared_across_conversations(client):
+    """A reply generated with one session's history is never served to another session"""
+    sessions = [client.post("/session", json={}).json()["session_id"] for _ in range(2)]
+    reply = '{"answer_text": "Your refund for order 991 is on its way.", "confidence": 0.9, "sources": ["faq_refund"], "next_action": "reply", "action_payload": {}}'
+    docs = [[{"text": "Refund policy...", "id": "faq_refund", "score": 0.8}]]
+    vectors = {
+        "My order number is 991": np.array([[0.0, 1.0, 0.0]], dtype="float32"),
+        "I bought a lamp last week": np.array([[0.0, 0.0, 1.0]], dtype="float32"),
+        "What is your refund policy?": np.array([[1.0, 0.0, 0.0]], dtype="float32"),
+        "Tell me your refund policy": np.array([[0.99, 0.05, 0.0]], dtype="float32"),
+    }
+
+    with patch.object(llm_client, "generate_response", new_callable=AsyncMock, return_value=reply) as mock_llm, \
+         patch.object(vector_db, "search_batch", return_value=docs), \
+         patch.object(vector_db, "embed_queries", side_effect=lambda qs: vectors[qs[0]]):
+        client.post("/chat", json={"session_id": sessions[0], "message": "My order number is 991"})
+        client.post("/chat", json={"session_id": sessions[0], "message": "What is your refund policy?"})
+        client.post("/chat", json={"session_id": sessions[1], "message": "I bought a lamp last week"})
+        client.post("/chat", json={"session_id": sessions[1], "message": "Tell me your refund policy"})
+
+    assert mock_llm.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_chat_skips_cache_embedding_after_lexical_shortcircuit(client):
+    """BM25-only hits skipped the encoder; the response cache must not run it either"""
+    session_id = client.post("/session", json={}).json()["session_id"]
+    reply = '{"answer_text": "Declined.", "confidence": 0.9, "sources": ["card"], "next_action": "reply", "action_payload": {}}'
+    docs = [[{"text": "Error ERR-4012 means the card was declined", "id": "card", "bm25_score": 7.5}]]
+
+    with patch.object(llm_client, "generate_response", new_callable=AsyncMock, return_value=reply) as mock_llm, \
+         patch.object(vector_db, "search_batch", return_value=docs), \
+         patch.object(vector_db, "embed_queries", side_effect=AssertionError("encoder called")):
+        response = client.post("/chat", json={"session_id": session_id, "message": "ERR-4012"})
+
+    assert response.status_code == 200
+    assert response.json()["answer_text"] == "Declined."
+    assert mock_llm.await_count == 1
+
+@pytest.mark.asyncio
+async def test_chat_deadline_returns_degraded_faq_answer(client):
+    """A generation that misses its deadline is answered from the top FAQ"""
+    from src.services.llm_scheduler import LLMDeadlineExceeded
+
+    session_id = client.post("/session", json={}).json()["session_id"]
+    docs = [[{"text": "Question: Reset?\nAnswer: Use the reset link.", "id": "faq_reset",
+              "metadata": {"answer": "Use the reset link."}}]]
+
+    with patch.object(llm_client, "generate_response", new_callable=AsyncMock) as mock_llm, \
+         patch.object(vector_db, "search_batch", return_value=docs), \
+         patch.object(vector_db, "embed_queries", return_value=np.ones((1, 4), dtype="float32")):
+        mock_llm.side_effect = LLMDeadlineExceeded("too slow")
+        response = client.post("/chat", json={"session_id": session_id, "message": "How do I reset?"})
+
+    data = response.json()
+    assert response.status_code == 200
+    assert "Use the reset link." in data["answer_text"]
+    assert data["sources"] == ["faq_reset"]
+    assert data["next_action"] == "reply"
+    assert data["action_payload"] == {"degraded": True}
+
+
+@pytest.mark.asyncio
+async def test_chat_reports_stage_timings(client, monkeypatch):
+    """Stage durations are logged and, when enabled, sent as Server-Timing"""
+    from src.config import settings
+    from src.services.stage_timings import stage_log
+
+    monkeypatch.setattr(settings, "server_timing_enabled", True)
+    stage_log.clear()
+    session_id = client.post("/session", json={}).json()["session_id"]
+    reply = '{"answer_text": "Hi", "confidence": 0.9, "sources": [], "next_action": "reply", "action_payload": {}}'
+
+    with patch.object(llm_client, "generate_response", new_callable=AsyncMock, return_value=reply), \
+         patch.object(vector_db, "search_batch", return_value=[[{"text": "Doc", "id": "faq_1"}]]), \
+         patch.object(vector_db, "embed_queries", return_value=np.ones((1, 4), dtype="float32")):
+        response = client.post("/chat", json={"session_id": session_id, "message": "Hello"})
+
+    assert response.status_code == 200
+    stages = {metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")}
+    assert {"db", "search", "prompt", "llm", "persist"} <= stages
+    assert len(stage_log) == 1
+    assert stages == set(stage_log.report())
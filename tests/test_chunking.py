@@ -0,0 +1,69 @@
+"""
+Unit tests for document chunking and chunk-aware retrieval
+"""
+import pytest
+
+from src.data import faq_loader
+from src.data.chunking import chunk_document, chunk_spans
+
+
+def test_token_windows_overlap():
+    text = " ".join(f"w{i}" for i in range(10))
+    spans = chunk_spans(text, chunk_size=4, chunk_overlap=1, unit="token")
+    assert [text[s:e].split() for s, e in spans] == [
+        ["w0", "w1", "w2", "w3"], ["w3", "w4", "w5", "w6"], ["w6", "w7", "w8", "w9"]
+    ]
+
+
+def test_sentence_chunks_keep_sentences_whole():
+    text = "One two three. Four five. Six seven eight nine. Ten."
+    spans = chunk_spans(text, chunk_size=6, chunk_overlap=3, unit="sentence")
+    assert [text[s:e] for s, e in spans] == [
+        "One two three. Four five.", "Four five. Six seven eight nine.", "Ten."
+    ]
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        chunk_spans("a b c", chunk_size=2, chunk_overlap=2)
+
+
+def test_chunk_document_records_parent_and_offsets():
+    doc = {"id": "kb_1", "text": "Alpha beta. Gamma delta. Epsilon zeta.", "metadata": {"category": "KB"}}
+    chunks = chunk_document(doc, prefix="Title\n", chunk_size=2, chunk_overlap=0)
+
+    assert [c["id"] for c in chunks] == ["kb_1#c0", "kb_1#c1", "kb_1#c2"]
+    assert chunks[1]["text"] == "Title\nGamma delta."
+    meta = chunks[1]["metadata"]
+    assert (meta["parent_id"], meta["chunk_index"], meta["chunk_count"], meta["category"]) == ("kb_1", 1, 3, "KB")
+    assert doc["text"][meta["char_start"]:meta["char_end"]] == "Gamma delta."
+    assert chunk_document(doc, chunk_size=50) == [doc]
+
+
+def test_chunked_faqs_collapse_to_parents(make_vector_db, monkeypatch):
+    monkeypatch.setattr("src.config.settings.chunk_size", 10)
+    monkeypatch.setattr("src.config.settings.chunk_overlap", 2)
+    db = make_vector_db()
+    monkeypatch.setattr(faq_loader, "vector_db", db)
+
+    long_answer = " ".join(f"Step {i}: open settings and check the billing page." for i in range(6))
+    faqs = [
+        {"id": "faq_long", "question": "How do I update billing?", "answer": long_answer, "category": "Billing"},
+        {"id": "faq_short", "question": "Reset password?", "answer": "Use the link.", "category": "Account"},
+    ]
+    assert faq_loader.process_and_index_faqs(faqs)["upserted"] == 2
+    assert len(db.chunk_ids("faq_long")) > 1
+    assert sorted(db.parent_ids()) == ["faq_long", "faq_short"]
+
+    hits = db.search("billing settings page", k=2)
+    assert sorted(h["id"] for h in hits) == ["faq_long", "faq_short"]
+    assert hits[0]["chunk_id"].startswith("faq_long#c")
+    assert len(db.search("billing settings page", k=3, collapse=False)) == 3
+
+    # A shorter answer drops the chunks it no longer produces; unchanged FAQs are skipped
+    faqs[0] = dict(faqs[0], answer="Open billing.")
+    assert faq_loader.process_and_index_faqs(faqs) == {"upserted": 1, "unchanged": 1, "deleted": 0}
+    assert db.chunk_ids("faq_long") == ["faq_long"]
+
+    assert faq_loader.process_and_index_faqs(faqs[1:], prune=True)["deleted"] == 1
+    assert db.parent_ids() == ["faq_short"]
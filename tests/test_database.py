@@ -0,0 +1,30 @@
+"""
+Tests for database initialization
+"""
+from sqlalchemy import create_engine, inspect, text
+
+from src.database import init_db
+
+
+def test_init_db_upgrades_messages_table_from_older_schema(tmp_path):
+    """A messages table created before prompt token tracking gains the column and index"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE messages (id CHAR(32) PRIMARY KEY, session_id CHAR(32) NOT NULL, "
+            "role VARCHAR(50) NOT NULL, content TEXT NOT NULL, tokens INTEGER, confidence FLOAT, "
+            "sources JSON, timestamp DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO messages (id, session_id, role, content) VALUES ('m1', 's1', 'user', 'hi')"
+        ))
+
+    init_db(engine)
+    init_db(engine)  # idempotent
+
+    inspector = inspect(engine)
+    assert "prompt_tokens" in {c["name"] for c in inspector.get_columns("messages")}
+    assert "ix_messages_session_timestamp" in {i["name"] for i in inspector.get_indexes("messages")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT content, prompt_tokens FROM messages")).all() == [("hi", None)]
+    engine.dispose()
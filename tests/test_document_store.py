@@ -0,0 +1,61 @@
+"""
+Unit tests for the memory-mapped document store
+"""
+import pickle
+import faiss
+import numpy as np
+
+from src.services.document_store import DocumentStore
+from tests.conftest import HashEncoder
+
+
+DOCS = [
+    {"id": "faq_1", "text": "Question: Reset password?", "metadata": {"category": "Account"}},
+    {"id": "faq_2", "text": "Question: Refunds — how long?", "metadata": {"category": "Billing"}},
+    {"id": 3, "text": "", "metadata": {}},
+]
+
+
+def test_round_trip_and_tail(tmp_path):
+    store = DocumentStore.from_documents(DOCS[:2])
+    store.save(str(tmp_path))
+
+    reopened = DocumentStore(str(tmp_path))
+    reopened.append(DOCS[2])
+
+    assert len(reopened) == 3
+    assert list(reopened) == DOCS
+    assert reopened[-1] == DOCS[2]
+    assert reopened[0:2] == DOCS[:2]
+
+    # Saving folds the tail into the mapped columns
+    reopened.save()
+    assert list(DocumentStore(str(tmp_path))) == DOCS
+
+
+def test_materialized_documents_are_independent(tmp_path):
+    store = DocumentStore.from_documents(DOCS)
+    store.save(str(tmp_path))
+
+    doc = store[0]
+    doc["score"] = 0.1
+    assert "score" not in store[0]
+
+
+def test_vector_db_migrates_legacy_pickle(tmp_path, make_vector_db):
+    # Layout written before the columnar store existed: flat index + documents.pkl
+    index = faiss.IndexFlatL2(384)
+    index.add(np.array(HashEncoder().encode([d["text"] for d in DOCS[:2]])))
+    faiss.write_index(index, str(tmp_path / "index.faiss"))
+    with open(tmp_path / "documents.pkl", "wb") as f:
+        pickle.dump(DOCS[:2], f)
+
+    legacy = make_vector_db()
+    assert legacy.search("Reset password?", k=1)[0]["id"] == "faq_1"
+
+    legacy.save_index()
+    assert not (tmp_path / "documents.pkl").exists()
+    reloaded = make_vector_db()
+    assert isinstance(reloaded.documents, DocumentStore)
+    assert len(reloaded.documents) == 2
+    assert reloaded.search("Refunds how long", k=1)[0]["id"] == "faq_2"
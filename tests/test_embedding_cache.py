@@ -0,0 +1,58 @@
+"""
+Unit tests for the query embedding cache
+"""
+import numpy as np
+import time
+
+from src.config import settings
+from src.services.embedding_cache import EmbeddingCache, normalize_query
+from src.services.retriever import VectorDB
+
+
+class CountingEncoder:
+    """Deterministic stand-in for SentenceTransformer that counts encoded texts"""
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[float(len(t)), 1.0, 0.0] for t in texts], dtype="float32")
+
+
+def test_normalize_query():
+    assert normalize_query("  How do I   reset my password?? ") == "how do i reset my password"
+
+
+def test_lru_eviction_and_stats():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("a", np.zeros(3))
+    cache.put("b", np.ones(3))
+    assert cache.get("a") is not None  # 'a' becomes most recently used
+    cache.put("c", np.ones(3))
+
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 1
+
+
+def test_ttl_expiry():
+    cache = EmbeddingCache(ttl_seconds=0.01)
+    cache.put("a", np.zeros(3))
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_vector_db_reuses_cached_query_embeddings():
+    db = VectorDB()
+    encoder = CountingEncoder()
+    db._encoder = encoder
+    db._encoder_name = settings.embedding_model
+    db._encoder_backend = settings.encoder_backend
+
+    first = db.embed_queries(["How do I reset my password?", "refund policy"])
+    second = db.embed_queries(["how do i reset my password", "Refund policy!"])
+
+    assert encoder.encoded == ["How do I reset my password?", "refund policy"]
+    np.testing.assert_array_equal(first, second)
+    assert db.query_cache.stats["hits"] == 2
@@ -0,0 +1,29 @@
+"""
+Unit tests for the encoder backends
+"""
+import sys
+
+import numpy as np
+import pytest
+
+from src.services.encoders import create_encoder, pool_embeddings
+
+
+def test_mean_pooling_ignores_padding_and_normalizes():
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype="float32")
+    mask = np.array([[1, 1, 0]])
+
+    np.testing.assert_allclose(pool_embeddings(hidden, mask, "mean", normalize=False), [[2.0, 0.0]])
+    np.testing.assert_allclose(pool_embeddings(hidden, mask, "mean"), [[1.0, 0.0]])
+    np.testing.assert_allclose(pool_embeddings(hidden, mask, "cls", normalize=False), [[1.0, 0.0]])
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_encoder("tensorrt", "all-MiniLM-L6-v2")
+
+
+def test_onnx_backend_without_onnxruntime_names_the_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "onnxruntime", None)
+    with pytest.raises(ImportError, match="requirements-onnx.txt"):
+        create_encoder("onnx", "all-MiniLM-L6-v2")
@@ -0,0 +1,96 @@
+"""
+Unit tests for streaming FAQ ingestion
+"""
+import csv
+import json
+
+import pytest
+
+from src.data import faq_loader
+from tests.test_vector_db import FAQS
+
+
+def _write_exports(tmp_path):
+    json_path = tmp_path / "faqs.json"
+    json_path.write_text(json.dumps(FAQS, indent=2))
+
+    jsonl_path = tmp_path / "faqs.jsonl"
+    jsonl_path.write_text("\n".join(json.dumps(faq) for faq in FAQS) + "\n\n")
+
+    csv_path = tmp_path / "faqs.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "question", "answer", "category"])
+        writer.writeheader()
+        writer.writerows(FAQS)
+
+    return json_path, jsonl_path, csv_path
+
+
+def test_iter_faqs_formats(tmp_path, monkeypatch):
+    # Tiny reads force elements to straddle chunk boundaries
+    monkeypatch.setattr(faq_loader, "JSON_READ_CHUNK", 7)
+    for path in _write_exports(tmp_path):
+        assert list(faq_loader.iter_faqs(str(path))) == FAQS
+
+
+def test_iter_faqs_rejects_truncated_json(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text(json.dumps(FAQS)[:-20])
+    with pytest.raises(ValueError):
+        list(faq_loader.iter_faqs(str(path)))
+
+
+def test_ingest_stream_batches_and_skips_unchanged(make_vector_db, monkeypatch, tmp_path):
+    db = make_vector_db()
+    monkeypatch.setattr(faq_loader, "vector_db", db)
+    _, jsonl_path, _ = _write_exports(tmp_path)
+
+    stats = faq_loader.ingest_stream(str(jsonl_path), batch_size=2)
+    assert (stats["read"], stats["upserted"], stats["unchanged"]) == (3, 3, 0)
+
+    stats = faq_loader.ingest_stream(str(jsonl_path), batch_size=2)
+    assert (stats["read"], stats["upserted"], stats["unchanged"]) == (3, 0, 3)
+    assert sorted(db.document_ids()) == sorted(faq["id"] for faq in FAQS)
+
+
+def test_ingest_stream_trains_ivf_on_more_than_the_first_batch(make_vector_db, monkeypatch, tmp_path):
+    import faiss
+    from src.config import settings
+
+    monkeypatch.setattr(settings, "faiss_index_type", "ivf_flat")
+    monkeypatch.setattr(settings, "faiss_nlist", 4)  # full size needs 4 * 39 = 156 vectors
+    db = make_vector_db()
+    monkeypatch.setattr(faq_loader, "vector_db", db)
+    path = tmp_path / "faqs.jsonl"
+    path.write_text("\n".join(
+        json.dumps({"id": f"faq_{i}", "question": f"Question {i} about item {i * 7}?", "answer": f"Answer {i}."})
+        for i in range(200)
+    ))
+
+    stats = faq_loader.ingest_stream(str(path), batch_size=50)
+    assert stats["upserted"] == 200
+    assert faiss.extract_index_ivf(db.index).nlist == 4  # not 50 // 39 = 1
+    assert len(db.document_ids()) == 200
+
+
+def test_ingest_stream_compacts_once_at_the_end(make_vector_db, monkeypatch, tmp_path):
+    from src.config import settings
+
+    monkeypatch.setattr(settings, "wal_compaction_threshold", 20)
+    db = make_vector_db()
+    monkeypatch.setattr(faq_loader, "vector_db", db)
+    compactions = []
+    compact = db.compact
+    monkeypatch.setattr(db, "compact", lambda: compactions.append(1) or compact())
+    path = tmp_path / "faqs.jsonl"
+    path.write_text("\n".join(
+        json.dumps({"id": f"faq_{i}", "question": f"Question {i}?", "answer": f"Answer {i}."})
+        for i in range(100)
+    ))
+
+    faq_loader.ingest_stream(str(path), batch_size=10)  # crosses the threshold 5 times
+    db.wait_for_compaction()
+
+    assert len(compactions) == 1
+    assert not (tmp_path / "wal.jsonl").exists()
+    assert len(make_vector_db().document_ids()) == 100
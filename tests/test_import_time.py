@@ -0,0 +1,43 @@
+"""
+Import-time budget for the application
+
+Heavy dependencies (torch / sentence-transformers, the Gemini SDK, redis)
+and the on-disk index must not load when src.main is imported; they load
+in the startup warm-up or on first use.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Cold import of src.main takes ~1.3s here; importing torch alone takes longer
+IMPORT_BUDGET_S = float(os.getenv("IMPORT_TIME_BUDGET_S", "3.0"))
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "google.generativeai", "redis")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(code: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "test-key"))
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True, timeout=120
+    )
+
+
+def test_app_import_defers_heavy_dependencies():
+    result = _python(
+        "import json, sys, src.main\n"
+        "from src.services.retriever import vector_db\n"
+        f"print(json.dumps({{'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules], "
+        "'index_loaded': vector_db._loaded}))"
+    )
+    state = json.loads(result.stdout.strip().splitlines()[-1])
+    assert state == {"heavy": [], "index_loaded": False}
+
+
+def test_app_import_time_budget():
+    stderr = _python("import src.main").stderr
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| src\.main$", stderr, re.MULTILINE)
+    assert match, "src.main missing from -X importtime output"
+    assert int(match.group(1)) / 1e6 < IMPORT_BUDGET_S
@@ -0,0 +1,80 @@
+"""
+Unit tests for the FAISS index factory
+"""
+import numpy as np
+import pytest
+
+from src.services.index_factory import (
+    INDEX_TYPES,
+    build_index,
+    create_index,
+    prepare_vectors,
+    recall_latency_report,
+    to_l2_distances,
+)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 16)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_every_index_type_finds_exact_matches(corpus, index_type):
+    index = build_index(index_type, corpus, pq_m=4)
+    if hasattr(index, "nprobe"):
+        index.nprobe = index.nlist  # exhaustive probing
+
+    _, ids = index.search(prepare_vectors(index, corpus[:20]), 1)
+    if index_type == "ivf_pq":
+        # Lossy codes: most, not all, exact matches come back first
+        assert (ids[:, 0] == np.arange(20)).mean() >= 0.5
+    else:
+        assert (ids[:, 0] == np.arange(20)).all()
+
+
+def test_inner_product_scores_are_reported_as_l2_distances(corpus):
+    flat = build_index("flat", corpus)
+    flat_ip = build_index("flat_ip", corpus)
+
+    l2, _ = flat.search(corpus[:5], 3)
+    ip, _ = flat_ip.search(prepare_vectors(flat_ip, corpus[:5]), 3)
+
+    np.testing.assert_allclose(to_l2_distances(flat_ip, ip), l2, atol=1e-4)
+
+
+def test_ivf_size_is_clamped_to_training_set():
+    index = create_index("ivf_flat", 16, n_train=100, nlist=1024)
+    assert index.nlist == 2
+
+
+def test_unknown_index_type():
+    with pytest.raises(ValueError):
+        create_index("annoy", 16)
+
+
+def test_recall_latency_report(corpus):
+    report = recall_latency_report(corpus, corpus[:10], ["flat", "ivf_flat", "hnsw"], k=5,
+                                   nprobe_values=[1, 1000], ef_search_values=[64])
+    rows = {(r["index_type"], r["nprobe"], r["ef_search"]): r for r in report}
+
+    assert rows[("flat", None, None)]["recall_at_k"] == 1.0
+    # Probing every list is exhaustive
+    assert rows[("ivf_flat", 1000, None)]["recall_at_k"] == 1.0
+    assert ("hnsw", None, 64) in rows
+
+
+@pytest.mark.parametrize("storage,min_recall", [("float16", 1.0), ("int8", 0.9)])
+def test_scalar_quantized_storage(corpus, storage, min_recall):
+    index = build_index("flat", corpus, storage=storage)
+    assert index.sa_code_size() < build_index("flat", corpus).sa_code_size()
+
+    _, ids = index.search(prepare_vectors(index, corpus[:50]), 1)
+    assert (ids[:, 0] == np.arange(50)).mean() >= min_recall
+
+
+def test_unknown_vector_storage():
+    with pytest.raises(ValueError):
+        create_index("flat", 16, storage="float8")
@@ -0,0 +1,175 @@
+"""
+Tests for system prompt delivery and context cache lifetime management
+(uses a local fake of the provider's cached content API)
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from src.services.llm_client import ContextCache, LLMClient
+from src.services.llm_scheduler import LLMDeadlineExceeded
+
+
+class FakeModel:
+    def __init__(self, name: str):
+        self.name = name
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.prompts.append(prompt)
+        return type("Response", (), {"text": f"{self.name}: ok"})()
+
+
+class FakeCacheProvider:
+    """In-memory stand-in for the cached content API"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created = []
+        self.extended = []
+
+    def create(self, model_name, system_instruction, ttl_seconds):
+        if self.fail:
+            raise RuntimeError("Cached content token count below minimum")
+        handle = {"name": f"cachedContents/{len(self.created)}", "system": system_instruction}
+        self.created.append(handle)
+        return handle
+
+    def extend(self, handle, ttl_seconds):
+        if self.fail:
+            raise RuntimeError("update failed")
+        self.extended.append(handle["name"])
+
+    def model(self, handle):
+        return FakeModel(handle["name"])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(provider, clock):
+    return ContextCache(provider, "gemini-test", "SYSTEM", ttl_seconds=100, refresh_seconds=20,
+                        retry_seconds=50, clock=clock)
+
+
+def test_context_cache_creates_extends_and_recreates():
+    provider, clock = FakeCacheProvider(), FakeClock()
+    cache = _cache(provider, clock)
+
+    model = cache.model()
+    assert model.name == "cachedContents/0"
+    assert provider.created[0]["system"] == "SYSTEM"
+
+    clock.now += 50  # Fresh: reused without provider calls
+    assert not cache.needs_refresh()
+    assert cache.model() is model
+
+    clock.now += 35  # Within the refresh margin: TTL extended in place
+    assert cache.needs_refresh()
+    assert cache.model() is model
+    assert provider.extended == ["cachedContents/0"]
+
+    clock.now += 200  # Expired: a new entry is created
+    assert cache.current() is None
+    assert cache.model().name == "cachedContents/1"
+
+
+def test_context_cache_backs_off_after_failure():
+    provider, clock = FakeCacheProvider(fail=True), FakeClock()
+    cache = _cache(provider, clock)
+
+    assert cache.model() is None
+    assert cache.stats["failures"] == 1
+    clock.now += 10
+    assert not cache.needs_refresh()
+    assert cache.model() is None
+    assert cache.stats["failures"] == 1  # No retry during the back-off
+
+    provider.fail = False
+    clock.now += 50
+    assert cache.model().name == "cachedContents/0"
+
+
+@pytest.mark.asyncio
+async def test_llm_client_falls_back_to_system_instruction():
+    client = LLMClient(system_prompt="SYSTEM", cache_provider=FakeCacheProvider(fail=True))
+    plain, system = FakeModel("plain"), FakeModel("system_instruction")
+    client._model, client._system_model = plain, system
+
+    with patch("src.services.llm_client.settings.llm_system_prompt_mode", "cached"):
+        assert await client.generate_response("hi") == "system_instruction: ok"
+        # Auxiliary calls (e.g. summaries) skip the system prompt
+        assert await client.generate_response("summarize", with_system_prompt=False) == "plain: ok"
+
+    client.context_cache.provider.fail = False
+    client.context_cache._retry_at = 0
+    with patch("src.services.llm_client.settings.llm_system_prompt_mode", "cached"):
+        assert await client.generate_response("hi") == "cachedContents/0: ok"
+
+    with patch("src.services.llm_client.settings.llm_system_prompt_mode", "inline"):
+        assert client.inline_system_prompt
+        assert await client.generate_response("hi") == "plain: ok"
+
+
+@pytest.mark.asyncio
+async def test_prompt_omits_system_prompt_when_model_carries_it():
+    from src.prompts.prompts import SYSTEM_PROMPT
+    from src.services.prompt_orchestrator import orchestrator
+
+    with patch("src.services.llm_client.settings.llm_system_prompt_mode", "system_instruction"):
+        prompt, _, tokens = await orchestrator.build_prompt("hello", [], retrievals=[])
+    assert SYSTEM_PROMPT not in prompt
+    assert tokens > len(prompt) // 4  # The system instruction still counts
+
+    with patch("src.services.llm_client.settings.llm_system_prompt_mode", "inline"):
+        prompt, _, _ = await orchestrator.build_prompt("hello", [], retrievals=[])
+    assert SYSTEM_PROMPT in prompt
+
+
+class SlowModel(FakeModel):
+    def __init__(self, name: str, delay: float):
+        super().__init__(name)
+        self.delay = delay
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        await asyncio.sleep(self.delay)
+        return await super().generate_content_async(prompt, generation_config, stream)
+
+
+@pytest.mark.asyncio
+async def test_generate_response_deadline_and_hedge():
+    client = LLMClient(system_prompt="SYSTEM", cache_provider=FakeCacheProvider())
+    client._model = SlowModel("slow", delay=1.0)
+    client._named_models[("gemini-fast", False)] = FakeModel("fast")
+
+    with patch("src.services.llm_client.settings.llm_system_prompt_mode", "inline"):
+        with pytest.raises(LLMDeadlineExceeded):
+            await client.generate_response("hi", deadline=0.05)
+
+        with patch("src.services.llm_client.settings.llm_hedge_enabled", True), \
+             patch("src.services.llm_client.settings.llm_hedge_model", "gemini-fast"), \
+             patch("src.services.llm_client.settings.llm_hedge_delay_seconds", 0.02):
+            assert await client.generate_response("hi", deadline=0.5) == "fast: ok"
+
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_keep_their_own_deadlines():
+    client = LLMClient(system_prompt="SYSTEM", cache_provider=FakeCacheProvider())
+    client._model = SlowModel("slow", delay=0.4)
+
+    with patch("src.services.llm_client.settings.llm_system_prompt_mode", "inline"):
+        impatient, patient = await asyncio.gather(
+            client.generate_response("hi", deadline=0.2),
+            client.generate_response("hi", deadline=5),
+            return_exceptions=True
+        )
+
+    # The first caller's deadline must not cancel the call the second one shares
+    assert isinstance(impatient, LLMDeadlineExceeded)
+    assert patient == "slow: ok"
+    assert client._model.prompts == ["hi"]
@@ -0,0 +1,184 @@
+"""
+Tests for the LLM request scheduler
+"""
+import asyncio
+import pytest
+
+from src.services.llm_scheduler import LLMOverloadedError, LLMScheduler, TokenBucket, is_retryable
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+def test_is_retryable():
+    assert is_retryable(RateLimited())
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(BadRequest())
+    assert not is_retryable(ValueError("bad prompt"))
+
+
+def test_token_bucket_paces_after_burst():
+    now = [0.0]
+    bucket = TokenBucket(60, clock=lambda: now[0])  # 1 per second, bursts of 60
+
+    assert all(bucket.reserve(1) == 0 for _ in range(60))
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+    now[0] += 10
+    assert bucket.reserve(1) == 0
+    assert TokenBucket(0).reserve(10 ** 6) == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    scheduler = LLMScheduler(max_in_flight=2)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    results = await asyncio.gather(*(scheduler.run(call) for _ in range(6)))
+    assert results == ["ok"] * 6
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_coalesced():
+    scheduler = LLMScheduler()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    results = await asyncio.gather(*(scheduler.run(call, key="same prompt") for _ in range(5)))
+    assert results == ["answer"] * 5
+    assert calls == 1
+    assert scheduler.stats["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_coalesced_call_is_cancelled_only_when_every_caller_leaves():
+    scheduler = LLMScheduler()
+    cancelled = asyncio.Event()
+
+    async def call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    callers = [asyncio.ensure_future(scheduler.run(call, key="same prompt")) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    callers[0].cancel()
+    await asyncio.sleep(0.01)
+    assert not cancelled.is_set()
+
+    callers[1].cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert not scheduler._inflight
+
+
+@pytest.mark.asyncio
+async def test_retryable_errors_are_retried_with_backoff():
+    scheduler = LLMScheduler(max_retries=3, backoff_base=0.001, backoff_max=0.002)
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise RateLimited("quota exceeded")
+        return "ok"
+
+    assert await scheduler.run(flaky) == "ok"
+    assert scheduler.stats["retries"] == 2
+
+    async def invalid():
+        raise BadRequest("invalid argument")
+
+    with pytest.raises(BadRequest):
+        await scheduler.run(invalid)
+    assert scheduler.stats["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_retries_only_before_first_chunk():
+    scheduler = LLMScheduler(max_retries=2, backoff_base=0.001)
+    opened = 0
+
+    async def chunks(fail_after_first: bool):
+        yield "a"
+        if fail_after_first:
+            raise RateLimited("mid-stream")
+        yield "b"
+
+    async def start():
+        nonlocal opened
+        opened += 1
+        if opened == 1:
+            raise RateLimited("busy")
+        return chunks(fail_after_first=opened == 3)
+
+    assert [c async for c in scheduler.stream(start)] == ["a", "b"]
+    with pytest.raises(RateLimited):
+        async for _ in scheduler.stream(start):
+            pass
+    assert opened == 3
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_raises_overloaded():
+    scheduler = LLMScheduler(max_in_flight=1, queue_timeout=0.01)
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return "done"
+
+    first = asyncio.ensure_future(scheduler.run(slow))
+    await asyncio.sleep(0)
+    with pytest.raises(LLMOverloadedError):
+        await scheduler.run(slow)
+    release.set()
+    assert await first == "done"
+
+
+@pytest.mark.asyncio
+async def test_hedge_fires_after_delay_and_first_result_wins():
+    scheduler = LLMScheduler()
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+            return "slow"
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    async def fast():
+        await asyncio.sleep(0.01)
+        return "fast"
+
+    assert await scheduler.hedged(slow, fast, delay=0.02) == "fast"
+    await asyncio.sleep(0)  # Let the cancelled loser unwind
+    assert cancelled == ["slow"]
+    assert scheduler.stats["hedged"] == 1 and scheduler.stats["hedge_wins"] == 1
+
+    # A primary that beats the delay never starts the hedge
+    assert await scheduler.hedged(fast, slow, delay=0.5) == "fast"
+    assert scheduler.stats["hedged"] == 1
@@ -0,0 +1,90 @@
+"""
+Tests for the per-request model router
+"""
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from src.services.llm_client import llm_client
+from src.services.model_router import ModelRouter, similarity
+from src.services.retriever import vector_db
+
+
+def _hit(doc_id: str, cosine: float, answer: str = "Stored answer."):
+    return {"id": doc_id, "text": f"Question: ...\nAnswer: {answer}", "score": 2.0 * (1.0 - cosine),
+            "metadata": {"answer": answer}}
+
+
+def test_similarity_from_squared_l2():
+    assert similarity({"score": 0.0}) == 1.0
+    assert similarity({"score": 2.0}) == 0.0
+    assert similarity({"bm25_score": 7.1}) is None
+
+
+@pytest.mark.parametrize("hits, route", [
+    ([_hit("a", 0.97), _hit("b", 0.6)], "faq"),
+    ([_hit("a", 0.97), _hit("b", 0.95)], "fast"),  # Ambiguous: no clear winner
+    ([_hit("a", 0.7)], "fast"),
+    ([_hit("a", 0.2)], "full"),
+    ([{"id": "a", "text": "lexical only", "bm25_score": 9.0}], "full"),
+    ([{"id": "a", "text": "lexical only", "bm25_score": 9.0, "shortcircuit": True}], "fast"),
+    ([], "full"),
+])
+def test_route(hits, route):
+    with patch("src.services.model_router.settings.llm_fast_model", "fast-model"):
+        decision = ModelRouter().route(hits)
+    assert decision["route"] == route
+    assert decision["model"] == ("fast-model" if route == "fast" else None)
+
+
+def test_fast_tier_can_be_disabled():
+    with patch("src.services.model_router.settings.llm_fast_model", ""):
+        assert ModelRouter().route([_hit("a", 0.7)])["route"] == "full"
+
+
+@pytest.mark.parametrize("query, route", [
+    ("How do I reset my password?", "faq"),
+    ("password", "fast"),  # A single term matches one FAQ, but doesn't restate its question
+    ("reset my password", "fast"),
+])
+def test_lexical_shortcircuit_routes_under_default_retrieval(make_vector_db, query, route):
+    from src.config import settings
+    from src.data.faq_loader import faq_to_document
+
+    assert settings.retrieval_mode == "hybrid" and settings.sparse_shortcircuit
+    db = make_vector_db()
+    db.add_documents([faq_to_document(faq) for faq in [
+        {"id": "faq_reset", "question": "How do I reset my password?", "answer": "Use the reset link."},
+        {"id": "faq_refund", "question": "How long do refunds take?", "answer": "30 days."},
+        {"id": "faq_card", "question": "Why was my card declined?", "answer": "Check your bank."},
+    ]])
+
+    retrievals = db.search(query, k=3)
+    assert retrievals[0]["id"] == "faq_reset"
+    assert retrievals[0].get("shortcircuit") and "score" not in retrievals[0]
+    router = ModelRouter()
+    with patch("src.services.model_router.settings.llm_fast_model", "fast-model"):
+        decision = router.route(retrievals, query)
+    assert decision["route"] == route
+    if route == "faq":
+        answer = router.direct_answer(decision, retrievals)
+        assert answer["answer_text"] == "Use the reset link."
+        assert 0.5 < answer["confidence"] <= 1.0
+
+
+@pytest.mark.asyncio
+async def test_chat_answers_exact_faq_match_without_llm(client):
+    session_id = client.post("/session", json={}).json()["session_id"]
+    docs = [[_hit("faq_reset", 0.98, "Use the reset link on the login page."), _hit("faq_other", 0.5)]]
+
+    with patch.object(llm_client, "generate_response", new_callable=AsyncMock) as mock_llm, \
+         patch.object(vector_db, "search_batch", return_value=docs), \
+         patch.object(vector_db, "embed_queries", return_value=np.ones((1, 4), dtype="float32")):
+        response = client.post("/chat", json={"session_id": session_id, "message": "How do I reset my password?"})
+        assert mock_llm.await_count == 0
+
+    data = response.json()
+    assert data["answer_text"] == "Use the reset link on the login page."
+    assert data["sources"] == ["faq_reset"]
+    assert data["action_payload"] == {"route": "faq"}
+    assert data["confidence"] == pytest.approx(0.98)
@@ -0,0 +1,23 @@
+"""
+Unit tests for the preload-and-fork deployment hooks
+"""
+import gc
+
+from src.services import preload
+
+
+def test_preload_loads_shared_state_and_freezes_gc(make_vector_db, monkeypatch):
+    db = make_vector_db()
+    db.add_documents([{"id": "faq_1", "text": "Reset your password", "metadata": {}}])
+    db._id_to_row = None  # as after a fresh load
+    monkeypatch.setattr(preload, "vector_db", db)
+
+    try:
+        preload.preload_shared_state()
+        assert db._id_to_row == {"faq_1": 0}
+        assert len(db.sparse) == 1
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+    preload.reset_after_fork()
@@ -0,0 +1,53 @@
+"""
+Tests for the token-budgeted prompt assembler
+"""
+from datetime import datetime
+from uuid import uuid4
+
+from src.models.schemas import MessageResponse
+from src.services.prompt_assembler import PromptAssembler, estimate_tokens, truncate_to_tokens
+
+TEMPLATE = "SYSTEM:\n{system_prompt}\nSUMMARY: {session_summary}\nDOCS:\n{retrieved_context}\nHISTORY:\n{chat_history}\nQUERY: {user_query}\n"
+
+
+def _message(role: str, content: str) -> MessageResponse:
+    return MessageResponse(id=uuid4(), role=role, content=content, timestamp=datetime(2024, 1, 1))
+
+
+def _docs(n: int, words: int = 40):
+    return [{"id": f"doc{i}", "text": " ".join(f"word{i}" for _ in range(words))} for i in range(n)]
+
+
+def test_static_prefix_is_precompiled():
+    assembler = PromptAssembler(TEMPLATE, {"system_prompt": "Be helpful."}, budget=1000)
+    assert assembler.fields == ["session_summary", "retrieved_context", "chat_history", "user_query"]
+
+    prompt, included, tokens = assembler.assemble("hi", _docs(1), [_message("user", "hello")], "none")
+    assert prompt.startswith("SYSTEM:\nBe helpful.\nSUMMARY: none\n")
+    assert "1) [doc0] word0" in prompt
+    assert "User: hello" in prompt
+    assert prompt.endswith("QUERY: hi\n")
+    assert len(included) == 1
+    assert tokens == estimate_tokens(prompt)
+
+
+def test_prompt_stays_within_budget():
+    assembler = PromptAssembler(TEMPLATE, {"system_prompt": "Be helpful."}, budget=300)
+    history = [_message("user" if i % 2 == 0 else "assistant", f"turn {i} " * 20) for i in range(10)]
+
+    prompt, included, tokens = assembler.assemble("How do I reset?", _docs(10), history, "summary " * 200)
+    assert tokens <= 300
+    # Documents are packed in rank order, the last one that fits may be truncated
+    assert 0 < len(included) < 10
+    assert [doc["id"] for doc in included] == [f"doc{i}" for i in range(len(included))]
+    # History keeps the newest turns
+    assert "turn 0 " not in prompt
+    assert "QUERY: How do I reset?" in prompt
+
+
+def test_truncate_to_tokens():
+    text = "alpha beta gamma delta " * 10
+    assert truncate_to_tokens("short", 10) == "short"
+    cut = truncate_to_tokens(text, 10)
+    assert estimate_tokens(cut) <= 10
+    assert cut.endswith("…")
@@ -0,0 +1,80 @@
+"""
+Unit tests for the cross-encoder re-ranking stage
+"""
+import asyncio
+import time
+import pytest
+
+from src.services.reranker import Reranker
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words the document contains"""
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=32):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [sum(word in text for word in query.split()) for query, text in pairs]
+
+
+CANDIDATES = [
+    {"id": "a", "text": "shipping times"},
+    {"id": "b", "text": "refund policy"},
+    {"id": "c", "text": "refund policy for annual plans"},
+]
+
+
+def _reranker(model, budget_ms=500):
+    reranker = Reranker("fake", budget_ms=budget_ms)
+    reranker._model = model
+    return reranker
+
+
+@pytest.mark.asyncio
+async def test_rerank_orders_by_cross_encoder_score():
+    reranker = _reranker(FakeCrossEncoder())
+    results = await reranker.rerank("annual refund policy", [dict(d) for d in CANDIDATES], k=2)
+    assert [d["id"] for d in results] == ["c", "b"]
+    assert results[0]["rerank_score"] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_rerank_falls_back_to_retrieval_order():
+    slow = _reranker(FakeCrossEncoder(delay=0.2), budget_ms=20)
+    assert [d["id"] for d in await slow.rerank("refund", CANDIDATES, k=2)] == ["a", "b"]
+    assert slow.stats["timeouts"] == 1
+
+    broken = _reranker(FakeCrossEncoder(fail=True))
+    assert [d["id"] for d in await broken.rerank("refund", CANDIDATES, k=2)] == ["a", "b"]
+    assert broken.stats["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rerank_skips_when_estimate_exceeds_budget():
+    reranker = _reranker(FakeCrossEncoder())
+    reranker._seconds_per_pair = 1.0
+    assert [d["id"] for d in await reranker.rerank("refund", CANDIDATES, k=1)] == ["a"]
+    assert reranker.stats["skipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_timed_out_jobs_do_not_hold_up_the_executor():
+    model = FakeCrossEncoder(delay=0.1)
+    reranker = _reranker(model, budget_ms=30)
+    reranker.batch_size = 1  # one predict call per candidate
+
+    results = await asyncio.gather(*(reranker.rerank("refund", CANDIDATES, k=1) for _ in range(3)))
+    assert all([d["id"] for d in r] == ["a"] for r in results)
+    assert reranker.stats["timeouts"] == 3
+
+    # Wait for the executor to drain: the running job stopped after its
+    # first batch instead of scoring all candidates, the queued ones never ran
+    await asyncio.get_running_loop().run_in_executor(reranker._executor, lambda: None)
+    assert model.calls == 1
+    assert reranker.stats["abandoned"] == 1
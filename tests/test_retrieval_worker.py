@@ -0,0 +1,54 @@
+"""
+Unit tests for the micro-batching retrieval worker
+"""
+import asyncio
+import pytest
+
+from src.services.retrieval_worker import RetrievalWorker
+
+
+class FakeVectorDB:
+    """Records each batched call and echoes the query back as a document"""
+    def __init__(self):
+        self.calls = []
+
+    def search_batch(self, queries, k=3):
+        self.calls.append((list(queries), k))
+        return [[{"id": q, "text": q}] for q in queries]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_batch():
+    db = FakeVectorDB()
+    worker = RetrievalWorker(db, max_batch_size=8, max_wait_ms=20)
+
+    results = await asyncio.gather(*[worker.search(f"q{i}", k=3) for i in range(5)])
+
+    assert len(db.calls) == 1
+    assert db.calls[0] == (["q0", "q1", "q2", "q3", "q4"], 3)
+    assert [r[0]["id"] for r in results] == ["q0", "q1", "q2", "q3", "q4"]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_and_duplicates_encode_once():
+    db = FakeVectorDB()
+    worker = RetrievalWorker(db, max_batch_size=2, max_wait_ms=1000)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(worker.search("same"), worker.search("same")), timeout=1
+    )
+
+    assert db.calls == [(["same"], 3)]
+    assert results[0] == results[1]
+    assert results[0] is not results[1]
+
+
+@pytest.mark.asyncio
+async def test_batch_error_propagates_to_callers():
+    class BrokenDB:
+        def search_batch(self, queries, k=3):
+            raise RuntimeError("index unavailable")
+
+    worker = RetrievalWorker(BrokenDB(), max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        await worker.search("anything")
@@ -0,0 +1,93 @@
+"""
+Tests for bounded history loading and the rolling session summarizer
+"""
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.models import Base, Message, Session as SessionModel
+from src.services.llm_client import llm_client
+from src.services.session_memory import SessionSummarizer, recent_messages
+
+
+def _add_session(db, count: int, tokens: int = 10) -> SessionModel:
+    session = SessionModel(session_metadata={})
+    db.add(session)
+    db.flush()
+    start = datetime(2024, 1, 1)
+    db.add_all([
+        Message(session_id=session.id, role="user" if i % 2 == 0 else "assistant",
+                content=f"message {i}", tokens=tokens, timestamp=start + timedelta(minutes=i))
+        for i in range(count)
+    ])
+    db.commit()
+    return session
+
+
+def _contents(messages):
+    return [m.content for m in messages]
+
+
+def test_recent_messages_window_and_token_budget(db_session):
+    session = _add_session(db_session, 20)
+    newest = db_session.query(Message).filter(Message.content == "message 19").one()
+
+    messages, truncated = recent_messages(db_session, session.id, exclude_id=newest.id, limit=6, token_budget=0)
+    assert _contents(messages) == [f"message {i}" for i in range(13, 19)]
+    assert truncated
+
+    messages, truncated = recent_messages(db_session, session.id, limit=6, token_budget=35)
+    assert _contents(messages) == ["message 17", "message 18", "message 19"]
+    assert truncated
+
+    messages, truncated = recent_messages(db_session, session.id, limit=30, token_budget=0)
+    assert len(messages) == 20
+    assert not truncated
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'memory.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_summarizer_folds_messages_outside_window(session_factory):
+    with session_factory() as db:
+        session_id = _add_session(db, 12).id
+
+    summarizer = SessionSummarizer(session_factory)
+    with patch("src.services.session_memory.settings.session_memory_window", 6), \
+         patch("src.services.session_memory.settings.session_history_token_budget", 0), \
+         patch.object(llm_client, "generate_response", new_callable=AsyncMock) as mock_llm:
+        mock_llm.return_value = "Customer asked about messages 0-5."
+        summarizer.schedule(session_id)
+        await summarizer.wait_idle()
+
+        prompt = mock_llm.call_args[0][0]
+        assert "User: message 0" in prompt and "Assistant: message 5" in prompt
+        assert "message 6" not in prompt
+
+        with session_factory() as db:
+            metadata = db.get(SessionModel, session_id).session_metadata
+        assert metadata["summary"] == "Customer asked about messages 0-5."
+
+        # Nothing new has left the window: no second LLM call
+        assert await summarizer.summarize(session_id) is False
+        assert mock_llm.call_count == 1
+
+        # Two more turns push messages 6-7 out; the previous summary is carried over
+        with session_factory() as db:
+            start = datetime(2024, 1, 1, 1)
+            db.add_all([Message(session_id=session_id, role="user", content=f"late {i}", tokens=10,
+                                timestamp=start + timedelta(minutes=i)) for i in range(2)])
+            db.commit()
+        mock_llm.return_value = "Updated summary."
+        assert await summarizer.summarize(session_id) is True
+        prompt = mock_llm.call_args[0][0]
+        assert "Customer asked about messages 0-5." in prompt
+        assert "message 6" in prompt and "message 7" in prompt and "message 5" not in prompt
@@ -0,0 +1,105 @@
+"""
+Unit tests for the BM25 sparse index and hybrid retrieval
+"""
+from unittest.mock import patch
+
+from src.services.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    assert tokenize("Error ERR-4012 with sk_live keys") == [
+        "error", "err-4012", "err", "4012", "with", "sk_live", "sk", "live", "keys"
+    ]
+
+
+def test_bm25_ranks_exact_terms_and_tracks_rows():
+    index = BM25Index()
+    index.add(0, "How do I reset my password")
+    index.add(1, "Error ERR-4012 means the card was declined")
+    index.add(2, "Refunds take 30 days")
+
+    hits = index.search("what is err-4012", k=3)
+    assert hits[0][0] == 1
+    assert index.is_confident("err-4012", index.search("err-4012", k=3), margin=1.5)
+    assert not index.is_confident("err-4012 refunds", index.search("err-4012 refunds", k=3), margin=1.5)
+
+    index.remove(1)
+    assert index.search("err-4012", k=3) == []
+
+
+
+def test_bm25_persisted_postings_with_delta(tmp_path):
+    index = BM25Index()
+    index.add(0, "How do I reset my password")
+    index.add(1, "Error ERR-4012 means the card was declined")
+    index.add(2, "Refunds take 30 days")
+    index.remove(1)
+    index.write(str(tmp_path / "a"), old_to_new=[-1, -1, 0])
+    moved = BM25Index(directory=str(tmp_path / "a"))
+    assert moved.persisted
+    assert len(moved) == 1 and moved.search("refunds", k=1)[0][0] == 0
+
+    # Same scores as an in-memory index over the same rows
+    memory = BM25Index()
+    for row, text in enumerate(["How do I reset my password", "Error ERR-4012 means the card was declined",
+                                "Refunds take 30 days"]):
+        memory.add(row, text)
+    memory.write(str(tmp_path / "b"))
+    persisted = BM25Index(directory=str(tmp_path / "b"))
+    assert persisted.search("reset password refunds", k=3) == memory.search("reset password refunds", k=3)
+    assert persisted.coverage(1, "err-4012 card") == 1.0
+
+    # Rows added or replaced later go to the delta, removed ones are masked
+    persisted.add(3, "Reset your API keys")
+    persisted.add(0, "Change your email address")
+    persisted.remove(2)
+    assert len(persisted) == 3
+    assert [row for row, _ in persisted.search("reset", k=3)] == [3]
+    assert persisted.search("refunds", k=3) == []
+    persisted.write(str(tmp_path / "c"))
+    reopened = BM25Index(directory=str(tmp_path / "c"))
+    assert reopened.search("email reset", k=3) == persisted.search("email reset", k=3)
+
+
+def test_reciprocal_rank_fusion_prefers_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [row for row, _ in fused] == [1, 3, 2]
+
+
+def test_hybrid_search_short_circuits_encoder(make_vector_db):
+    db = make_vector_db()
+    db.add_documents([
+        {"id": "card", "text": "Error ERR-4012 means the card was declined", "metadata": {}},
+        {"id": "refund", "text": "Refunds take 30 days", "metadata": {}},
+        {"id": "password", "text": "Reset your password from the login page", "metadata": {}},
+    ])
+
+    with patch.object(db, "embed_queries", side_effect=AssertionError("encoder called")):
+        hits = db.search("ERR-4012", k=3, mode="hybrid")
+    assert [h["id"] for h in hits] == ["card"]
+    assert "bm25_score" in hits[0]
+
+    hits = db.search("why was my card declined after a refund", k=2, mode="hybrid")
+    assert {"card", "refund"} == {h["id"] for h in hits}
+    assert all("rrf_score" in h for h in hits)
+
+    db.compact()
+    assert [h["id"] for h in db.search("refunds", k=1, mode="sparse")] == ["refund"]
+
+
+def test_sparse_search_maps_persisted_postings(make_vector_db):
+    db = make_vector_db()
+    db.add_documents([
+        {"id": "card", "text": "Error ERR-4012 means the card was declined", "metadata": {}},
+        {"id": "refund", "text": "Refunds take 30 days", "metadata": {}},
+    ])
+    db.compact()
+
+    reloaded = make_vector_db()
+    assert [h["id"] for h in reloaded.search("refunds", k=1, mode="sparse")] == ["refund"]
+    assert reloaded.sparse.persisted
+    assert reloaded._id_to_row is None  # no document was decoded to build BM25
+
+    reloaded.delete_documents(["refund"])
+    reloaded.add_documents([{"id": "card", "text": "Refunds for declined cards", "metadata": {}}])
+    assert [h["id"] for h in reloaded.search("refunds", k=2, mode="sparse")] == ["card"]
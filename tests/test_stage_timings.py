@@ -0,0 +1,73 @@
+"""
+Tests for per-request pipeline stage timings
+"""
+import asyncio
+import threading
+
+from src.services.stage_timings import (
+    StageLog, begin_request, record_stage, record_thread_stage,
+    server_timing, stage, take_thread_stages
+)
+
+
+def test_stages_accumulate_within_a_request():
+    async def handle():
+        timings = begin_request()
+        with stage("db"):
+            await asyncio.sleep(0.01)
+        with stage("db"):
+            pass
+        record_stage("llm", 0.5)
+        return timings
+
+    timings = asyncio.run(handle())
+    assert set(timings) == {"db", "llm"}
+    assert timings["db"] >= 0.01
+    assert timings["llm"] == 0.5
+
+
+def test_concurrent_requests_keep_separate_timings():
+    async def handle(seconds):
+        timings = begin_request()
+        await asyncio.sleep(0)
+        record_stage("search", seconds)
+        return timings
+
+    async def main():
+        return await asyncio.gather(handle(1.0), handle(2.0))
+
+    assert asyncio.run(main()) == [{"search": 1.0}, {"search": 2.0}]
+
+
+def test_recording_outside_a_request_is_a_noop():
+    def outside():
+        record_stage("db", 1.0)  # fresh thread: no request context
+
+    thread = threading.Thread(target=outside)
+    thread.start()
+    thread.join()
+
+
+def test_thread_stages_are_taken_once():
+    take_thread_stages()
+    record_thread_stage("embed", 0.25)
+    record_thread_stage("embed", 0.25)
+    assert take_thread_stages() == {"embed": 0.5}
+    assert take_thread_stages() == {}
+
+
+def test_server_timing_header_in_milliseconds():
+    assert server_timing({"db": 0.0123, "llm": 1.5}) == "db;dur=12.3, llm;dur=1500.0"
+
+
+def test_stage_log_report():
+    log = StageLog(window=3)
+    log.record({"db": 0.001, "llm": 1.0})
+    for _ in range(3):
+        log.record({"db": 0.002, "custom": 0.1})
+
+    report = log.report()
+    assert len(log) == 3  # oldest sample dropped
+    assert list(report) == ["db", "custom"]  # known stages in pipeline order, then others
+    assert report["db"]["count"] == 3
+    assert report["db"]["p50"] == report["db"]["p99"] == 2.0
@@ -0,0 +1,147 @@
+"""
+Unit tests for id-keyed upserts, deletes and write-ahead log compaction
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from src.config import settings
+from src.data import faq_loader
+
+FAQS = [
+    {"id": "faq_password", "question": "How do I reset my password?", "answer": "Use Forgot Password.", "category": "Account"},
+    {"id": "faq_refund", "question": "What is your refund policy?", "answer": "30 days.", "category": "Billing"},
+    {"id": "faq_keys", "question": "Where are my API keys?", "answer": "Developer Dashboard.", "category": "Developer"},
+]
+
+
+def _doc(doc_id, text):
+    return {"id": doc_id, "text": text, "metadata": {}}
+
+
+def test_upsert_replaces_by_id(make_vector_db):
+    db = make_vector_db()
+    db.add_documents([_doc("a", "reset password"), _doc("b", "refund policy")])
+    db.add_documents([_doc("a", "update billing card")])
+
+    hits = db.search("update billing card", k=3, mode="dense")
+    assert sorted(h["id"] for h in hits) == ["a", "b"]
+    assert [h["text"] for h in hits if h["id"] == "a"] == ["update billing card"]
+
+
+def test_delete_and_wal_replay(make_vector_db):
+    db = make_vector_db()
+    db.add_documents([_doc("a", "reset password"), _doc("b", "refund policy")])
+    assert db.delete_documents(["a", "missing"]) == 1
+
+    # A fresh process rebuilds the same state from the write-ahead log
+    reloaded = make_vector_db()
+    assert [h["id"] for h in reloaded.search("reset password", k=3)] == ["b"]
+    assert reloaded.index_version == db.index_version
+
+
+def test_compaction_renumbers_live_rows(make_vector_db, tmp_path):
+    db = make_vector_db()
+    db.add_documents([_doc("a", "reset password"), _doc("b", "refund policy"), _doc("c", "api keys")])
+    db.delete_documents(["b"])
+    db.add_documents([_doc("a", "reset my password please")])
+    version_before = db.index_version
+
+    db.compact()
+
+    assert not (tmp_path / "wal.jsonl").exists()
+    assert len(db.documents) == 2
+    assert db.index_version != version_before
+    reloaded = make_vector_db()
+    assert sorted(reloaded.document_ids()) == ["a", "c"]
+    assert reloaded.search("reset my password please", k=1)[0]["text"] == "reset my password please"
+
+
+def test_background_compaction_threshold(make_vector_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "wal_compaction_threshold", 2)
+    db = make_vector_db()
+    db.add_documents([_doc("a", "reset password"), _doc("b", "refund policy")])
+    db.wait_for_compaction()
+
+    assert (tmp_path / "CURRENT").read_text() == "snapshot-000001"
+    assert not (tmp_path / "wal.jsonl").exists()
+
+
+def test_search_started_before_compaction_can_still_read_old_store(make_vector_db):
+    db = make_vector_db()
+    db.add_documents([_doc("a", "reset password"), _doc("b", "refund policy")])
+    db.compact()
+    captured = db.documents  # as a search captures it under the swap lock
+
+    db.add_documents([_doc("c", "api keys")])
+    db.compact()  # swaps the store and deletes the old snapshot directory
+
+    assert [captured[0]["id"], captured[1]["id"]] == ["a", "b"]
+
+
+def test_index_changes_wait_for_running_searches(make_vector_db):
+    db = make_vector_db()
+    db.add_documents([_doc("a", "reset password")])
+
+    writer = threading.Thread(target=db.add_documents, args=([_doc("b", "refund policy")],))
+    with db._index_lock.read():  # a search in progress
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive() and db.index.ntotal == 1
+    writer.join()
+    assert db.index.ntotal == 2
+
+def test_hnsw_deletes_are_tombstoned(make_vector_db, monkeypatch):
+    monkeypatch.setattr(settings, "faiss_index_type", "hnsw")
+    db = make_vector_db()
+    db.add_documents([_doc("a", "reset password"), _doc("b", "refund policy")])
+    db.delete_documents(["a"])
+
+    assert [h["id"] for h in db.search("reset password", k=2)] == ["b"]
+    db.compact()
+    assert [h["id"] for h in make_vector_db().search("reset password", k=2)] == ["b"]
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_ivf_upserts_and_deletes_keep_row_ids(make_vector_db, monkeypatch, index_type):
+    monkeypatch.setattr(settings, "faiss_index_type", index_type)
+    monkeypatch.setattr(settings, "faiss_nprobe", 1024)  # probe every cell: exact answers
+    monkeypatch.setattr(settings, "retrieval_mode", "dense")
+    vectors = np.random.default_rng(0).standard_normal((400, settings.embedding_dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    docs = [_doc(f"d{i}", f"document {i}") for i in range(len(vectors))]
+
+    db = make_vector_db()
+    db.upsert_documents(docs[:300], embeddings=vectors[:300])
+
+    def top_id(db, i):
+        monkeypatch.setattr(db, "embed_queries", lambda queries: vectors[i:i + 1])
+        return db.search("query", k=1)[0]["id"]
+
+    db.delete_documents(["d0", "d1", "d2"])
+    assert top_id(db, 150) == "d150"
+    db.upsert_documents(docs[300:], embeddings=vectors[300:])
+    db.upsert_documents([_doc("d150", "replaced")], embeddings=vectors[150:151])
+    assert [top_id(db, i) for i in (3, 150, 299, 350)] == ["d3", "d150", "d299", "d350"]
+    assert top_id(db, 0) != "d0"
+
+    db.compact()
+    reloaded = make_vector_db()
+    assert [top_id(reloaded, i) for i in (3, 150, 299, 350)] == ["d3", "d150", "d299", "d350"]
+    reloaded.delete_documents(["d3"])
+    assert top_id(reloaded, 3) != "d3" and top_id(reloaded, 4) == "d4"
+
+
+def test_faq_sync_only_embeds_changed_faqs(make_vector_db, monkeypatch):
+    db = make_vector_db()
+    monkeypatch.setattr(faq_loader, "vector_db", db)
+
+    assert faq_loader.process_and_index_faqs(FAQS)["upserted"] == 3
+
+    edited = [dict(FAQS[0], answer="Click Forgot Password on the login page.")] + FAQS[1:2]
+    stats = faq_loader.process_and_index_faqs(edited, prune=True)
+
+    assert stats == {"upserted": 1, "unchanged": 1, "deleted": 1}
+    assert sorted(db.document_ids()) == ["faq_password", "faq_refund"]
+    assert len(db.search("reset password", k=5, mode="dense")) == 2
@@ -0,0 +1,43 @@
+"""
+Unit tests for startup warm-up and the readiness probe
+"""
+import pytest
+
+from src.services import warmup
+from src.services.warmup import Readiness, warm_up_sync
+
+
+@pytest.fixture
+def fresh_readiness(monkeypatch):
+    state = Readiness()
+    monkeypatch.setattr(warmup, "readiness", state)
+    monkeypatch.setattr("src.main.readiness", state)
+    return state
+
+
+def test_ready_endpoint_gates_on_warm_up(client, fresh_readiness, make_vector_db, monkeypatch):
+    assert client.get("/health").status_code == 200
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+    db = make_vector_db()
+    db.add_documents([{"id": "faq_1", "text": "Reset your password from the login page", "metadata": {}}])
+    monkeypatch.setattr(warmup, "vector_db", db)
+
+    assert warm_up_sync() is True
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert set(response.json()["steps"]) == {"encoder", "index", "llm_client"}
+
+
+def test_failed_step_keeps_worker_unready(client, fresh_readiness, monkeypatch):
+    def broken():
+        raise RuntimeError("model download failed")
+
+    monkeypatch.setattr(warmup, "warmup_steps", lambda: [("encoder", broken)])
+
+    assert warm_up_sync() is False
+    body = client.get("/ready").json()
+    assert body["status"] == "failed"
+    assert body["steps"]["encoder"]["error"] == "model download failed"